@@ -0,0 +1,113 @@
+"""Heartbeat printers[] for many CUPS queues: per printer versus one batched pass.
+
+Usage:
+    PYTHONPATH=src python benchmarks/heartbeat_collection.py [--queues 200] [--jobs 3]
+
+The old path builds every entry with ``_build_printer_entry`` (four lpstat
+calls per printer); the new one with ``_build_printer_entries``, which
+reads every queue from ``printer_snapshot`` (four lpstat calls in total). A
+stand-in ``lpstat`` shell script first on PATH answers from canned output
+for ``--queues`` printers with ``--jobs`` pending jobs each, so no CUPS is
+needed. Reports wall time, CPU (this process plus the lpstat children) and
+lpstat calls.
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from printbot.printing import set_backend
+from printbot.websocket_client import _build_printer_entries, _build_printer_entry
+
+# Answers `lpstat <args>` with the file named after its arguments, joined by "_".
+FAKE_LPSTAT = """#!/bin/sh
+echo x >> "{calls}"
+IFS=_
+cat "{dir}/$*" 2>/dev/null
+exit 0
+"""
+
+
+def canned_output(n: int, jobs: int) -> dict[str, str]:
+    names = [f"queue-{i:03d}" for i in range(n)]
+    out: dict[str, str] = {}
+    state = {name: (f"printer {name} is idle.  enabled since Mon Apr 24 10:00:00 2026\n"
+                    if i % 10 else
+                    f"printer {name} disabled since Mon Apr 24 10:00:00 2026 -\n\tmedia-empty\n")
+             for i, name in enumerate(names)}
+    detail = {name: state[name] + f"\tDescription: {name}\n\tAlerts: none\n\tConnection: direct\n"
+              for name in names}
+    accepting = {name: f"{name} accepting requests since Mon Apr 24 10:00:00 2026\n" for name in names}
+    queued = {
+        name: "".join(
+            f"{name}-{i * jobs + j}  alice  12  Mon Jan  6 10:00:00 2020\n\tqueued for {name}\n"
+            for j in range(jobs)
+        )
+        for i, name in enumerate(names)
+    }
+    devices = "".join(f"device for {name}: socket://10.0.{i // 250}.{i % 250}\n" for i, name in enumerate(names))
+
+    out["-p_-v_-d"] = "".join(state[n].splitlines(keepends=True)[0] for n in names) + devices \
+        + f"system default destination: {names[0]}\n"
+    out["-l_-p"] = "".join(detail.values())
+    out["-a"] = "".join(accepting.values())
+    out["-l_-W_not-completed_-o"] = "".join(queued.values())
+    for name in names:
+        out[f"-l_-p_{name}"] = detail[name]
+        out[f"-a_{name}"] = accepting[name]
+        out[f"-l_-W_not-completed_-o_{name}"] = queued[name]
+    return out
+
+
+def measure(fn, calls_file: str) -> tuple[float, float, int, int]:
+    open(calls_file, "w").close()
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = time.process_time()
+    start = time.perf_counter()
+    entries = fn()
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = time.process_time() - cpu + (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    with open(calls_file) as f:
+        calls = sum(1 for _ in f)
+    return wall, cpu, calls, len(entries)
+
+
+def main(n: int, jobs: int):
+    set_backend(None)
+    tmp = tempfile.mkdtemp(prefix="printbot_bench_")
+    try:
+        data_dir = os.path.join(tmp, "out")
+        os.mkdir(data_dir)
+        for key, text in canned_output(n, jobs).items():
+            with open(os.path.join(data_dir, key), "w") as f:
+                f.write(text)
+        calls_file = os.path.join(tmp, "calls")
+        lpstat = os.path.join(tmp, "lpstat")
+        with open(lpstat, "w") as f:
+            f.write(FAKE_LPSTAT.format(dir=data_dir, calls=calls_file))
+        os.chmod(lpstat, 0o755)
+        os.environ["PATH"] = tmp + os.pathsep + os.environ.get("PATH", "")
+
+        names = [f"queue-{i:03d}" for i in range(n)]
+        print(f"{n} queues, {jobs} pending jobs each")
+        print(f"{'collection':<14}{'entries':>9}{'lpstat':>8}{'wall s':>9}{'cpu s':>9}")
+        for label, fn in (
+            ("per printer", lambda: [_build_printer_entry(name) for name in names]),
+            ("batched", _build_printer_entries),
+        ):
+            wall, cpu, calls, entries = measure(fn, calls_file)
+            print(f"{label:<14}{entries:>9}{calls:>8}{wall:>9.2f}{cpu:>9.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queues", type=int, default=200)
+    parser.add_argument("--jobs", type=int, default=3)
+    args = parser.parse_args()
+    main(args.queues, args.jobs)
@@ -0,0 +1,113 @@
+"""Burst of label jobs: back-to-back handling versus the staged lane pipeline.
+
+Usage:
+    PYTHONPATH=src python benchmarks/lane_pipeline.py [--jobs 50] [--delay 0.02]
+
+Both paths print the same burst of small jobs to one printer. The old path
+runs ``handle_print_job`` for one job after the other, as the single job
+processor did; the new one pushes them through ``PrinterLanes`` (prepare →
+submit → record), so the next job's dedup check, payload lookup and
+``lpoptions`` call overlap with the current ``lp`` submission. Stand-in
+``lp`` and ``lpoptions`` scripts first on PATH sleep ``--delay`` seconds to
+play cupsd, so no CUPS is needed.
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import shutil
+import tempfile
+import time
+
+from printbot.job_handler import handle_print_job, prepare_print_job, record_print_job, submit_print_job
+from printbot.lanes import PrinterLanes
+
+FAKE_LP = """#!/bin/sh
+cat > /dev/null
+sleep {delay}
+echo "request id is bench-1 (1 file(s))"
+"""
+
+FAKE_LPOPTIONS = """#!/bin/sh
+sleep {delay}
+echo "media=A4 sides=one-sided"
+"""
+
+LABEL = base64.b64encode(b"%PDF-1.4 label" + os.urandom(6 * 1024)).decode()
+
+
+def burst(n: int, payload_type: str) -> list[dict]:
+    return [
+        {"type": "print", "job_id": f"bench-{payload_type}-{i}", "payload_type": payload_type,
+         "payload": LABEL, "metadata": {"title": f"Label {i}"}}
+        for i in range(n)
+    ]
+
+
+def sequential(jobs: list[dict], state_dir: str) -> None:
+    for job in jobs:
+        assert handle_print_job(job, "bench", state_dir)["status"] == "completed"
+
+
+async def pipelined(jobs: list[dict], state_dir: str) -> None:
+    finished = asyncio.Event()
+    remaining = len(jobs)
+
+    async def prepare(job):
+        return await asyncio.to_thread(prepare_print_job, job, "bench", state_dir)
+
+    async def submit(prepared):
+        return await asyncio.to_thread(submit_print_job, prepared)
+
+    async def record(prepared, result):
+        nonlocal remaining
+        assert result["status"] == "completed"
+        await asyncio.to_thread(record_print_job, prepared)
+        remaining -= 1
+        if not remaining:
+            finished.set()
+
+    lanes = PrinterLanes(prepare, submit, record)
+    for job in jobs:
+        lanes.submit("bench", job)
+    await finished.wait()
+    lanes.cancel_all()
+
+
+def timed(fn) -> float:
+    state_dir = tempfile.mkdtemp(prefix="printbot_bench_state_")
+    try:
+        start = time.perf_counter()
+        fn(state_dir)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+
+def main(n: int, delay: float):
+    bin_dir = tempfile.mkdtemp(prefix="printbot_bench_")
+    try:
+        for name, script in (("lp", FAKE_LP), ("lpoptions", FAKE_LPOPTIONS)):
+            path = os.path.join(bin_dir, name)
+            with open(path, "w") as f:
+                f.write(script.format(delay=delay))
+            os.chmod(path, 0o755)
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+
+        print(f"{n} jobs, cupsd delay {delay * 1000:.0f} ms")
+        print(f"{'payload':<10}{'sequential s':>14}{'pipelined s':>14}{'speed-up':>10}")
+        for payload_type in ("pdf", "raw"):
+            old = timed(lambda d: sequential(burst(n, payload_type), d))
+            new = timed(lambda d: asyncio.run(pipelined(burst(n, payload_type), d)))
+            print(f"{payload_type:<10}{old:>14.2f}{new:>14.2f}{old / new:>9.1f}x")
+    finally:
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.02)
+    args = parser.parse_args()
+    main(args.jobs, args.delay)
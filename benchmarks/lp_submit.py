@@ -0,0 +1,98 @@
+"""Submission cost: temp file + ``sh -c lp`` versus piping into ``lp`` stdin.
+
+Usage:
+    PYTHONPATH=src python benchmarks/lp_submit.py [--repeat 5] [--spool-dir /var/tmp]
+
+Both paths start from the base64 ``payload`` of a ``print`` message and end
+when ``lp`` has read the whole document. The old path decodes into a
+``mkstemp`` file, forks ``/bin/sh`` to run ``lp <file>`` and deletes the file;
+the new one (``print_raw``/``print_pdf`` with ``data``) execs ``lp``
+directly and writes the decoded bytes to its stdin. A stand-in ``lp`` that
+reads its input and prints a request id is put first on PATH, so no CUPS
+is needed; point ``--spool-dir`` at the SD card to include its write cost.
+"""
+
+import argparse
+import base64
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from printbot import job_handler, printing
+
+FAKE_LP = """#!{python}
+import os, sys
+src = open(sys.argv[-1], "rb") if os.path.isfile(sys.argv[-1]) else sys.stdin.buffer
+while src.read(1 << 16):
+    pass
+print("request id is bench-1 (1 file(s))")
+"""
+
+CASES = (
+    ("4 KB receipt (raw)", "raw", 4 * 1024),
+    ("20 MB PDF", "pdf", 20 * 1024 * 1024),
+)
+
+
+def legacy(payload: str, payload_type: str, spool_dir: str) -> None:
+    fd, path = tempfile.mkstemp(prefix="printbot_", dir=spool_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(base64.b64decode(payload))
+        opts = "-o raw" if payload_type == "raw" else "-o media=A4 -n 1"
+        subprocess.run(
+            f"lp -d bench {opts} -t {shlex.quote('Bench job')} {shlex.quote(path)}",
+            shell=True, check=True, capture_output=True, text=True,
+        )
+    finally:
+        os.remove(path)
+
+
+def piped(payload: str, payload_type: str) -> None:
+    data = job_handler._InlinePayload(payload)
+    if payload_type == "raw":
+        printing.print_raw("bench", "Bench job", None, data=data)
+    else:
+        printing.print_pdf("bench", "Bench job", None, printer_options={"media": "A4"}, data=data)
+
+
+def best_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main(repeat: int, spool_dir: str):
+    bin_dir = tempfile.mkdtemp(prefix="printbot_bench_")
+    try:
+        lp = os.path.join(bin_dir, "lp")
+        with open(lp, "w") as f:
+            f.write(FAKE_LP.format(python=sys.executable))
+        os.chmod(lp, 0o755)
+        os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+        # No lpoptions round-trip: it is the same in both paths.
+        printing.get_printer_defaults = lambda name: {}
+
+        print(f"{'document':<22}{'temp file + sh ms':>20}{'stdin pipe ms':>16}{'speed-up':>10}")
+        for label, payload_type, size in CASES:
+            payload = base64.b64encode(os.urandom(size)).decode()
+            old = best_ms(lambda: legacy(payload, payload_type, spool_dir), repeat)
+            new = best_ms(lambda: piped(payload, payload_type), repeat)
+            print(f"{label:<22}{old:>20.1f}{new:>16.1f}{old / new:>9.1f}x")
+    finally:
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--spool-dir", default=tempfile.gettempdir())
+    args = parser.parse_args()
+    main(args.repeat, args.spool_dir)
@@ -0,0 +1,90 @@
+"""Decode + dispatch cost per inbound message type.
+
+Usage:
+    PYTHONPATH=src python benchmarks/message_decode.py [--number 20000]
+
+Compares the pre-table path (stdlib ``json.loads`` followed by the old
+``if/elif`` chain on ``msg["type"]`` and per-handler ``msg.get`` defaults)
+with the current one (``messages.decode_frame`` + ``_ROUTES`` lookup +
+typed struct). Large ``print`` frames are reported separately: there the
+new path leaves the base64 payload in the raw frame (``LazyPayload``).
+"""
+
+import argparse
+import base64
+import json
+import os
+import timeit
+
+from printbot import messages
+from printbot.websocket_client import _ROUTES
+
+# Order of the old if/elif chain in GatewayClient._handle_message.
+LEGACY_CHAIN = (
+    "print", "print_begin", "print_chunk", "print_end", "hello_ack", "capabilities",
+    "ping", "config_update", "discover_devices", "cups_add_printer",
+    "cups_list_printers", "cups_remove_printer", "cups_set_default",
+    "cups_get_printer_options", "cups_set_printer_options", "cups_resume_printer",
+    "cups_enable_printer", "cups_disable_printer", "cups_accept_jobs",
+    "cups_reject_jobs", "cups_list_jobs", "cups_cancel_job", "cups_clear_queue",
+    "ota_update",
+)
+
+SAMPLES = {
+    "ping": {"type": "ping", "timestamp": "2026-01-01T00:00:00Z"},
+    "print_chunk": {"type": "print_chunk", "job_id": "j1", "seq": 3,
+                    "data": base64.b64encode(os.urandom(1024)).decode()},
+    "cups_list_printers": {"type": "cups_list_printers", "request_id": "r1"},
+    "cups_add_printer": {"type": "cups_add_printer", "request_id": "r2",
+                         "printer_name": "hp", "device_uri": "ipp://10.0.0.5/ipp/print",
+                         "description": "Office", "location": "Floor 2",
+                         "options": {"media": "A4"}},
+    "cups_cancel_job": {"type": "cups_cancel_job", "request_id": "r3",
+                        "job_id": 42, "purge": True},
+    "ota_update": {"type": "ota_update", "url": "https://example.com/ota.tar.gz",
+                   "checksum": "sha256:abc", "version": "1.2.3"},
+}
+
+
+def legacy(raw: str):
+    msg = json.loads(raw)
+    msg_type = msg.get("type")
+    for candidate in LEGACY_CHAIN:
+        if msg_type == candidate:
+            break
+    # What the handlers did with the dict afterwards.
+    return {k: msg.get(k, "") for k in msg}
+
+
+def current(raw: str):
+    msg = messages.decode_frame(raw)
+    _ROUTES[msg.get("type")]
+    return messages.decode(msg)
+
+
+def bench(fn, raw: str, number: int) -> float:
+    """Best-of-5 microseconds per call."""
+    return min(timeit.repeat(lambda: fn(raw), number=number, repeat=5)) / number * 1e6
+
+
+def main(number: int):
+    print(f"codec: {messages.CODEC}")
+    print(f"{'message type':<28}{'legacy µs':>12}{'current µs':>12}{'speed-up':>10}")
+    for name, msg in SAMPLES.items():
+        raw = json.dumps(msg)
+        old, new = bench(legacy, raw, number), bench(current, raw, number)
+        print(f"{name:<28}{old:>12.2f}{new:>12.2f}{old / new:>9.1f}x")
+
+    for size_mb in (1, 10):
+        raw = json.dumps({"type": "print", "job_id": "big", "payload_type": "pdf",
+                          "payload": base64.b64encode(os.urandom(size_mb << 20)).decode(),
+                          "metadata": {"copies": 1}})
+        n = max(1, number // 2000)
+        old, new = bench(legacy, raw, n), bench(current, raw, n)
+        print(f"{f'print ({size_mb} MiB payload)':<28}{old:>12.0f}{new:>12.0f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    main(parser.parse_args().number)
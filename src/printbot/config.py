@@ -44,10 +44,64 @@ class Settings:
     printer_name: str = os.getenv("PRINTER_NAME", "")
     state_dir: str = os.getenv("STATE_DIR", "/var/lib/printbot")
     heartbeat_interval: int = int(os.getenv("HEARTBEAT_INTERVAL", "30"))
+    # Seconds a heartbeat waits for its lpstat/IPP probes; slower ones are
+    # reported from their last good value and listed under "stale".
+    heartbeat_budget: float = float(os.getenv("HEARTBEAT_BUDGET", "3"))
+    # Adaptive cadence: HEARTBEAT_MIN_INTERVAL seconds right after a printer
+    # change or job activity, doubling while idle up to HEARTBEAT_MAX_INTERVAL
+    # (0 = HEARTBEAT_INTERVAL, which config_update can change).
+    heartbeat_min_interval: float = float(os.getenv("HEARTBEAT_MIN_INTERVAL", "5"))
+    heartbeat_max_interval: float = float(os.getenv("HEARTBEAT_MAX_INTERVAL", "0"))
+    # printers[] in the heartbeat: "configured" (PRINTER_NAME plus busy lanes)
+    # or "all" CUPS queues, collected in one pass and HEARTBEAT_ROUND_SIZE
+    # per heartbeat (0 = all at once).
+    heartbeat_printers: str = os.getenv("HEARTBEAT_PRINTERS", "configured")
+    heartbeat_round_size: int = int(os.getenv("HEARTBEAT_ROUND_SIZE", "50"))
+    # With servers that negotiate heartbeat_delta: delta heartbeats sent
+    # between two full snapshots.
+    heartbeat_full_every: int = int(os.getenv("HEARTBEAT_FULL_EVERY", "10"))
+    # Printer state changes pushed as printer_event the moment CUPS reports
+    # them, from an IPP notification subscription polled every
+    # PRINTER_EVENTS_POLL seconds; the heartbeat becomes a consistency check.
+    # Needs the IPP backend: off with CUPS_BACKEND=cli, or auto without the
+    # cupsd socket.
+    printer_events: bool = os.getenv("PRINTER_EVENTS", "true").lower() in ("true", "1", "yes")
+    printer_events_poll: float = float(os.getenv("PRINTER_EVENTS_POLL", "1"))
     reconnect_delay: int = int(os.getenv("RECONNECT_DELAY", "5"))
     max_reconnect_delay: int = int(os.getenv("MAX_RECONNECT_DELAY", "300"))
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
     dry_run: bool = os.getenv("DRY_RUN", "").lower() in ("true", "1", "yes")
+    # Largest single WebSocket frame accepted. Big documents should use the
+    # print_begin/print_chunk/print_end stream instead of one huge frame.
+    max_frame_bytes: int = int(os.getenv("MAX_FRAME_BYTES", str(16 * 1024 * 1024)))
+    # Rolling ceiling on streamed chunk bytes held in RAM before they hit the spool file.
+    stream_buffer_bytes: int = int(os.getenv("STREAM_BUFFER_BYTES", str(4 * 1024 * 1024)))
+    # Parallel payload_url downloads (prefetched ahead of the print queue).
+    download_concurrency: int = int(os.getenv("DOWNLOAD_CONCURRENCY", "2"))
+    # CUPS status/admin calls: "ipp" talks to cupsd directly, "cli" forks
+    # lpstat/lpadmin/cancel, "auto" uses IPP when the cupsd socket exists.
+    cups_backend: str = os.getenv("CUPS_BACKEND", "auto")
+    # Spool files: known-size payloads up to SPOOL_RAM_MAX_FILE go to the
+    # tmpfs SPOOL_RAM_DIR while it holds less than SPOOL_RAM_BYTES (0 turns
+    # the RAM tier off); the rest to SPOOL_DIR (empty = system temp dir).
+    spool_dir: str = os.getenv("SPOOL_DIR", "")
+    spool_ram_dir: str = os.getenv("SPOOL_RAM_DIR", "/dev/shm")
+    spool_ram_bytes: int = int(os.getenv("SPOOL_RAM_BYTES", str(32 * 1024 * 1024)))
+    spool_ram_max_file: int = int(os.getenv("SPOOL_RAM_MAX_FILE", str(4 * 1024 * 1024)))
+    # Print jobs handled at once per printer lane (1 = strict FIFO per printer).
+    lane_concurrency: int = int(os.getenv("LANE_CONCURRENCY", "1"))
+    # Order jobs leave a printer lane: fifo, priority (metadata.priority),
+    # sjf (smallest first) or fair (round-robin over metadata.source). Waiting
+    # SCHEDULER_AGING seconds is worth one priority level, so nothing starves.
+    scheduler_policy: str = os.getenv("SCHEDULER_POLICY", "fifo")
+    scheduler_aging: float = float(os.getenv("SCHEDULER_AGING", "30"))
+    # Worker processes that decode large base64 payloads off the event loop
+    # (0 = decode in a thread).
+    decode_workers: int = int(os.getenv("DECODE_WORKERS", "2"))
+    # Flow control: print jobs, and their payload bytes, held at once before
+    # new ones are answered with job_status "deferred" (the server resends).
+    credit_jobs: int = int(os.getenv("CREDIT_JOBS", "32"))
+    credit_bytes: int = int(os.getenv("CREDIT_BYTES", str(128 * 1024 * 1024)))
 
     env_path: Path | None = _loaded_env_path
 
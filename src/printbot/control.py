@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from collections import Counter
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Control requests accepted but not finished (waiting + running) before new
+# ones are answered with `busy`.
+MAX_CONTROL_PENDING = 32
+
+# Control handlers running at once across all types. Each one typically holds
+# a worker thread blocked on lpadmin/lpstat; keep room for the print path.
+MAX_CONTROL_RUNNING = 4
+
+
+class ControlSupervisor:
+    """Owns every task spawned for a control-plane request.
+
+    Each message type has its own concurrency limit and all types share a
+    global one; requests beyond the limits wait in order. ``submit`` refuses
+    new work once ``max_pending`` requests are outstanding, so a replaying
+    server cannot pile up hundreds of CUPS subprocesses. ``cancel_all`` tears
+    everything down on disconnect — responses would have nowhere to go.
+    """
+
+    def __init__(self, max_pending: int = MAX_CONTROL_PENDING, max_running: int = MAX_CONTROL_RUNNING):
+        self._max_pending = max_pending
+        self._running_slots = asyncio.Semaphore(max_running)
+        self._type_slots: dict[str, asyncio.Semaphore] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected: Counter[str] = Counter()
+
+    def submit(self, msg_type: str, limit: int, run: Callable[[], Awaitable[None]]) -> bool:
+        """Schedule ``run()``; False (and nothing started) if the queue is full."""
+        if len(self._tasks) >= self._max_pending:
+            self._rejected[msg_type] += 1
+            logger.warning("Control queue full (%d pending), rejecting %s", len(self._tasks), msg_type)
+            return False
+        slots = self._type_slots.get(msg_type)
+        if slots is None:
+            slots = self._type_slots[msg_type] = asyncio.Semaphore(limit)
+        task = asyncio.create_task(self._run(slots, run), name=f"control:{msg_type}")
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        return True
+
+    async def _run(self, slots: asyncio.Semaphore, run: Callable[[], Awaitable[None]]):
+        self._waiting += 1
+        try:
+            await slots.acquire()
+            try:
+                await self._running_slots.acquire()
+            except BaseException:
+                slots.release()
+                raise
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            await run()
+        finally:
+            self._running -= 1
+            self._running_slots.release()
+            slots.release()
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        self._completed += 1
+        if task.exception() is not None:
+            logger.error("Control task %s failed", task.get_name(), exc_info=task.exception())
+
+    def cancel_all(self) -> int:
+        """Cancel every outstanding request; returns how many were cancelled."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            logger.info("Cancelled %d outstanding control request(s)", len(tasks))
+        return len(tasks)
+
+    def snapshot(self) -> dict:
+        """Queue depth now plus cumulative completed/rejected counts."""
+        return {
+            "waiting": self._waiting,
+            "running": self._running,
+            "completed": self._completed,
+            "rejected": sum(self._rejected.values()),
+            "rejected_by_type": dict(self._rejected),
+        }
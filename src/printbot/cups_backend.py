@@ -0,0 +1,426 @@
+import logging
+import os
+from collections.abc import Iterable
+from urllib.parse import quote, unquote
+
+from . import ipp
+from .ipp import IppClient, IppError, IppUnavailable, as_list
+
+logger = logging.getLogger(__name__)
+
+BACKEND_CHOICES = ("auto", "ipp", "cli")
+
+# printer-state enum (RFC 8011 §5.4.11).
+_PRINTER_STATES = {3: "idle", 4: "processing", 5: "stopped"}
+
+# job-state enum (RFC 8011 §5.3.7).
+_JOB_STATES = {
+    3: "pending",
+    4: "pending-held",
+    5: "processing",
+    6: "processing-stopped",
+    7: "canceled",
+    8: "aborted",
+    9: "completed",
+}
+
+# printer-type bit set on the system default destination (cups/cups.h).
+_CUPS_PRINTER_DEFAULT = 0x20000
+
+_JOB_ATTRIBUTES = [
+    "job-id", "job-originating-user-name", "job-k-octets", "time-at-creation",
+    "job-state", "job-name", "job-state-reasons",
+]
+
+# Job attributes whose integer values are enums on the wire.
+_ENUM_OPTIONS = {"orientation-requested", "print-quality", "finishings"}
+
+
+class BackendUnavailable(Exception):
+    """The backend cannot serve this call; printing falls back to the CLI tools."""
+
+
+class CupsBackend:
+    """Interface for an in-process CUPS backend.
+
+    Methods mirror the functions of the same name in ``printing`` and must
+    return the same shapes. A method that raises BackendUnavailable — the
+    default for everything here — makes ``printing`` run its CLI
+    implementation instead, so a backend only implements what it does
+    better than the command-line tools.
+    """
+
+    name = "none"
+
+    def list_printers(self) -> list[dict]:
+        raise BackendUnavailable(self.name)
+
+    def get_printer_status(self, printer_name: str) -> str:
+        raise BackendUnavailable(self.name)
+
+    def get_printer_detail(self, printer_name: str) -> dict:
+        raise BackendUnavailable(self.name)
+
+    def list_jobs(self, printer_name: str) -> list[dict]:
+        raise BackendUnavailable(self.name)
+
+    def printer_snapshot(self) -> list[dict]:
+        raise BackendUnavailable(self.name)
+
+    def enable_printer(self, printer_name: str) -> None:
+        raise BackendUnavailable(self.name)
+
+    def disable_printer(self, printer_name: str, reason: str = "") -> None:
+        raise BackendUnavailable(self.name)
+
+    def accept_jobs(self, printer_name: str) -> None:
+        raise BackendUnavailable(self.name)
+
+    def reject_jobs(self, printer_name: str, reason: str = "") -> None:
+        raise BackendUnavailable(self.name)
+
+    def cancel_job(self, job_id: str | int, purge: bool = False) -> None:
+        raise BackendUnavailable(self.name)
+
+    def clear_queue(self, printer_name: str, purge: bool = False) -> None:
+        raise BackendUnavailable(self.name)
+
+    def remove_printer(self, printer_name: str) -> None:
+        raise BackendUnavailable(self.name)
+
+    def set_default_printer(self, printer_name: str) -> None:
+        raise BackendUnavailable(self.name)
+
+    def print_file(self, printer_name: str, title: str, document: str | Iterable[bytes],
+                   document_format: str, options: dict | None = None, timeout: float = 30) -> int | None:
+        """Submit ``document`` (a path, or a re-iterable of byte chunks) as one job.
+
+        Returns the CUPS job-id. ``options`` are lp-style ``-o`` options (plus
+        ``copies``). Raise BackendUnavailable only when nothing reached cupsd,
+        so the CLI fallback cannot print the document twice.
+        """
+        raise BackendUnavailable(self.name)
+
+
+class IppBackend(CupsBackend):
+    """Status, queue-admin and Print-Job requests to the local cupsd.
+
+    One persistent connection replaces a fork+exec of lpstat/cupsenable/
+    cancel per call, and attribute values come back typed instead of as
+    locale-dependent text. Documents are streamed into Print-Job as they are
+    read or decoded; the job-id comes from the response. Printer creation, PPD options and device
+    discovery stay on lpadmin/lpoptions/the CUPS backends (not implemented
+    here, so they fall back).
+    """
+
+    name = "ipp"
+
+    def __init__(self, client: IppClient | None = None):
+        self._client = client or IppClient()
+
+    @property
+    def client(self) -> IppClient:
+        return self._client
+
+    def close(self) -> None:
+        self._client.close()
+
+    def _request(self, operation: int, attributes: list[tuple], **kwargs) -> list[tuple[int, dict]]:
+        try:
+            return self._client.request(operation, attributes, **kwargs)
+        except IppUnavailable as e:
+            raise BackendUnavailable(str(e)) from e
+
+    def _printer_attributes(self, printer_name: str, requested: list[str]) -> dict:
+        groups = self._request(ipp.GET_PRINTER_ATTRIBUTES, [
+            (ipp.TAG_URI, "printer-uri", self._client.printer_uri(printer_name)),
+            (ipp.TAG_KEYWORD, "requested-attributes", requested),
+        ])
+        for tag, attrs in groups:
+            if tag == ipp.PRINTER_GROUP:
+                return attrs
+        return {}
+
+    def _admin(self, operation: int, description: str, attributes: list[tuple]) -> None:
+        logger.info("%s via IPP", description)
+        try:
+            self._request(operation, attributes, path="/admin/", admin=True)
+        except IppError as e:
+            raise RuntimeError(f"{description} failed: {e}") from e
+
+    # --- reads ----------------------------------------------------------------
+
+    def list_printers(self) -> list[dict]:
+        try:
+            groups = self._request(ipp.CUPS_GET_PRINTERS, [
+                (ipp.TAG_KEYWORD, "requested-attributes",
+                 ["printer-name", "device-uri", "printer-state", "printer-info", "printer-type"]),
+            ])
+        except IppError as e:
+            # client-error-not-found: no queues configured.
+            if e.status != 0x0406:
+                logger.warning("CUPS-Get-Printers failed: %s", e)
+            groups = []
+
+        printers = []
+        for tag, attrs in groups:
+            if tag != ipp.PRINTER_GROUP or not attrs.get("printer-name"):
+                continue
+            printers.append({
+                "name": attrs["printer-name"],
+                "uri": attrs.get("device-uri") or "",
+                "state": _PRINTER_STATES.get(attrs.get("printer-state"), "unknown"),
+                "info": attrs.get("printer-info") or "",
+                "is_default": bool((attrs.get("printer-type") or 0) & _CUPS_PRINTER_DEFAULT),
+            })
+        logger.info("Listed %d CUPS printer(s)", len(printers))
+        return printers
+
+    def get_printer_status(self, printer_name: str) -> str:
+        try:
+            attrs = self._printer_attributes(printer_name, ["printer-state"])
+        except IppError:
+            return "unknown"
+        return {3: "idle", 4: "printing", 5: "disabled"}.get(attrs.get("printer-state"), "unknown")
+
+    def get_printer_detail(self, printer_name: str) -> dict:
+        detail = {
+            "state": "unknown",
+            "state_reasons": [],
+            "accepting_jobs": False,
+            "state_message": "",
+        }
+        try:
+            attrs = self._printer_attributes(printer_name, [
+                "printer-state", "printer-state-reasons",
+                "printer-is-accepting-jobs", "printer-state-message",
+            ])
+        except IppError as e:
+            logger.warning("Get-Printer-Attributes %s failed: %s", printer_name, e)
+            return detail
+
+        return printer_state(attrs)
+
+    def list_jobs(self, printer_name: str) -> list[dict]:
+        try:
+            groups = self._request(ipp.GET_JOBS, [
+                (ipp.TAG_URI, "printer-uri", self._client.printer_uri(printer_name)),
+                (ipp.TAG_KEYWORD, "which-jobs", "not-completed"),
+                (ipp.TAG_KEYWORD, "requested-attributes", _JOB_ATTRIBUTES),
+            ])
+        except IppError as e:
+            logger.debug("Get-Jobs %s failed: %s", printer_name, e)
+            return []
+
+        jobs = [
+            _job_entry(attrs) for tag, attrs in groups
+            if tag == ipp.JOB_GROUP and isinstance(attrs.get("job-id"), int)
+        ]
+        logger.info("Listed %d pending job(s) on '%s'", len(jobs), printer_name)
+        return jobs
+
+    def printer_snapshot(self) -> list[dict]:
+        # Two requests for every queue: CUPS-Get-Printers with the detail
+        # attributes, and Get-Jobs on the server URI (all printers).
+        try:
+            groups = self._request(ipp.CUPS_GET_PRINTERS, [
+                (ipp.TAG_KEYWORD, "requested-attributes", [
+                    "printer-name", "device-uri", "printer-info", "printer-type",
+                    "printer-state", "printer-state-reasons",
+                    "printer-is-accepting-jobs", "printer-state-message",
+                ]),
+            ])
+        except IppError as e:
+            if e.status != 0x0406:
+                logger.warning("CUPS-Get-Printers failed: %s", e)
+            return []
+
+        printers: dict[str, dict] = {}
+        for tag, attrs in groups:
+            if tag != ipp.PRINTER_GROUP or not attrs.get("printer-name"):
+                continue
+            printers[attrs["printer-name"]] = {
+                "name": attrs["printer-name"],
+                "uri": attrs.get("device-uri") or "",
+                "info": attrs.get("printer-info") or "",
+                "is_default": bool((attrs.get("printer-type") or 0) & _CUPS_PRINTER_DEFAULT),
+                **printer_state(attrs),
+                "jobs": [],
+            }
+
+        try:
+            groups = self._request(ipp.GET_JOBS, [
+                (ipp.TAG_URI, "printer-uri", "ipp://localhost/"),
+                (ipp.TAG_KEYWORD, "which-jobs", "not-completed"),
+                (ipp.TAG_KEYWORD, "requested-attributes", _JOB_ATTRIBUTES + ["job-printer-uri"]),
+            ])
+        except IppError as e:
+            logger.debug("Get-Jobs (all printers) failed: %s", e)
+            groups = []
+        for tag, attrs in groups:
+            if tag != ipp.JOB_GROUP or not isinstance(attrs.get("job-id"), int):
+                continue
+            queue = unquote((attrs.get("job-printer-uri") or "").rsplit("/", 1)[-1])
+            if queue in printers:
+                printers[queue]["jobs"].append(_job_entry(attrs))
+        return list(printers.values())
+
+    # --- queue admin ------------------------------------------------------------
+
+    def _printer(self, printer_name: str) -> list[tuple]:
+        return [(ipp.TAG_URI, "printer-uri", self._client.printer_uri(printer_name))]
+
+    def enable_printer(self, printer_name: str) -> None:
+        self._admin(ipp.RESUME_PRINTER, f"Enable printer '{printer_name}'", self._printer(printer_name))
+
+    def disable_printer(self, printer_name: str, reason: str = "") -> None:
+        attrs = self._printer(printer_name)
+        if reason:
+            attrs.append((ipp.TAG_TEXT, "printer-state-message", sanitize_reason(reason)))
+        self._admin(ipp.PAUSE_PRINTER, f"Disable printer '{printer_name}'", attrs)
+
+    def accept_jobs(self, printer_name: str) -> None:
+        self._admin(ipp.CUPS_ACCEPT_JOBS, f"Accept jobs on '{printer_name}'", self._printer(printer_name))
+
+    def reject_jobs(self, printer_name: str, reason: str = "") -> None:
+        attrs = self._printer(printer_name)
+        if reason:
+            attrs.append((ipp.TAG_TEXT, "printer-state-message", sanitize_reason(reason)))
+        self._admin(ipp.CUPS_REJECT_JOBS, f"Reject jobs on '{printer_name}'", attrs)
+
+    def cancel_job(self, job_id: str | int, purge: bool = False) -> None:
+        # Namespaced ids ("hp-42") carry the numeric id after the last dash.
+        text = str(job_id).rsplit("-", 1)[-1]
+        if not text.isdigit():
+            raise BackendUnavailable(f"job id {job_id!r} is not numeric")
+        attrs = [(ipp.TAG_URI, "job-uri", f"ipp://localhost/jobs/{int(text)}")]
+        if purge:
+            attrs.append((ipp.TAG_BOOLEAN, "purge-job", True))
+        self._admin(ipp.CANCEL_JOB, f"Cancel job '{job_id}'", attrs)
+
+    def clear_queue(self, printer_name: str, purge: bool = False) -> None:
+        # Same choice as `cancel -a [-x]`: Purge-Jobs also drops the data files.
+        op = ipp.PURGE_JOBS if purge else ipp.CANCEL_JOBS
+        self._admin(op, f"Clear queue '{printer_name}'", self._printer(printer_name))
+
+    def remove_printer(self, printer_name: str) -> None:
+        self._admin(ipp.CUPS_DELETE_PRINTER, f"Remove printer '{printer_name}'", self._printer(printer_name))
+
+    def set_default_printer(self, printer_name: str) -> None:
+        self._admin(ipp.CUPS_SET_DEFAULT, f"Set default printer '{printer_name}'", self._printer(printer_name))
+
+    # --- job submission ---------------------------------------------------------
+
+    def _default_printer(self) -> str:
+        try:
+            groups = self._request(ipp.CUPS_GET_DEFAULT, [
+                (ipp.TAG_KEYWORD, "requested-attributes", "printer-name"),
+            ])
+        except IppError as e:
+            raise RuntimeError(f"No default printer: {e}") from e
+        for tag, attrs in groups:
+            if tag == ipp.PRINTER_GROUP and attrs.get("printer-name"):
+                return attrs["printer-name"]
+        raise RuntimeError("No default printer")
+
+    def print_file(self, printer_name: str, title: str, document: str | Iterable[bytes],
+                   document_format: str, options: dict | None = None, timeout: float = 30) -> int | None:
+        if not printer_name.strip():
+            printer_name = self._default_printer()
+        try:
+            groups = self._client.send_document(
+                ipp.PRINT_JOB,
+                [
+                    (ipp.TAG_URI, "printer-uri", self._client.printer_uri(printer_name)),
+                    (ipp.TAG_NAME, "job-name", title),
+                    (ipp.TAG_MIME_TYPE, "document-format", document_format),
+                ],
+                [_job_attribute(key, value) for key, value in (options or {}).items()],
+                document,
+                path=f"/printers/{quote(printer_name, safe='')}",
+                timeout=timeout,
+            )
+        except IppUnavailable as e:
+            raise BackendUnavailable(str(e)) from e
+        except IppError as e:
+            raise RuntimeError(f"Failed to submit print job to CUPS: {e}") from e
+
+        for tag, attrs in groups:
+            if tag == ipp.JOB_GROUP and isinstance(attrs.get("job-id"), int):
+                return attrs["job-id"]
+        return None
+
+
+def printer_state(attrs: dict) -> dict:
+    """State, reasons, accepting flag and message of a printer's IPP attributes,
+    in the ``printing.get_printer_detail`` schema ("none" reasons dropped)."""
+    reasons: list[str] = []
+    for reason in as_list(attrs.get("printer-state-reasons")):
+        if reason and reason != "none" and reason not in reasons:
+            reasons.append(reason)
+    return {
+        "state": _PRINTER_STATES.get(attrs.get("printer-state"), "unknown"),
+        "state_reasons": reasons,
+        "accepting_jobs": bool(attrs.get("printer-is-accepting-jobs")),
+        "state_message": (attrs.get("printer-state-message") or "").strip(),
+    }
+
+
+def sanitize_reason(reason: str) -> str:
+    """Make a reason safe for ``cupsdisable -r`` / ``cupsreject -r`` and the
+    IPP ``printer-state-message``.
+
+    CUPS only accepts latin-1 reasons up to 255 chars; non-latin-1 codepoints
+    are replaced with ``?`` so the call doesn't crash on UTF-8 emoji etc.
+    """
+    if not reason:
+        return ""
+    sanitized = reason.encode("latin-1", errors="replace").decode("latin-1")
+    return sanitized[:255]
+
+
+def _job_entry(attrs: dict) -> dict:
+    """A Get-Jobs job group in the ``printing.list_jobs`` schema."""
+    job: dict = {
+        "job-id": attrs["job-id"],
+        "job-originating-user-name": attrs.get("job-originating-user-name") or "",
+        "job-k-octets": attrs.get("job-k-octets") or 0,
+        "job-state": _JOB_STATES.get(attrs.get("job-state"), "pending"),
+    }
+    if isinstance(attrs.get("time-at-creation"), int):
+        job["time-at-creation"] = attrs["time-at-creation"]
+    if attrs.get("job-name"):
+        job["job-name"] = attrs["job-name"]
+    reasons = [r for r in as_list(attrs.get("job-state-reasons")) if r and r != "none"]
+    if reasons:
+        job["job-state-reasons"] = reasons
+    return job
+
+
+def _job_attribute(key: str, value) -> tuple:
+    """lp ``-o key=value`` as a typed IPP job attribute."""
+    if isinstance(value, bool) or value in ("true", "false"):
+        return ipp.TAG_BOOLEAN, key, value in (True, "true")
+    text = str(value)
+    if isinstance(value, int) or text.isdigit():
+        return (ipp.TAG_ENUM if key in _ENUM_OPTIONS else ipp.TAG_INTEGER), key, int(text)
+    # PPD options (InputSlot=Tray1 …) are matched by name whatever the tag.
+    return ipp.TAG_KEYWORD, key, text
+
+
+def create_backend(kind: str = "auto", socket_path: str = ipp.CUPS_SOCKET) -> CupsBackend | None:
+    """Backend for the ``CUPS_BACKEND`` setting; None means CLI tools only.
+
+    ``auto`` picks IPP when the cupsd domain socket exists — over the socket
+    cupsd authenticates us by peer credentials, so admin operations work
+    without a password, exactly as they do for the CLI tools.
+    """
+    kind = (kind or "auto").lower()
+    if kind not in BACKEND_CHOICES:
+        raise ValueError(f"CUPS_BACKEND must be one of {', '.join(BACKEND_CHOICES)}, got {kind!r}")
+    if kind == "cli":
+        return None
+    if kind == "auto" and not os.path.exists(socket_path):
+        logger.info("CUPS socket %s not found, using CLI tools", socket_path)
+        return None
+    return IppBackend(IppClient(socket_path=socket_path))
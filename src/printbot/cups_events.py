@@ -0,0 +1,166 @@
+import logging
+import time
+
+from . import ipp
+from .cups_backend import printer_state
+from .ipp import IppClient, IppError, IppUnavailable
+
+logger = logging.getLogger(__name__)
+
+# CUPS events subscribed to on every queue. Printer events become
+# printer_event messages; job events only bring the next heartbeat forward.
+PRINTER_EVENTS = ["printer-state-changed", "printer-added", "printer-deleted", "printer-config-changed"]
+JOB_EVENTS = ["job-created", "job-completed", "job-stopped"]
+
+# Seconds a subscription lives without renewal. It is renewed at half that,
+# so one left behind by a crashed gateway is gone from cupsd within the hour.
+DEFAULT_LEASE = 3600
+
+# Seconds between two Get-Notifications polls.
+DEFAULT_POLL_INTERVAL = 1.0
+
+# client-error-not-found: cupsd no longer knows the subscription (expired,
+# or cancelled from outside).
+_NOT_FOUND = 0x0406
+
+# Subscriptions on the server URI cover every queue.
+_SERVER_URI = "ipp://localhost/"
+
+
+class CupsEventWatcher:
+    """Printer state changes from a CUPS notification subscription.
+
+    Subscribes once to printer and job events on every queue
+    (Create-Printer-Subscriptions, ``ippget`` pull delivery) and fetches what
+    happened since the last call with Get-Notifications on each ``poll``. A
+    printer event whose state, reasons or accepting flag differ from the last
+    one seen for that printer becomes a ``printer_event`` message; repeats
+    (cupsd sends one per job state change) are dropped. The subscription is
+    renewed at half its lease and created again when cupsd no longer knows
+    it. Blocking — call from a worker thread. Uses the IPP backend's client;
+    a poll without ``notify-wait`` returns at once, so it holds the shared
+    connection no longer than a status query does.
+    """
+
+    def __init__(self, client: IppClient, lease: int = DEFAULT_LEASE, clock=time.monotonic):
+        self._client = client
+        self.lease = lease
+        self._clock = clock
+        self.subscription_id: int | None = None
+        self._sequence = 1
+        self._renew_at = 0.0
+        self._known: dict[str, tuple] = {}
+        # True while the last poll got through: events are flowing.
+        self.live = False
+
+    def _request(self, operation: int, attributes: list[tuple], **kwargs) -> list[tuple[int, dict]]:
+        # A subscription belongs to the user that created it, and cupsd only
+        # lets its authenticated owner poll, renew or cancel it.
+        return self._client.request(operation, [
+            (ipp.TAG_URI, "printer-uri", _SERVER_URI), *attributes,
+        ], admin=True, **kwargs)
+
+    def poll(self) -> tuple[list[dict], bool]:
+        """New printer_event messages, and whether any job event arrived.
+
+        Raises IppUnavailable when cupsd cannot be reached, IppError when it
+        refuses the subscription.
+        """
+        try:
+            events = self._poll()
+        except IppError as e:
+            self.live = False
+            if e.status != _NOT_FOUND or self.subscription_id is None:
+                raise
+            logger.info("CUPS subscription %d is gone, subscribing again", self.subscription_id)
+            self.subscription_id = None
+            self._subscribe()
+            # Whatever happened in between is only in the next heartbeat.
+            events = [], True
+        except Exception:
+            self.live = False
+            raise
+        self.live = True
+        return events
+
+    def _poll(self) -> tuple[list[dict], bool]:
+        if self.subscription_id is None:
+            self._subscribe()
+        elif self._clock() >= self._renew_at:
+            self._renew()
+        groups = self._request(ipp.GET_NOTIFICATIONS, [
+            (ipp.TAG_INTEGER, "notify-subscription-ids", self.subscription_id),
+            (ipp.TAG_INTEGER, "notify-sequence-numbers", self._sequence),
+        ])
+        messages: list[dict] = []
+        job_activity = False
+        for tag, attrs in groups:
+            if tag != ipp.EVENT_NOTIFICATION_GROUP:
+                continue
+            sequence = attrs.get("notify-sequence-number")
+            if isinstance(sequence, int):
+                self._sequence = max(self._sequence, sequence + 1)
+            event = attrs.get("notify-subscribed-event") or ""
+            if event.startswith("job-"):
+                job_activity = True
+                continue
+            message = self._printer_event(event, attrs)
+            if message is not None:
+                messages.append(message)
+        return messages, job_activity
+
+    def _printer_event(self, event: str, attrs: dict) -> dict | None:
+        name = attrs.get("printer-name")
+        if not name:
+            return None
+        if event == "printer-deleted":
+            self._known.pop(name, None)
+            return {"type": "printer_event", "printer_name": name, "event": event}
+        state = printer_state(attrs)
+        key = (state["state"], tuple(state["state_reasons"]), state["accepting_jobs"])
+        if self._known.get(name) == key:
+            return None
+        self._known[name] = key
+        return {
+            "type": "printer_event",
+            "printer_name": name,
+            "event": event,
+            "state": state["state"],
+            "state_reasons": state["state_reasons"],
+            "accepting_jobs": state["accepting_jobs"],
+            "message": (attrs.get("notify-text") or "").strip(),
+        }
+
+    def _subscribe(self) -> None:
+        groups = self._request(ipp.CREATE_PRINTER_SUBSCRIPTIONS, [], subscription=[
+            (ipp.TAG_KEYWORD, "notify-pull-method", "ippget"),
+            (ipp.TAG_KEYWORD, "notify-events", PRINTER_EVENTS + JOB_EVENTS),
+            (ipp.TAG_INTEGER, "notify-lease-duration", self.lease),
+        ])
+        for tag, attrs in groups:
+            if tag == ipp.SUBSCRIPTION_GROUP and isinstance(attrs.get("notify-subscription-id"), int):
+                self.subscription_id = attrs["notify-subscription-id"]
+                self._sequence = 1
+                self._renew_at = self._clock() + self.lease / 2
+                logger.info("Subscribed to CUPS printer events (subscription %d)", self.subscription_id)
+                return
+        raise RuntimeError("Create-Printer-Subscriptions returned no subscription id")
+
+    def _renew(self) -> None:
+        self._request(ipp.RENEW_SUBSCRIPTION, [
+            (ipp.TAG_INTEGER, "notify-subscription-id", self.subscription_id),
+        ], subscription=[(ipp.TAG_INTEGER, "notify-lease-duration", self.lease)])
+        self._renew_at = self._clock() + self.lease / 2
+
+    def close(self) -> None:
+        """Cancel the subscription (best effort). The client stays open; it
+        belongs to the backend."""
+        if self.subscription_id is not None:
+            try:
+                self._request(ipp.CANCEL_SUBSCRIPTION, [
+                    (ipp.TAG_INTEGER, "notify-subscription-id", self.subscription_id),
+                ])
+            except (IppError, IppUnavailable) as e:
+                logger.debug("Cancel-Subscription %d failed: %s", self.subscription_id, e)
+            self.subscription_id = None
+        self.live = False
@@ -0,0 +1,117 @@
+import asyncio
+import binascii
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .messages import LazyPayload
+from .spool import remove_spool_file, reserve_spool_file, spool_base64
+
+logger = logging.getLogger(__name__)
+
+# Base64 payloads at least this long are decoded in worker processes; smaller
+# ones are quicker in a thread than the round trip to another process.
+OFFLOAD_MIN_BYTES = 1024 * 1024
+
+# Base64 characters per worker task (a multiple of 4). Each task is pickled
+# to a worker on its own, so the hand-off never holds the GIL for long.
+OFFLOAD_WINDOW = 1024 * 1024
+
+
+def _decode_window(path: str, offset: int, chunk: str | bytes) -> int:
+    """Worker side: decode one window and write it at ``offset`` in ``path``."""
+    try:
+        data = binascii.a2b_base64(chunk)
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 payload: {e}") from None
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        os.pwrite(fd, data, offset)
+    finally:
+        os.close(fd)
+    return len(data)
+
+
+class DecodePool:
+    """Decode large base64 ``payload`` strings into spool files off the event loop.
+
+    ``binascii`` holds the GIL while it decodes, so a 20 MB payload decoded
+    in a thread competes with the receive loop, pings and heartbeats for
+    one core. Payloads of at least ``min_bytes`` go to a small process pool
+    instead: the gateway reserves the spool file (keeping the RAM tier
+    budget in one place) and hands out fixed-size windows, which the workers
+    decode in parallel and write at their own offsets. At most two windows
+    per worker are in flight, so the payload is never copied as a whole.
+
+    Smaller payloads, ``workers=0`` and a broken pool fall back to a thread.
+    Workers are started on first use (spawn, so no lock or socket state is
+    inherited from the gateway's threads).
+    """
+
+    def __init__(self, workers: int = 2, min_bytes: int = OFFLOAD_MIN_BYTES, window: int = OFFLOAD_WINDOW):
+        self.workers = max(0, workers)
+        self.min_bytes = min_bytes
+        self.window = window
+        self._executor: ProcessPoolExecutor | None = None
+        self.offloaded = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def spool(self, payload: LazyPayload, suffix: str = ".bin") -> str:
+        """Decode ``payload`` into a new spool file and return its path.
+
+        Raises ValueError on invalid base64, leaving nothing behind.
+        """
+        if not self.workers or len(payload) < self.min_bytes:
+            return await asyncio.to_thread(spool_base64, payload, suffix)
+
+        expected = payload.decoded_size()
+        path = await asyncio.to_thread(reserve_spool_file, suffix, expected)
+        try:
+            size = await self._decode(payload, path)
+        except BrokenProcessPool:
+            remove_spool_file(path)
+            logger.warning("Decode worker died, decoding in a thread and restarting the pool")
+            self._executor = None
+            return await asyncio.to_thread(spool_base64, payload, suffix)
+        except BaseException:
+            remove_spool_file(path)
+            raise
+        if size != expected:
+            remove_spool_file(path)
+            raise ValueError(f"Payload decoded to {size} bytes, expected {expected}")
+        self.offloaded += 1
+        return path
+
+    async def _decode(self, payload: LazyPayload, path: str) -> int:
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        pending: set[asyncio.Future] = set()
+        size = offset = 0
+        try:
+            for chunk in payload.windows(self.window):
+                if len(pending) >= 2 * self.workers:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    size += sum(f.result() for f in done)
+                pending.add(loop.run_in_executor(pool, _decode_window, path, offset, chunk))
+                offset += len(chunk) * 3 // 4
+            for f in asyncio.as_completed(pending):
+                size += await f
+        finally:
+            # After a failure, windows not yet started are dropped; one still
+            # running finds its file gone or writes to an unlinked inode.
+            for f in pending:
+                f.cancel()
+        return size
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
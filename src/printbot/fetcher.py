@@ -0,0 +1,119 @@
+import logging
+import re
+
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from .spool import SpoolWriter
+
+logger = logging.getLogger(__name__)
+
+# Network hiccups worth resuming after; HTTP 4xx/5xx and checksum errors are not.
+_TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-\d+/(\d+|\*)")
+
+
+class PayloadFetcher:
+    """Download out-of-band print payloads (``payload_url`` jobs) to spool files.
+
+    One ``requests.Session`` is shared by every download so connections to the
+    payload host stay alive between jobs. A dropped transfer is resumed with a
+    ``Range`` request from the last byte on disk rather than starting over;
+    servers that ignore ``Range`` (plain 200) restart the file from scratch.
+    ``fetch`` is blocking — run it in a worker thread.
+    """
+
+    def __init__(
+        self,
+        api_key: str = "",
+        pool_size: int = 4,
+        attempts: int = 5,
+        timeout: float = 30,
+        chunk_size: int = 64 * 1024,
+    ):
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        if api_key:
+            self._session.headers["Authorization"] = f"Bearer {api_key}"
+        self._attempts = attempts
+        self._timeout = timeout
+        self._chunk_size = chunk_size
+
+    def fetch(
+        self,
+        url: str,
+        sha256: str,
+        suffix: str = ".bin",
+        expected_size: int | None = None,
+    ) -> str:
+        """Download ``url`` into a new spool file and return its path.
+
+        Raises ValueError on a missing ``sha256`` (nothing is downloaded),
+        on checksum/size mismatch, and requests exceptions on HTTP errors or
+        when every resume attempt failed; the partial file is removed in all
+        failure cases.
+        """
+        expected_hash = sha256.removeprefix("sha256:").lower()
+        if not expected_hash:
+            raise ValueError(f"No sha256 given for {url}")
+        writer = SpoolWriter(suffix, expected_size)
+        try:
+            for attempt in Retrying(
+                stop=stop_after_attempt(self._attempts),
+                wait=wait_exponential(multiplier=0.5, max=10),
+                retry=retry_if_exception_type(_TRANSIENT_ERRORS),
+                reraise=True,
+            ):
+                with attempt:
+                    if attempt.retry_state.attempt_number > 1:
+                        logger.info("Resuming download of %s at byte %d (attempt %d)",
+                                    url, writer.size, attempt.retry_state.attempt_number)
+                    self._download(url, writer)
+
+            if writer.hexdigest() != expected_hash:
+                raise ValueError(
+                    f"Checksum mismatch: expected {expected_hash}, got {writer.hexdigest()}"
+                )
+            if expected_size is not None and writer.size != expected_size:
+                raise ValueError(f"Size mismatch: expected {expected_size} bytes, got {writer.size}")
+        except BaseException:
+            writer.discard()
+            raise
+
+        logger.info("Downloaded %d bytes from %s", writer.size, url)
+        return writer.close()
+
+    def _download(self, url: str, writer: SpoolWriter) -> None:
+        headers = {}
+        if writer.size:
+            headers["Range"] = f"bytes={writer.size}-"
+        with self._session.get(url, stream=True, timeout=self._timeout, headers=headers) as resp:
+            if resp.status_code == 416 and writer.size:
+                # Nothing left past what we already hold.
+                return
+            resp.raise_for_status()
+            if writer.size:
+                start = _content_range_start(resp)
+                if resp.status_code != 206 or start is None:
+                    logger.info("Server ignored Range for %s, restarting download", url)
+                    writer.truncate()
+                elif start != writer.size:
+                    raise ValueError(f"Server resumed at byte {start}, expected {writer.size}")
+            for chunk in resp.iter_content(chunk_size=self._chunk_size):
+                writer.write(chunk)
+
+    def close(self) -> None:
+        self._session.close()
+
+
+def _content_range_start(resp: requests.Response) -> int | None:
+    m = _CONTENT_RANGE_RE.match(resp.headers.get("Content-Range", ""))
+    return int(m.group(1)) if m else None
@@ -0,0 +1,62 @@
+from .scheduler import job_size
+
+# Print jobs the gateway holds at once (spooling, queued, printing) before
+# new ones are deferred back to the server.
+DEFAULT_CREDIT_JOBS = 32
+
+# Payload bytes of those jobs. A single job larger than the window is still
+# accepted when nothing else is held, so it cannot be deferred for ever.
+DEFAULT_CREDIT_BYTES = 128 * 1024 * 1024
+
+
+class CreditWindow:
+    """How much print work the gateway takes on before the server must wait.
+
+    Each job holds one job credit and its payload size in byte credits from
+    the moment its header arrives until its final status is sent. ``acquire``
+    refuses a job that does not fit, and the gateway answers it with
+    ``job_status: deferred``; the server keeps it and resends once a
+    ``flow_credit`` message shows room again. Keyed by job id, so a
+    retransmission of a held job does not count twice.
+    """
+
+    def __init__(self, jobs: int = DEFAULT_CREDIT_JOBS, size: int = DEFAULT_CREDIT_BYTES):
+        self.jobs = max(1, jobs)
+        self.bytes = max(0, size)
+        self._held: dict[str, int] = {}
+        self._used = 0
+        self.deferred = 0
+
+    def acquire(self, job_id: str, job: dict) -> bool:
+        """Take credits for ``job``; False (nothing taken) when it does not fit."""
+        if job_id in self._held:
+            return True
+        size = job_size(job)
+        if len(self._held) >= self.jobs or (self._held and self._used + size > self.bytes):
+            self.deferred += 1
+            return False
+        self._held[job_id] = size
+        self._used += size
+        return True
+
+    def release(self, job_id: str) -> bool:
+        size = self._held.pop(job_id, None)
+        if size is None:
+            return False
+        self._used -= size
+        return True
+
+    def available(self) -> dict:
+        """Credits left, as advertised to the server."""
+        return {
+            "jobs": self.jobs - len(self._held),
+            "bytes": max(0, self.bytes - self._used),
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "held_jobs": len(self._held),
+            "held_bytes": self._used,
+            **{f"available_{k}": v for k, v in self.available().items()},
+            "deferred": self.deferred,
+        }
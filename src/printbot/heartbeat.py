@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Seconds one heartbeat may spend waiting for its probes. Probes still
+# running then are reported from their last good value, marked stale.
+DEFAULT_HEARTBEAT_BUDGET = 3.0
+
+# printers[] entries per heartbeat when every CUPS queue is reported; larger
+# sets are spread over several heartbeats.
+DEFAULT_ROUND_SIZE = 50
+
+# Delta heartbeats between two full snapshots.
+DEFAULT_FULL_EVERY = 10
+
+# Seconds between heartbeats right after a change or job activity.
+DEFAULT_MIN_INTERVAL = 5.0
+
+
+class _Probe:
+    __slots__ = ("task", "value", "has_value", "updated")
+
+    def __init__(self):
+        self.task: asyncio.Future | None = None
+        self.value: Any = None
+        self.has_value = False
+        self.updated = 0.0
+
+
+class HeartbeatCollector:
+    """Runs a heartbeat's blocking probes (lpstat, socket calls) in threads.
+
+    ``collect`` starts every probe at once and waits at most ``budget``
+    seconds in total. A probe that misses the deadline keeps running in its
+    thread and is reported from its last good value; it is never started a
+    second time while still running, so a hung cupsd ties up one thread per
+    probe, not one per heartbeat. Its result is kept once it does finish.
+    A probe that raises also falls back to its last good value.
+    """
+
+    def __init__(self, budget: float = DEFAULT_HEARTBEAT_BUDGET, clock=time.monotonic):
+        self.budget = budget
+        self._clock = clock
+        self._probes: dict[str, _Probe] = {}
+        self.missed = 0
+
+    async def collect(
+        self, probes: dict[str, Callable[[], Any]], ttl: dict[str, float] | None = None,
+    ) -> tuple[dict[str, Any], list[str]]:
+        """Run ``probes`` (name -> blocking callable) within the budget.
+
+        Returns (values, stale names). A name with no value yet is left out
+        of ``values``. ``ttl`` gives seconds a value stays fresh enough to
+        skip running the probe at all (e.g. the local IP).
+        """
+        ttl = ttl or {}
+        now = self._clock()
+        waiting = []
+        for name, fn in probes.items():
+            probe = self._probes.setdefault(name, _Probe())
+            if probe.has_value and now - probe.updated < ttl.get(name, 0):
+                continue
+            if probe.task is None:
+                probe.task = asyncio.ensure_future(asyncio.to_thread(fn))
+                probe.task.add_done_callback(lambda t, p=probe: self._finished(p, t))
+            waiting.append(probe.task)
+        if waiting:
+            await asyncio.wait(waiting, timeout=self.budget)
+
+        values: dict[str, Any] = {}
+        stale: list[str] = []
+        for name in probes:
+            probe = self._probes[name]
+            if probe.has_value:
+                values[name] = probe.value
+            # Fresh: finished during this round, or still within its ttl.
+            if not probe.has_value or (
+                probe.updated < now and now - probe.updated >= ttl.get(name, 0)
+            ):
+                stale.append(name)
+        if stale:
+            self.missed += 1
+            logger.warning("Heartbeat probes over budget or failing: %s", ", ".join(stale))
+        return values, stale
+
+    def _finished(self, probe: _Probe, task: asyncio.Future) -> None:
+        probe.task = None
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.warning("Heartbeat probe failed: %s", task.exception())
+            return
+        probe.value = task.result()
+        probe.has_value = True
+        probe.updated = self._clock()
+
+
+class PrinterRounds:
+    """Spread the printers[] of a gateway with many queues over heartbeats.
+
+    Queues are taken in name order, ``size`` per heartbeat, cycling through
+    the whole set; printers passed as ``always`` (the configured one, busy
+    lanes) are in every round. ``size`` 0 reports everything every time.
+    """
+
+    def __init__(self, size: int = DEFAULT_ROUND_SIZE):
+        self.size = max(0, size)
+        self._next = 0
+
+    def select(self, names: list[str], always: list[str]) -> tuple[list[str], dict | None]:
+        """(names for this heartbeat, round info or None when not split)."""
+        names = sorted(names)
+        if not self.size or len(names) <= self.size:
+            return names, None
+        count = math.ceil(len(names) / self.size)
+        index = self._next % count
+        self._next = index + 1
+        chosen = names[index * self.size:(index + 1) * self.size]
+        chosen += [n for n in always if n in names and n not in chosen]
+        return chosen, {"index": index, "count": count, "total": len(names)}
+
+
+class HeartbeatCadence:
+    """Adaptive heartbeat interval.
+
+    Drops to ``minimum`` when the reported printer state changes (state,
+    reasons, accepting flag, pending job count), while jobs are in flight
+    and on ``activity``; otherwise doubles after every heartbeat, up to
+    ``maximum``. A busy or changing gateway reports within seconds and an
+    idle one stops polling lpstat every beat. State is compared per key,
+    so a heartbeat carrying only some printers (rounds) is no change.
+    """
+
+    def __init__(self, minimum: float = DEFAULT_MIN_INTERVAL, maximum: float = 30.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = self.floor
+        self._state: dict = {}
+        self._activity = False
+
+    @property
+    def floor(self) -> float:
+        return min(self.minimum, self.maximum)
+
+    def observe(self, state: dict, active: bool = False) -> float:
+        """Interval until the next heartbeat, given this heartbeat's ``state``."""
+        changed = any(key not in self._state or self._state[key] != value for key, value in state.items())
+        self._state.update(state)
+        if active or changed or self._activity:
+            self.interval = self.floor
+        else:
+            self.interval = min(self.interval * 2, self.maximum)
+        self._activity = False
+        return self.interval
+
+    def activity(self) -> None:
+        """Something happened: next heartbeat after ``minimum``, and the one after too."""
+        self.interval = self.floor
+        self._activity = True
+
+
+def merge_patch(old: dict, new: dict) -> dict:
+    """RFC 7386 merge patch that turns ``old`` into ``new``.
+
+    Unchanged keys are left out, nested dicts are diffed key by key, and a
+    removed key is sent as None. Lists are replaced whole.
+    """
+    patch: dict = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            sub = merge_patch(old[key], value)
+            if sub:
+                patch[key] = sub
+        elif value != old[key]:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+class DeltaEncoder:
+    """Turns full heartbeats into merge patches against the last full one.
+
+    Every heartbeat gets an increasing ``hb_seq``. A full snapshot goes out
+    first, every ``full_every`` + 1 heartbeats after that, and on the next
+    heartbeat after ``request_full`` (reconnect, or the server lost the
+    baseline). The heartbeats in between carry only a ``patch`` against
+    that snapshot (``base_seq``), not against the previous delta, so a
+    dropped delta costs nothing. ``printers`` is keyed by name in the
+    patch so one printer's change does not resend the whole list.
+
+    A snapshot only becomes the base once ``confirm`` reports it written:
+    the heartbeat lane drops the oldest frame, so a queued snapshot can be
+    replaced before it is sent. Until then every heartbeat is a full one.
+    """
+
+    def __init__(self, full_every: int = DEFAULT_FULL_EVERY):
+        self.full_every = max(0, full_every)
+        self.seq = 0
+        self._base: dict | None = None
+        self._base_seq = 0
+        self._deltas = 0
+        # The last full snapshot handed out, not yet confirmed: (hb_seq, body).
+        self._pending: tuple[int, dict] | None = None
+
+    def request_full(self) -> None:
+        self._base = None
+        self._pending = None
+
+    def confirm(self, seq: int) -> None:
+        """Full snapshot ``seq`` is on the wire; deltas may refer to it."""
+        if self._pending is not None and self._pending[0] == seq:
+            self._base_seq, self._base = self._pending
+            self._pending = None
+            self._deltas = 0
+
+    def encode(self, heartbeat: dict) -> dict:
+        self.seq += 1
+        body = {k: v for k, v in heartbeat.items() if k not in ("type", "gateway_id")}
+        body["printers"] = {p["name"]: p for p in body.get("printers", [])}
+        if self._base is None or self._deltas >= self.full_every:
+            self._pending = (self.seq, body)
+            return {**heartbeat, "hb_seq": self.seq, "full": True}
+        self._deltas += 1
+        return {
+            "type": heartbeat["type"],
+            "gateway_id": heartbeat.get("gateway_id"),
+            "hb_seq": self.seq,
+            "base_seq": self._base_seq,
+            "patch": merge_patch(self._base, body),
+        }
@@ -0,0 +1,413 @@
+import getpass
+import http.client
+import logging
+import os
+import socket
+import struct
+import threading
+from collections.abc import Iterable
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+CUPS_SOCKET = "/run/cups/cups.sock"
+
+# Operation ids (RFC 8011 + CUPS extensions).
+PRINT_JOB = 0x0002
+GET_JOBS = 0x000A
+GET_PRINTER_ATTRIBUTES = 0x000B
+CANCEL_JOB = 0x0008
+PAUSE_PRINTER = 0x0010
+RESUME_PRINTER = 0x0011
+PURGE_JOBS = 0x0012
+CREATE_PRINTER_SUBSCRIPTIONS = 0x0016
+RENEW_SUBSCRIPTION = 0x001A
+CANCEL_SUBSCRIPTION = 0x001B
+GET_NOTIFICATIONS = 0x001C
+CANCEL_JOBS = 0x0038
+CUPS_GET_DEFAULT = 0x4001
+CUPS_GET_PRINTERS = 0x4002
+CUPS_DELETE_PRINTER = 0x4004
+CUPS_ACCEPT_JOBS = 0x4008
+CUPS_REJECT_JOBS = 0x4009
+CUPS_SET_DEFAULT = 0x400A
+
+# Delimiter tags.
+OPERATION_GROUP = 0x01
+JOB_GROUP = 0x02
+END_OF_ATTRIBUTES = 0x03
+PRINTER_GROUP = 0x04
+SUBSCRIPTION_GROUP = 0x06
+EVENT_NOTIFICATION_GROUP = 0x07
+
+# Value tags.
+TAG_INTEGER = 0x21
+TAG_BOOLEAN = 0x22
+TAG_ENUM = 0x23
+TAG_TEXT = 0x41
+TAG_NAME = 0x42
+TAG_KEYWORD = 0x44
+TAG_URI = 0x45
+TAG_CHARSET = 0x47
+TAG_LANGUAGE = 0x48
+TAG_MIME_TYPE = 0x49
+
+_BEGIN_COLLECTION = 0x34
+_END_COLLECTION = 0x37
+_MEMBER_NAME = 0x4A
+_TEXT_WITH_LANGUAGE = 0x35
+_NAME_WITH_LANGUAGE = 0x36
+_DATE_TIME = 0x31
+_RESOLUTION = 0x32
+_RANGE = 0x33
+
+# Status codes that mean "this transport can't do that" rather than "CUPS
+# said no": not-authenticated / not-authorized / forbidden.
+_AUTH_STATUSES = {0x0401, 0x0402, 0x0403}
+
+
+class IppUnavailable(Exception):
+    """cupsd unreachable or refused authentication — use another path."""
+
+
+class IppError(RuntimeError):
+    """cupsd processed the request and returned an error status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message or f"IPP status 0x{status:04x}")
+        self.status = status
+
+
+# --- encoding ---------------------------------------------------------------
+
+
+def _attr(tag: int, name: str, values) -> bytes:
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    out = bytearray()
+    for i, value in enumerate(values):
+        encoded_name = name.encode() if i == 0 else b""
+        if tag in (TAG_INTEGER, TAG_ENUM):
+            data = struct.pack(">i", value)
+        elif tag == TAG_BOOLEAN:
+            data = b"\x01" if value else b"\x00"
+        else:
+            data = value.encode("utf-8")
+        out += struct.pack(">BH", tag, len(encoded_name)) + encoded_name
+        out += struct.pack(">H", len(data)) + data
+    return bytes(out)
+
+
+def encode_request(operation: int, request_id: int, attributes: list[tuple],
+                   job_attributes: list[tuple] = (), group_tag: int = JOB_GROUP) -> bytes:
+    """Serialise an IPP/1.1 request header.
+
+    ``attributes`` are (tag, name, value-or-values) for the operation group;
+    charset and natural language are added first. ``job_attributes`` (same
+    shape) form a second group when given: a job group, or the group named
+    by ``group_tag`` (e.g. SUBSCRIPTION_GROUP).
+    """
+    out = bytearray(struct.pack(">BBHI", 1, 1, operation, request_id))
+    out.append(OPERATION_GROUP)
+    out += _attr(TAG_CHARSET, "attributes-charset", "utf-8")
+    out += _attr(TAG_LANGUAGE, "attributes-natural-language", "en")
+    for tag, name, value in attributes:
+        out += _attr(tag, name, value)
+    if job_attributes:
+        out.append(group_tag)
+        for tag, name, value in job_attributes:
+            out += _attr(tag, name, value)
+    out.append(END_OF_ATTRIBUTES)
+    return bytes(out)
+
+
+# --- decoding ---------------------------------------------------------------
+
+
+def _decode_value(tag: int, data: bytes):
+    if tag in (TAG_INTEGER, TAG_ENUM):
+        return struct.unpack(">i", data)[0]
+    if tag == TAG_BOOLEAN:
+        return data != b"\x00"
+    if tag in (_TEXT_WITH_LANGUAGE, _NAME_WITH_LANGUAGE):
+        (lang_len,) = struct.unpack_from(">H", data, 0)
+        (text_len,) = struct.unpack_from(">H", data, 2 + lang_len)
+        return data[4 + lang_len:4 + lang_len + text_len].decode("utf-8", "replace")
+    if tag == _DATE_TIME:
+        return data
+    if tag == _RESOLUTION:
+        return struct.unpack(">iib", data)
+    if tag == _RANGE:
+        return struct.unpack(">ii", data)
+    if 0x10 <= tag <= 0x1F:
+        return None  # out-of-band: unsupported / unknown / no-value
+    if 0x40 <= tag <= 0x5F:
+        return data.decode("utf-8", "replace")
+    return data
+
+
+class _Reader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def take(self, n: int) -> bytes:
+        if self.pos + n > len(self.data):
+            raise ValueError("Truncated IPP response")
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    def attribute(self) -> tuple[int, str, bytes]:
+        tag = self.take(1)[0]
+        (name_len,) = struct.unpack(">H", self.take(2))
+        name = self.take(name_len).decode("utf-8", "replace")
+        (value_len,) = struct.unpack(">H", self.take(2))
+        return tag, name, self.take(value_len)
+
+
+def _read_collection(reader: _Reader) -> dict:
+    out: dict = {}
+    member = ""
+    while True:
+        tag, _name, data = reader.attribute()
+        if tag == _END_COLLECTION:
+            return out
+        if tag == _MEMBER_NAME:
+            member = data.decode("utf-8", "replace")
+            continue
+        value = _read_collection(reader) if tag == _BEGIN_COLLECTION else _decode_value(tag, data)
+        _add_value(out, member, value)
+
+
+def _add_value(group: dict, name: str, value) -> None:
+    if name in group:
+        existing = group[name]
+        if isinstance(existing, list):
+            existing.append(value)
+        else:
+            group[name] = [existing, value]
+    else:
+        group[name] = value
+
+
+def decode_response(data: bytes) -> tuple[int, list[tuple[int, dict]]]:
+    """Parse an IPP response into (status, [(group_tag, {name: value})]).
+
+    Multi-valued attributes become lists; single values stay scalars.
+    """
+    if len(data) < 8:
+        raise ValueError("Truncated IPP response")
+    _major, _minor, status, _request_id = struct.unpack_from(">BBHI", data, 0)
+    reader = _Reader(data, 8)
+    groups: list[tuple[int, dict]] = []
+    current: dict | None = None
+    last_name = ""
+    while reader.pos < len(data):
+        tag = data[reader.pos]
+        if tag == END_OF_ATTRIBUTES:
+            break
+        if tag < 0x10:
+            reader.pos += 1
+            current = {}
+            groups.append((tag, current))
+            continue
+        if current is None:
+            raise ValueError("IPP attribute outside a group")
+        tag, name, value_data = reader.attribute()
+        if name:
+            last_name = name
+        value = _read_collection(reader) if tag == _BEGIN_COLLECTION else _decode_value(tag, value_data)
+        if name:
+            current[name] = value
+        else:
+            # Additional value of the previous attribute.
+            existing = current[last_name]
+            if isinstance(existing, list):
+                existing.append(value)
+            else:
+                current[last_name] = [existing, value]
+    return status, groups
+
+
+def as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+# --- transport --------------------------------------------------------------
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self._path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+DOCUMENT_CHUNK = 64 * 1024
+
+
+def _document_body(header: bytes, document: str | Iterable[bytes]):
+    yield header
+    if isinstance(document, str):
+        with open(document, "rb") as f:
+            while chunk := f.read(DOCUMENT_CHUNK):
+                yield chunk
+    else:
+        yield from document
+
+
+def _result(data: bytes) -> list[tuple[int, dict]]:
+    status, groups = decode_response(data)
+    if status < 0x0100:
+        return groups
+    message = ""
+    if groups and groups[0][0] == OPERATION_GROUP:
+        message = groups[0][1].get("status-message") or ""
+    if status in _AUTH_STATUSES:
+        raise IppUnavailable(f"IPP request not authorized: {message or hex(status)}")
+    raise IppError(status, message)
+
+
+class IppClient:
+    """Minimal IPP client for the local cupsd.
+
+    Talks over the CUPS domain socket when it exists (authenticating as the
+    process user via ``PeerCred``, like the CUPS CLI tools do) and over
+    ``localhost:631`` otherwise. One keep-alive HTTP connection is reused
+    for every request and serialised with a lock; a request that fails on a
+    stale connection is retried once on a fresh one. Blocking — call from a
+    worker thread.
+    """
+
+    def __init__(self, socket_path: str = CUPS_SOCKET, host: str = "localhost",
+                 port: int = 631, timeout: float = 10):
+        self._socket_path = socket_path
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._conn: http.client.HTTPConnection | None = None
+        self._lock = threading.Lock()
+        self._request_id = 0
+        self._user = getpass.getuser()
+
+    @property
+    def uses_socket(self) -> bool:
+        return bool(self._socket_path) and os.path.exists(self._socket_path)
+
+    def printer_uri(self, printer_name: str) -> str:
+        return f"ipp://localhost/printers/{quote(printer_name, safe='')}"
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        if self.uses_socket:
+            return _UnixHTTPConnection(self._socket_path, timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=timeout)
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            self._conn = self._new_connection(self._timeout)
+        return self._conn
+
+    def _header(self, operation: int, attributes: list[tuple], job_attributes: list[tuple] = (),
+                group_tag: int = JOB_GROUP) -> bytes:
+        with self._lock:
+            self._request_id += 1
+            request_id = self._request_id
+        return encode_request(
+            operation, request_id,
+            [(TAG_NAME, "requesting-user-name", self._user), *attributes],
+            job_attributes, group_tag,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def request(self, operation: int, attributes: list[tuple], path: str = "/",
+                admin: bool = False, subscription: list[tuple] = ()) -> list[tuple[int, dict]]:
+        """Send one request; returns the response groups or raises.
+
+        ``subscription`` attributes go in a subscription template group.
+        Raises IppUnavailable when cupsd can't be reached or refuses the
+        credentials, IppError for any other non-successful status.
+        """
+        body = self._header(operation, attributes, subscription, SUBSCRIPTION_GROUP)
+        headers = {"Content-Type": "application/ipp"}
+        if admin and self.uses_socket:
+            headers["Authorization"] = f"PeerCred {self._user}"
+        with self._lock:
+            data = self._post(path, body, headers)
+        return _result(data)
+
+    def send_document(self, operation: int, attributes: list[tuple], job_attributes: list[tuple],
+                      document: str | Iterable[bytes], path: str, timeout: float) -> list[tuple[int, dict]]:
+        """Send a request with ``document`` (a file path or byte chunks) as its body.
+
+        The body is streamed with chunked transfer encoding on a dedicated
+        connection, so a long upload never holds up status queries on the
+        shared one. Only a failure to connect (or an auth refusal, after which
+        cupsd has created nothing) raises IppUnavailable; once the document
+        started flowing cupsd may have accepted the job, so transfer errors
+        raise RuntimeError — never resubmit those elsewhere.
+        """
+        header = self._header(operation, attributes, job_attributes)
+        conn = self._new_connection(timeout)
+        try:
+            try:
+                conn.connect()
+            except OSError as e:
+                raise IppUnavailable(f"cupsd unreachable: {e}") from e
+            try:
+                conn.request(
+                    "POST", path, body=_document_body(header, document),
+                    headers={"Content-Type": "application/ipp"}, encode_chunked=True,
+                )
+                resp = conn.getresponse()
+                data = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                raise RuntimeError(f"IPP document transfer failed: {e}") from e
+        finally:
+            conn.close()
+        if resp.status == 401:
+            raise IppUnavailable("cupsd requires authentication")
+        if resp.status != 200:
+            raise RuntimeError(f"cupsd returned HTTP {resp.status}")
+        return _result(data)
+
+    def _post(self, path: str, body: bytes, headers: dict) -> bytes:
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                self._conn = None
+                if attempt == 2:
+                    raise IppUnavailable(f"cupsd unreachable: {e}") from e
+                continue
+            if resp.status == 401:
+                raise IppUnavailable("cupsd requires authentication")
+            if resp.status != 200:
+                raise IppUnavailable(f"cupsd returned HTTP {resp.status}")
+            if resp.will_close:
+                conn.close()
+                self._conn = None
+            return data
+        raise AssertionError("unreachable")
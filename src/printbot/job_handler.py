@@ -1,11 +1,13 @@
 import base64
 import logging
 import os
-import sqlite3
-import tempfile
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
-from .printing import print_pdf, print_raw
+from . import state_db
+from .messages import LazyPayload
+from .printing import pdf_options, print_pdf, print_raw
+from .spool import remove_spool_file
 
 logger = logging.getLogger(__name__)
 
@@ -18,19 +20,11 @@ CREATE TABLE IF NOT EXISTS printed_jobs (
 
 
 def _init_db(state_dir: str) -> str:
-    os.makedirs(state_dir, exist_ok=True)
-    db_path = os.path.join(state_dir, "state.db")
-    con = sqlite3.connect(db_path)
-    try:
-        con.execute(DB_SCHEMA)
-        con.commit()
-    finally:
-        con.close()
-    return db_path
+    return state_db.init_db(state_dir, DB_SCHEMA)
 
 
 def _already_printed(db_path: str, job_id: str) -> bool:
-    con = sqlite3.connect(db_path)
+    con = state_db.connect(db_path)
     try:
         cur = con.execute("SELECT 1 FROM printed_jobs WHERE job_id = ?", (job_id,))
         return cur.fetchone() is not None
@@ -39,7 +33,7 @@ def _already_printed(db_path: str, job_id: str) -> bool:
 
 
 def _mark_printed(db_path: str, job_id: str) -> None:
-    con = sqlite3.connect(db_path)
+    con = state_db.connect(db_path)
     try:
         con.execute(
             "INSERT OR IGNORE INTO printed_jobs (job_id, printed_utc) VALUES (?, ?)",
@@ -50,20 +44,76 @@ def _mark_printed(db_path: str, job_id: str) -> None:
         con.close()
 
 
-def handle_print_job(job: dict, printer_name: str, state_dir: str, dry_run: bool = False) -> dict:
-    """Handle a print job received from the server.
+class _InlinePayload:
+    """Decoded bytes of a base64 ``payload`` carried in the job message.
 
-    Args:
-        job: WebSocket message with type=print, job_id, payload (base64 PDF), metadata
-        printer_name: CUPS printer name
-        state_dir: Directory for state database
-        dry_run: Simulate printing
+    Produced window by window on iteration (large frames keep the base64 in
+    the raw frame as a LazyPayload), so the document is piped to CUPS without
+    a temp file. Iterating again starts over, which lets a submission that
+    could not reach cupsd be retried through ``lp``. ``len()`` approximates
+    the decoded size, for logging and the submission timeout.
+    """
 
-    Returns:
-        {"status": "completed"} or {"status": "failed", "error": "..."}
+    __slots__ = ("_payload",)
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def __len__(self) -> int:
+        return len(self._payload) * 3 // 4
+
+    def __iter__(self):
+        if isinstance(self._payload, LazyPayload):
+            return self._payload.iter_decoded()
+        return iter((base64.b64decode(self._payload),))
+
+
+def _payload_source(job: dict) -> tuple[str | None, _InlinePayload | None, int]:
+    """Return (spool_path, data, size) for the job's document.
+
+    Binary-frame, streamed and large base64 jobs arrive already spooled
+    (``spool_path`` set by the websocket client); small base64-in-JSON jobs
+    are piped from the message. The payload is taken out of ``job`` so the
+    job record no longer keeps it alive once it has been submitted.
+    """
+    spool_path = job.get("spool_path")
+    if spool_path:
+        return spool_path, None, os.path.getsize(spool_path)
+    data = _InlinePayload(job.pop("payload", ""))
+    return None, data, len(data)
+
+
+@dataclass
+class PreparedJob:
+    """A print job checked and ready to hand to CUPS (see ``prepare_print_job``)."""
+
+    job_id: str
+    db_path: str
+    payload_type: str
+    printer: str
+    title: str
+    spool_path: str | None
+    data: _InlinePayload | None
+    size: int
+    dry_run: bool = False
+    copies: int = 1
+    duplex: bool = False
+    # PDF options merged with the printer's CUPS defaults ahead of submission.
+    options: dict[str, str] | None = None
+
+    def discard(self) -> None:
+        remove_spool_file(self.spool_path)
+
+
+def prepare_print_job(job: dict, printer_name: str, state_dir: str, dry_run: bool = False) -> PreparedJob | dict:
+    """First stage of a print job: everything before the CUPS submission.
+
+    Checks for duplicates, validates the job, locates the payload and (for
+    PDFs) resolves the printer's CUPS defaults. Returns a PreparedJob, or a
+    final result dict when there is nothing to submit (already printed,
+    invalid job); the spool file is consumed in that case.
     """
     job_id = job.get("job_id", "unknown")
-    payload = job.get("payload", "")
     payload_type = job.get("payload_type", "pdf")
     metadata = job.get("metadata", {})
 
@@ -72,72 +122,109 @@ def handle_print_job(job: dict, printer_name: str, state_dir: str, dry_run: bool
     # Deduplication
     if _already_printed(db_path, job_id):
         logger.info("Job %s already printed, skipping", job_id)
+        remove_spool_file(job.get("spool_path"))
         return {"status": "completed"}
 
     title = metadata.get("title", f"Job {job_id[:8]}")
     effective_printer = metadata.get("target_printer") or printer_name
 
-    if payload_type == "raw":
-        if not effective_printer.strip():
-            return {"status": "failed", "error": "No target printer specified for raw job"}
-        fd, file_path = tempfile.mkstemp(prefix="printbot_", suffix=".prn")
-        try:
-            raw_bytes = base64.b64decode(payload)
-            with os.fdopen(fd, "wb") as f:
-                f.write(raw_bytes)
-            logger.info("Job %s: raw print to '%s' (%d bytes)", job_id, effective_printer, len(raw_bytes))
-            cups_job_id = print_raw(
-                printer_name=effective_printer,
-                title=title,
-                file_path=file_path,
-                cleanup=True,
-                dry_run=dry_run,
-            )
-            _mark_printed(db_path, job_id)
-            return {"status": "completed", "cups_job_id": cups_job_id}
-        except Exception as e:
-            logger.exception("Job %s failed: %s", job_id, e)
-            try:
-                os.remove(file_path)
-            except OSError:
-                pass
-            return {"status": "failed", "error": str(e)}
+    if payload_type not in ("raw", "pdf"):
+        remove_spool_file(job.get("spool_path"))
+        return {"status": "failed", "error": f"Unsupported payload type: {payload_type}"}
+    if payload_type == "raw" and not effective_printer.strip():
+        remove_spool_file(job.get("spool_path"))
+        return {"status": "failed", "error": "No target printer specified for raw job"}
 
-    elif payload_type == "pdf":
-        copies = metadata.get("copies", 1)
-        duplex = metadata.get("duplex", False)
+    try:
+        spool_path, data, size = _payload_source(job)
+    except Exception as e:
+        logger.exception("Job %s failed: %s", job_id, e)
+        remove_spool_file(job.get("spool_path"))
+        return {"status": "failed", "error": str(e)}
+
+    prepared = PreparedJob(job_id, db_path, payload_type, effective_printer, title, spool_path, data, size, dry_run)
+    if payload_type == "pdf":
+        prepared.copies = metadata.get("copies", 1)
+        prepared.duplex = metadata.get("duplex", False)
         printer_options = metadata.get("printer_options")
+        prepared.options = printer_options if dry_run else pdf_options(
+            effective_printer, printer_options, prepared.duplex,
+        )
+    return prepared
 
-        fd, pdf_path = tempfile.mkstemp(prefix="printbot_", suffix=".pdf")
-        try:
-            pdf_bytes = base64.b64decode(payload)
-            with os.fdopen(fd, "wb") as f:
-                f.write(pdf_bytes)
 
-            logger.info("Job %s: printing '%s' (%d bytes, copies=%d, duplex=%s)", job_id, title, len(pdf_bytes), copies, duplex)
+def submit_print_job(prepared: PreparedJob) -> dict:
+    """Second stage: hand the prepared document to CUPS.
 
+    Returns {"status": "completed", "cups_job_id": ...} or {"status":
+    "failed", "error": ...}. The spool file is consumed either way.
+    """
+    job_id = prepared.job_id
+    try:
+        if prepared.payload_type == "raw":
+            logger.info("Job %s: raw print to '%s' (%d bytes)", job_id, prepared.printer, prepared.size)
+            cups_job_id = print_raw(
+                printer_name=prepared.printer,
+                title=prepared.title,
+                file_path=prepared.spool_path,
+                cleanup=True,
+                dry_run=prepared.dry_run,
+                data=prepared.data,
+            )
+        else:
+            logger.info("Job %s: printing '%s' (%d bytes, copies=%d, duplex=%s)",
+                        job_id, prepared.title, prepared.size, prepared.copies, prepared.duplex)
             cups_job_id = print_pdf(
-                printer_name=effective_printer,
-                title=title,
-                pdf_path=pdf_path,
+                printer_name=prepared.printer,
+                title=prepared.title,
+                pdf_path=prepared.spool_path,
                 cleanup=True,
-                copies=copies,
-                duplex=duplex,
-                dry_run=dry_run,
-                printer_options=printer_options,
+                copies=prepared.copies,
+                duplex=prepared.duplex,
+                dry_run=prepared.dry_run,
+                printer_options=prepared.options,
+                data=prepared.data,
+                resolved=not prepared.dry_run,
             )
-
-            _mark_printed(db_path, job_id)
             logger.info("Job %s completed (cups_job_id=%s)", job_id, cups_job_id)
-            return {"status": "completed", "cups_job_id": cups_job_id}
+        return {"status": "completed", "cups_job_id": cups_job_id}
+    except Exception as e:
+        logger.exception("Job %s failed: %s", job_id, e)
+        prepared.discard()
+        return {"status": "failed", "error": str(e)}
+
+
+def record_print_job(prepared: PreparedJob) -> None:
+    """Last stage: remember the job as printed so a resend is not printed twice."""
+    _mark_printed(prepared.db_path, prepared.job_id)
 
+
+def handle_print_job(job: dict, printer_name: str, state_dir: str, dry_run: bool = False) -> dict:
+    """Handle a print job received from the server.
+
+    Runs the three stages (prepare, submit, record) back to back; the job
+    processor runs them as a pipeline instead.
+
+    Args:
+        job: WebSocket message with type=print, job_id, payload (base64 PDF), metadata.
+            The decoded payload is piped to CUPS without a temp file. Instead
+            of ``payload`` the job may carry ``spool_path``, a file the payload
+            was already written to; it is consumed (deleted) either way.
+        printer_name: CUPS printer name
+        state_dir: Directory for state database
+        dry_run: Simulate printing
+
+    Returns:
+        {"status": "completed"} or {"status": "failed", "error": "..."}
+    """
+    prepared = prepare_print_job(job, printer_name, state_dir, dry_run)
+    if isinstance(prepared, dict):
+        return prepared
+    result = submit_print_job(prepared)
+    if result["status"] == "completed":
+        try:
+            record_print_job(prepared)
         except Exception as e:
-            logger.exception("Job %s failed: %s", job_id, e)
-            try:
-                os.remove(pdf_path)
-            except OSError:
-                pass
+            logger.exception("Job %s failed: %s", prepared.job_id, e)
             return {"status": "failed", "error": str(e)}
-
-    else:
-        return {"status": "failed", "error": f"Unsupported payload type: {payload_type}"}
+    return result
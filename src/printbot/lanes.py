@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Jobs submitted at once per printer. One keeps a lane strictly sequential,
+# the order CUPS would print them in anyway.
+DEFAULT_LANE_CONCURRENCY = 1
+
+# Prepared jobs (and submitted jobs waiting to be recorded) buffered between
+# stages. Small: it only has to cover one submission.
+DEFAULT_LANE_BUFFER = 1
+
+
+class _Lane:
+    __slots__ = ("inbox", "ready", "done", "tasks", "preparing", "active", "recording")
+
+    def __init__(self, inbox: asyncio.Queue, buffer: int):
+        self.inbox = inbox
+        self.ready: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self.done: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self.tasks: list[asyncio.Task] = []
+        self.preparing = 0
+        self.active = 0
+        self.recording = 0
+
+
+class PrinterLanes:
+    """One FIFO lane of print jobs per printer, run as a staged pipeline.
+
+    A job stuck on a jammed or slow printer only holds up its own lane; the
+    others keep printing. Within a lane each job goes through three stages,
+    each with its own worker, joined by small bounded buffers:
+
+    - ``prepare(job)``: dedup check, payload lookup, option resolution;
+      returns the item to submit, or None when the job is already finished
+    - ``submit(item)``: hand the document to CUPS; returns a result
+    - ``record(item, result)``: persist and report the outcome
+
+    so job N+1 is prepared, and job N-1 recorded, while job N is being
+    submitted. Jobs leave a lane's inbox in the order it hands them out
+    (FIFO for a plain ``asyncio.Queue``; see scheduler.JobScheduler) and
+    at most ``concurrency`` are submitted at a time. Stage callables handle their own errors; anything that
+    escapes is logged and the job dropped. A lane's workers are started with
+    its first job and live until ``cancel_all``.
+    """
+
+    def __init__(
+        self,
+        prepare: Callable[[dict], Awaitable[Any]],
+        submit: Callable[[Any], Awaitable[Any]],
+        record: Callable[[Any, Any], Awaitable[None]],
+        concurrency: int = DEFAULT_LANE_CONCURRENCY,
+        buffer: int = DEFAULT_LANE_BUFFER,
+        inbox: Callable[[], asyncio.Queue] = asyncio.Queue,
+    ):
+        self._prepare = prepare
+        self._submit = submit
+        self._record = record
+        self._concurrency = max(1, concurrency)
+        self._buffer = max(1, buffer)
+        self._make_inbox = inbox
+        self._lanes: dict[str, _Lane] = {}
+
+    def submit(self, printer: str, job: dict) -> None:
+        lane = self._lanes.get(printer)
+        if lane is None:
+            lane = self._lanes[printer] = _Lane(self._make_inbox(), self._buffer)
+            workers = [self._preparer(lane)]
+            workers += [self._submitter(lane) for _ in range(self._concurrency)]
+            workers.append(self._recorder(lane))
+            lane.tasks = [asyncio.create_task(w, name=f"lane:{printer}") for w in workers]
+        lane.inbox.put_nowait(job)
+
+    async def _preparer(self, lane: _Lane):
+        while True:
+            job = await lane.inbox.get()
+            # Counted until handed on, including while waiting for buffer room.
+            lane.preparing += 1
+            try:
+                try:
+                    item = await self._prepare(job)
+                except Exception:
+                    logger.exception("Preparing job %s failed", job.get("job_id", "?"))
+                    continue
+                if item is not None:
+                    await lane.ready.put(item)
+            finally:
+                lane.preparing -= 1
+
+    async def _submitter(self, lane: _Lane):
+        while True:
+            item = await lane.ready.get()
+            lane.active += 1
+            try:
+                result = await self._submit(item)
+            except Exception:
+                logger.exception("Submitting print job failed")
+                continue
+            finally:
+                lane.active -= 1
+            lane.recording += 1
+            await lane.done.put((item, result))
+
+    async def _recorder(self, lane: _Lane):
+        while True:
+            item, result = await lane.done.get()
+            try:
+                await self._record(item, result)
+            except Exception:
+                logger.exception("Recording print job failed")
+            finally:
+                lane.recording -= 1
+
+    def depth(self, printer: str) -> dict:
+        """Jobs waiting (incl. being prepared) and being submitted on ``printer``'s lane."""
+        lane = self._lanes.get(printer)
+        if lane is None:
+            return {"queued": 0, "active": 0}
+        queued = lane.inbox.qsize() + lane.preparing + lane.ready.qsize()
+        return {"queued": queued, "active": lane.active}
+
+    def busy(self) -> list[str]:
+        """Printers whose lane has jobs in any stage."""
+        return [
+            name for name, lane in self._lanes.items()
+            if lane.inbox.qsize() or lane.preparing or lane.ready.qsize() or lane.active or lane.recording
+        ]
+
+    def cancel_all(self) -> None:
+        for lane in self._lanes.values():
+            for task in lane.tasks:
+                task.cancel()
+        self._lanes.clear()
@@ -3,7 +3,10 @@ import logging
 import signal
 import sys
 
+from . import printing
 from .config import Settings
+from .cups_backend import create_backend
+from .spool import SpoolManager, set_spool_manager
 from .websocket_client import GatewayClient
 
 
@@ -23,6 +26,18 @@ def main():
     logger.info("Server: %s", settings.ws_url)
     logger.info("Printer: %s", settings.printer_name)
 
+    printing.set_backend(create_backend(settings.cups_backend))
+
+    spool = SpoolManager(
+        ram_dir=settings.spool_ram_dir,
+        ram_bytes=settings.spool_ram_bytes,
+        ram_max_file=settings.spool_ram_max_file,
+        disk_dir=settings.spool_dir,
+    )
+    set_spool_manager(spool)
+    # Nothing is spooled yet, so every printbot_* file there is a leftover.
+    spool.sweep_orphans()
+
     client = GatewayClient(settings)
 
     loop = asyncio.new_event_loop()
@@ -0,0 +1,260 @@
+import binascii
+import functools
+import json
+import re
+from dataclasses import dataclass, field, fields
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; stdlib json otherwise
+    orjson = None
+
+# Frames are decoded with orjson when installed, stdlib json otherwise; both
+# produce the same dicts. Control messages then become small frozen structs
+# (`decode`) so handlers get typed fields with defaults applied once, here.
+# The print family (print, print_begin …) stays a plain dict: it is the job
+# record handed to job_handler and extended along the way.
+CODEC = "orjson" if orjson is not None else "json"
+
+# Frames at least this long are checked for a lazily extractable payload.
+LAZY_PAYLOAD_MIN = 64 * 1024
+
+# Base64 characters decoded per step; a multiple of 4 so windows never split
+# a quantum.
+DECODE_WINDOW = 256 * 1024
+
+_PAYLOAD_KEY_RE = re.compile(r'"payload"\s*:\s*"')
+_PAYLOAD_KEY_BYTES_RE = re.compile(rb'"payload"\s*:\s*"')
+
+
+if orjson is not None:
+    DecodeError = orjson.JSONDecodeError
+
+    def loads(raw: str | bytes):
+        return orjson.loads(raw)
+
+    def dumps(obj) -> str:
+        # Text frames must be str; websockets sends bytes as a binary frame.
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+else:
+    DecodeError = json.JSONDecodeError
+
+    def loads(raw: str | bytes):
+        return json.loads(raw)
+
+    def dumps(obj) -> str:
+        return json.dumps(obj)
+
+
+class LazyPayload:
+    """Base64 ``payload`` left in place inside the raw frame it arrived in.
+
+    Large ``print`` frames are not run through the JSON parser whole: the
+    payload value is located in the raw frame and only the small remainder is
+    parsed. The payload is decoded window by window when the job is spooled,
+    so the document never exists as a second multi-megabyte str.
+    """
+
+    __slots__ = ("_raw", "_start", "_end")
+
+    def __init__(self, raw: str | bytes, start: int, end: int):
+        self._raw = raw
+        self._start = start
+        self._end = end
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def decoded_size(self) -> int:
+        """Exact number of bytes ``iter_decoded`` yields for valid base64."""
+        tail = self._raw[max(self._start, self._end - 2):self._end]
+        padding = tail.count("=" if isinstance(tail, str) else b"=")
+        return len(self) * 3 // 4 - padding
+
+    def windows(self, window: int = DECODE_WINDOW):
+        """Yield the base64 text in slices of ``window`` characters.
+
+        ``window`` must be a multiple of 4 so every slice but the last
+        decodes to exactly ``window * 3 // 4`` bytes.
+        """
+        raw = self._raw
+        for offset in range(self._start, self._end, window):
+            yield raw[offset:min(offset + window, self._end)]
+
+    def iter_decoded(self, window: int = DECODE_WINDOW):
+        """Yield the decoded bytes, ``window`` base64 characters at a time."""
+        try:
+            for chunk in self.windows(window):
+                yield binascii.a2b_base64(chunk)
+        except binascii.Error as e:
+            raise ValueError(f"Invalid base64 payload: {e}") from e
+
+
+def decode_frame(raw: str | bytes) -> dict:
+    """Parse one text frame; large ``payload`` strings become a LazyPayload.
+
+    Raises ``DecodeError`` on malformed JSON.
+    """
+    if len(raw) >= LAZY_PAYLOAD_MIN:
+        msg = _decode_lazy(raw)
+        if msg is not None:
+            return msg
+    return loads(raw)
+
+
+def _decode_lazy(raw: str | bytes) -> dict | None:
+    if isinstance(raw, str):
+        m = _PAYLOAD_KEY_RE.search(raw)
+        quote, backslash = '"', "\\"
+    else:
+        m = _PAYLOAD_KEY_BYTES_RE.search(raw)
+        quote, backslash = b'"', b"\\"
+    if m is None:
+        return None
+    start = m.end()
+    end = raw.find(quote, start)
+    # Escapes (e.g. "\/") mean the value is not a plain base64 run; let the
+    # JSON parser deal with it.
+    if end < 0 or raw.find(backslash, start, end) >= 0:
+        return None
+    msg = loads(raw[:start] + raw[end:])
+    # The match may have been a nested "payload" key (e.g. inside metadata);
+    # only a top-level value left empty by the cut is ours.
+    if not isinstance(msg, dict) or msg.get("payload") != "":
+        return loads(raw)
+    msg["payload"] = LazyPayload(raw, start, end)
+    return msg
+
+
+# --- typed control messages ----------------------------------------------------
+
+
+@functools.cache
+def _struct_fields(cls) -> tuple[tuple[str, bool], ...]:
+    return tuple((f.name, f.type is bool) for f in fields(cls))
+
+
+def _decode_struct(cls, msg: dict):
+    """Build ``cls`` from ``msg``; missing or null fields take the default."""
+    kwargs = {}
+    for name, is_bool in _struct_fields(cls):
+        value = msg.get(name)
+        if value is not None:
+            kwargs[name] = bool(value) if is_bool else value
+    return cls(**kwargs)
+
+
+@dataclass(frozen=True, slots=True)
+class Ping:
+    timestamp: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Features:
+    """``hello_ack`` / ``capabilities``."""
+
+    features: list = field(default_factory=list)
+
+
+@dataclass(frozen=True, slots=True)
+class ConfigUpdate:
+    """Only the fields present (non-null) in the message are applied."""
+
+    printer_name: str | None = None
+    dry_run: bool | None = None
+    log_level: str | None = None
+    heartbeat_interval: int | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class DiscoverDevices:
+    request_id: str = ""
+    timeout: int = 10
+
+
+@dataclass(frozen=True, slots=True)
+class OtaUpdate:
+    url: str = ""
+    checksum: str = ""
+    version: str = "?"
+
+
+@dataclass(frozen=True, slots=True)
+class PrinterRequest:
+    """CUPS request addressing one queue (``printer_name`` may be unused)."""
+
+    request_id: str = ""
+    printer_name: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class PrinterReasonRequest:
+    """cups_disable_printer / cups_reject_jobs."""
+
+    request_id: str = ""
+    printer_name: str = ""
+    reason: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class AddPrinter:
+    request_id: str = ""
+    printer_name: str = ""
+    device_uri: str = ""
+    ppd: str = ""
+    description: str = ""
+    location: str = ""
+    options: dict | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class SetPrinterOptions:
+    request_id: str = ""
+    printer_name: str = ""
+    options: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True, slots=True)
+class CancelJob:
+    request_id: str = ""
+    job_id: int | str | None = None
+    purge: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class ClearQueue:
+    request_id: str = ""
+    printer_name: str = ""
+    purge: bool = False
+
+
+# Message type -> struct. Types not listed are passed to handlers as dicts.
+MESSAGE_STRUCTS = {
+    "ping": Ping,
+    "hello_ack": Features,
+    "capabilities": Features,
+    "config_update": ConfigUpdate,
+    "discover_devices": DiscoverDevices,
+    "ota_update": OtaUpdate,
+    "cups_add_printer": AddPrinter,
+    "cups_list_printers": PrinterRequest,
+    "cups_remove_printer": PrinterRequest,
+    "cups_set_default": PrinterRequest,
+    "cups_get_printer_options": PrinterRequest,
+    "cups_set_printer_options": SetPrinterOptions,
+    "cups_resume_printer": PrinterRequest,
+    "cups_enable_printer": PrinterRequest,
+    "cups_disable_printer": PrinterReasonRequest,
+    "cups_accept_jobs": PrinterRequest,
+    "cups_reject_jobs": PrinterReasonRequest,
+    "cups_list_jobs": PrinterRequest,
+    "cups_cancel_job": CancelJob,
+    "cups_clear_queue": ClearQueue,
+}
+
+
+def decode(msg: dict):
+    """Typed struct for ``msg`` if its type has one, else ``msg`` itself."""
+    cls = MESSAGE_STRUCTS.get(msg.get("type"))
+    return _decode_struct(cls, msg) if cls is not None else msg
@@ -0,0 +1,86 @@
+import json
+import logging
+from datetime import datetime, timezone
+
+from .state_db import StateDb
+
+logger = logging.getLogger(__name__)
+
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message TEXT NOT NULL,
+    created_utc TEXT NOT NULL
+);
+"""
+
+# Oldest rows are dropped beyond this — a gateway offline for days should
+# not fill the SD card with status updates nobody will read.
+MAX_ROWS = 10_000
+
+
+class Outbox:
+    """Durable store for messages that must survive a disconnect.
+
+    ``job_status`` / ``ota_status`` messages produced while the socket is down
+    are appended here (in ``state.db`` next to the dedup table) and replayed
+    in order after the next connect. All methods are blocking; call them from
+    a worker thread.
+    """
+
+    def __init__(self, state_dir: str):
+        self._db = StateDb(state_dir, DB_SCHEMA)
+
+    def put(self, msg: dict) -> None:
+        self.extend([msg])
+
+    def extend(self, msgs: list[dict]) -> None:
+        """Append messages in order (one transaction)."""
+        if not msgs:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        con = self._db.connect()
+        try:
+            con.executemany(
+                "INSERT INTO outbox (message, created_utc) VALUES (?, ?)",
+                [(json.dumps(m), now) for m in msgs],
+            )
+            cur = con.execute(
+                "DELETE FROM outbox WHERE id <= (SELECT MAX(id) FROM outbox) - ?",
+                (MAX_ROWS,),
+            )
+            if cur.rowcount:
+                logger.warning("Outbox full, dropped %d oldest message(s)", cur.rowcount)
+            con.commit()
+        finally:
+            con.close()
+
+    def peek(self, limit: int = 50, after: int = 0) -> list[tuple[int, dict]]:
+        """Oldest ``limit`` messages with an id above ``after`` as (id, message),
+        without removing them."""
+        con = self._db.connect()
+        try:
+            rows = con.execute(
+                "SELECT id, message FROM outbox WHERE id > ? ORDER BY id LIMIT ?", (after, limit)
+            ).fetchall()
+        finally:
+            con.close()
+        return [(row_id, json.loads(message)) for row_id, message in rows]
+
+    def ack(self, ids: list[int]) -> None:
+        """Remove delivered messages."""
+        if not ids:
+            return
+        con = self._db.connect()
+        try:
+            con.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+            con.commit()
+        finally:
+            con.close()
+
+    def count(self) -> int:
+        con = self._db.connect()
+        try:
+            return con.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        finally:
+            con.close()
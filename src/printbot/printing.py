@@ -1,12 +1,129 @@
+import copy
+import fcntl
+import functools
 import logging
 import os
 import re
 import shlex
 import subprocess
+import threading
+from collections.abc import Iterable, Sized
 from typing import Optional
 
+from .cups_backend import BackendUnavailable, CupsBackend, sanitize_reason
+from .spool import remove_spool_file
+
 logger = logging.getLogger(__name__)
 
+# In-process CUPS backend (see cups_backend); None runs the CLI tools.
+_backend: CupsBackend | None = None
+
+
+def set_backend(backend: CupsBackend | None) -> None:
+    """Route supported status/admin calls through ``backend`` (None = CLI only)."""
+    global _backend
+    _backend = backend
+    logger.info("CUPS backend: %s", backend.name if backend is not None else "cli")
+
+
+def get_backend() -> CupsBackend | None:
+    return _backend
+
+
+def _backend_first(fn):
+    """Try the configured backend's method of the same name, else run ``fn``.
+
+    The wrapped body is the CLI implementation; it runs when no backend is
+    set or the backend raises BackendUnavailable (cupsd socket gone, admin
+    request refused, operation not implemented).
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        backend = _backend
+        if backend is not None:
+            try:
+                return getattr(backend, name)(*args, **kwargs)
+            except BackendUnavailable as e:
+                logger.debug("%s backend cannot serve %s (%s), using CLI", backend.name, name, e)
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.followers = 0
+
+
+_flights: dict[tuple, _Flight] = {}
+_flights_lock = threading.Lock()
+_flight_stats: dict[str, dict[str, int]] = {}
+
+
+def _single_flight(fn):
+    """Coalesce concurrent identical calls of a read-only CUPS query.
+
+    The first caller (leader) runs the subprocess; callers arriving with the
+    same arguments while it is in flight wait for it and get a deep copy of
+    its result (or its exception). Nothing is cached past completion — the
+    next call after that forks again. Counters: ``single_flight_stats()``.
+    """
+    name = fn.__name__
+    _flight_stats[name] = {"calls": 0, "shared": 0}
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        with _flights_lock:
+            flight = _flights.get(key)
+            if flight is None:
+                flight = _flights[key] = _Flight()
+                leader = True
+                _flight_stats[name]["calls"] += 1
+            else:
+                flight.followers += 1
+                leader = False
+                _flight_stats[name]["shared"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            # Followers copy from a private snapshot, so the leader's caller
+            # may mutate its result freely.
+            flight.result = result
+            return result
+        finally:
+            with _flights_lock:
+                del _flights[key]
+                followers = flight.followers
+            if followers and flight.error is None:
+                flight.result = copy.deepcopy(flight.result)
+            flight.done.set()
+
+    return wrapper
+
+
+def single_flight_stats() -> dict[str, dict[str, int]]:
+    """Per query: CUPS round-trips (``calls``) and callers served by one (``shared``)."""
+    with _flights_lock:
+        return {name: dict(counts) for name, counts in _flight_stats.items()}
+
 
 def _parse_lp_request_id(stdout: str) -> Optional[int]:
     """Extract the CUPS job-id from ``lp`` stdout under LC_ALL=C.
@@ -27,63 +144,175 @@ def _parse_lp_request_id(stdout: str) -> Optional[int]:
         return None
 
 
+# lp/Print-Job submission timeout: a fixed floor plus time to move the
+# document through a busy cupsd on slow storage.
+SUBMIT_TIMEOUT_BASE = 30
+SUBMIT_TIMEOUT_PER_MB = 2.0
+
+
+def _document_size(file_path: str | None, data: Sized | None) -> int:
+    if data is not None:
+        return len(data)
+    try:
+        return os.path.getsize(file_path)
+    except (OSError, TypeError):
+        return 0
+
+
+def _submit_timeout(size: int) -> float:
+    return SUBMIT_TIMEOUT_BASE + SUBMIT_TIMEOUT_PER_MB * size / (1024 * 1024)
+
+
+def _print_via_backend(
+    printer_name: str,
+    title: str,
+    document,
+    document_format: str,
+    options: dict | None,
+    timeout: float,
+) -> tuple[bool, Optional[int]]:
+    """Submit through the configured backend; (False, None) means use ``lp``."""
+    backend = _backend
+    if backend is None:
+        return False, None
+    try:
+        cups_job_id = backend.print_file(
+            printer_name, title, document, document_format, options, timeout=timeout,
+        )
+    except BackendUnavailable as e:
+        logger.debug("%s backend cannot submit the job (%s), using lp", backend.name, e)
+        return False, None
+    if cups_job_id is not None:
+        logger.info("Print job submitted to CUPS as job-id %d", cups_job_id)
+    else:
+        logger.warning("CUPS accepted the print job without returning a job-id")
+    return True, cups_job_id
+
+
+# Linux F_SETPIPE_SZ: a 1 MiB pipe lets lp read large documents in far fewer
+# wake-ups than the default 64 KiB. Missing on macOS (default size there).
+_F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", None)
+LP_PIPE_SIZE = 1024 * 1024
+
+
+def _grow_pipe(pipe) -> None:
+    if _F_SETPIPE_SZ is None:
+        return
+    try:
+        fcntl.fcntl(pipe.fileno(), _F_SETPIPE_SZ, LP_PIPE_SIZE)
+    except OSError:
+        pass  # capped by /proc/sys/fs/pipe-max-size; the default still works
+
+
+def _run_lp(argv: list[str], data: Iterable[bytes] | None, timeout: float) -> str:
+    """Run ``lp`` and return its stdout; raises like ``subprocess.run(check=True)``.
+
+    With ``data`` the document is written to lp's stdin chunk by chunk
+    instead of being named on the command line, so it never touches the
+    SD card on our side. A watchdog kills lp if the whole submission
+    (including our writes) exceeds ``timeout``.
+    """
+    if data is None:
+        return subprocess.run(
+            argv, check=True, capture_output=True, text=True,
+            timeout=timeout, env=_c_locale_env(),
+        ).stdout
+
+    proc = subprocess.Popen(
+        argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        env=_c_locale_env(),
+    )
+    _grow_pipe(proc.stdin)
+    timed_out = threading.Event()
+
+    def expire():
+        timed_out.set()
+        proc.kill()
+
+    watchdog = threading.Timer(timeout, expire)
+    watchdog.start()
+    try:
+        try:
+            for chunk in data:
+                proc.stdin.write(chunk)
+        except BrokenPipeError:
+            pass  # lp exited early; its exit status and stderr say why
+        stdout, stderr = proc.communicate()
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        watchdog.cancel()
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(argv, timeout)
+    stdout = stdout.decode("utf-8", "replace")
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(
+            proc.returncode, argv, stdout, stderr.decode("utf-8", "replace"),
+        )
+    return stdout
+
+
 def print_raw(
     printer_name: str,
     title: str,
-    file_path: str,
+    file_path: str | None,
     cleanup: bool = True,
     dry_run: bool = False,
+    data: Iterable[bytes] | None = None,
 ) -> Optional[int]:
     """Send raw data to CUPS printer. Returns the assigned CUPS job-id, or None.
 
-    None covers dry-run, parse failure, and the (unreachable) success-without-output case.
+    The document is ``file_path`` or, when ``data`` is given, the bytes it
+    yields (a sized, re-iterable source; see job_handler). None covers
+    dry-run, parse failure, and the (unreachable) success-without-output case.
     """
     if dry_run:
         logger.info("[DRY_RUN] Would send raw data to '%s': %s", printer_name, title)
         if cleanup:
-            try:
-                os.remove(file_path)
-            except OSError:
-                pass
+            remove_spool_file(file_path)
         return None
 
-    cmd_parts = ["lp", "-o", "raw"]
+    argv = ["lp", "-o", "raw"]
     if printer_name.strip():
-        cmd_parts.extend(["-d", shlex.quote(printer_name)])
-    cmd_parts.extend(["-t", shlex.quote(title)])
-    cmd_parts.append(shlex.quote(file_path))
-    cmd = " ".join(cmd_parts)
+        argv.extend(["-d", printer_name])
+    argv.extend(["-t", title])
+    if data is None:
+        argv.append(file_path)
 
     logger.info("Sending raw print job to CUPS queue '%s': %s", printer_name, title)
-    logger.debug("CUPS command: %s", cmd)
+    logger.debug("CUPS command: %s", argv)
 
+    timeout = _submit_timeout(_document_size(file_path, data))
     cups_job_id: Optional[int] = None
     try:
-        # LC_ALL=C so "request id is …" stays in English regardless of host locale.
-        result = subprocess.run(
-            cmd, shell=True, check=True, capture_output=True, text=True,
-            timeout=30, env=_c_locale_env(),
+        submitted, cups_job_id = _print_via_backend(
+            printer_name, title, data if data is not None else file_path,
+            "application/vnd.cups-raw", None, timeout,
         )
-        cups_job_id = _parse_lp_request_id(result.stdout)
+        if submitted:
+            return cups_job_id
+        # LC_ALL=C so "request id is …" stays in English regardless of host locale.
+        stdout = _run_lp(argv, data, timeout)
+        cups_job_id = _parse_lp_request_id(stdout)
         if cups_job_id is not None:
             logger.info("Raw print job submitted to CUPS as job-id %d", cups_job_id)
         else:
             logger.warning("Could not parse CUPS job-id from lp output: %r",
-                           (result.stdout or "").strip())
-        if result.stdout:
-            logger.debug("CUPS output: %s", result.stdout.strip())
+                           (stdout or "").strip())
+        if stdout:
+            logger.debug("CUPS output: %s", stdout.strip())
     except subprocess.CalledProcessError as e:
         logger.error("CUPS command failed (exit %d): %s", e.returncode, e.stderr)
         raise RuntimeError(f"Failed to submit raw print job: {e.stderr}") from e
     except subprocess.TimeoutExpired:
-        logger.error("CUPS command timed out after 30 seconds")
+        logger.error("CUPS command timed out after %.0f seconds", timeout)
         raise RuntimeError("Raw print job submission timed out") from None
     finally:
         if cleanup:
-            try:
-                os.remove(file_path)
-            except OSError:
-                pass
+            remove_spool_file(file_path)
 
     return cups_job_id
 
@@ -118,91 +347,103 @@ def get_printer_defaults(printer_name: str) -> dict[str, str]:
         return {}
 
 
+def pdf_options(printer_name: str, printer_options: dict[str, str] | None = None, duplex: bool = False) -> dict[str, str]:
+    """Options for a PDF job: CUPS defaults -> server overrides -> hardcoded fallbacks.
+
+    Forks ``lpoptions`` for the printer's defaults, so the job processor
+    calls this ahead of submission (see job_handler.prepare_print_job).
+    """
+    defaults = get_printer_defaults(printer_name) if printer_name.strip() else {}
+    merged = dict(defaults)
+    if printer_options:
+        merged.update(printer_options)
+    # Hardcoded fallbacks only if not already set
+    merged.setdefault("media", "A4")
+    merged.setdefault("orientation-requested", "3")
+    if duplex:
+        merged["sides"] = "two-sided-long-edge"
+    return merged
+
+
 def print_pdf(
     printer_name: str,
     title: str,
-    pdf_path: str,
+    pdf_path: str | None,
     cleanup: bool = True,
     copies: int = 1,
     duplex: bool = False,
     dry_run: bool = False,
     printer_options: dict[str, str] | None = None,
+    data: Iterable[bytes] | None = None,
+    resolved: bool = False,
 ) -> Optional[int]:
     """Print PDF file to CUPS printer. Returns the assigned CUPS job-id, or None.
 
     Args:
         printer_name: Name of the CUPS printer
         title: Job title for the print queue
-        pdf_path: Path to the PDF file to print
+        pdf_path: Path to the PDF file to print (None when ``data`` is given)
         cleanup: If True, delete the PDF file after printing
         copies: Number of copies to print
         duplex: If True, enable two-sided printing
         dry_run: If True, simulate printing without actual CUPS command
         printer_options: Extra CUPS options that override printer defaults
+        data: Sized, re-iterable source of the document bytes, piped to lp's
+            stdin instead of reading ``pdf_path``
+        resolved: ``printer_options`` already is the full set from
+            ``pdf_options`` (defaults, fallbacks, duplex); skip the lookup
     """
     if dry_run:
         logger.info("[DRY_RUN] Would print PDF to '%s': %s (copies=%d, duplex=%s)", printer_name, title, copies, duplex)
         if cleanup:
-            try:
-                os.remove(pdf_path)
-            except OSError:
-                pass
+            remove_spool_file(pdf_path)
         return None
 
-    # Build merged options: CUPS defaults -> server overrides -> hardcoded fallbacks
-    defaults = get_printer_defaults(printer_name) if printer_name.strip() else {}
-    merged = dict(defaults)
-    if printer_options:
-        merged.update(printer_options)
-    # Hardcoded fallbacks only if not already set
-    merged.setdefault("media", "A4")
-    merged.setdefault("orientation-requested", "3")
-    if duplex:
-        merged["sides"] = "two-sided-long-edge"
+    merged = dict(printer_options or {}) if resolved else pdf_options(printer_name, printer_options, duplex)
 
-    cmd_parts = ["lp"]
+    argv = ["lp"]
     if printer_name.strip():
-        cmd_parts.extend(["-d", shlex.quote(printer_name)])
+        argv.extend(["-d", printer_name])
     for key, value in merged.items():
-        cmd_parts.extend(["-o", f"{shlex.quote(key)}={shlex.quote(value)}"])
-    cmd_parts.extend([
+        argv.extend(["-o", f"{key}={value}"])
+    argv.extend([
         "-n", str(copies),
-        "-t", shlex.quote(title),
+        "-t", title,
     ])
-
-    cmd_parts.append(shlex.quote(pdf_path))
-    cmd = " ".join(cmd_parts)
+    if data is None:
+        argv.append(pdf_path)
 
     logger.info("Sending print job to CUPS: %s (copies=%d, duplex=%s)", title, copies, duplex)
-    logger.debug("CUPS command: %s", cmd)
+    logger.debug("CUPS command: %s", argv)
 
+    timeout = _submit_timeout(_document_size(pdf_path, data))
     cups_job_id: Optional[int] = None
     try:
-        # LC_ALL=C so "request id is …" stays in English regardless of host locale.
-        result = subprocess.run(
-            cmd, shell=True, check=True, capture_output=True, text=True,
-            timeout=30, env=_c_locale_env(),
+        submitted, cups_job_id = _print_via_backend(
+            printer_name, title, data if data is not None else pdf_path, "application/pdf",
+            {**merged, "copies": copies}, timeout,
         )
-        cups_job_id = _parse_lp_request_id(result.stdout)
+        if submitted:
+            return cups_job_id
+        # LC_ALL=C so "request id is …" stays in English regardless of host locale.
+        stdout = _run_lp(argv, data, timeout)
+        cups_job_id = _parse_lp_request_id(stdout)
         if cups_job_id is not None:
             logger.info("Print job submitted to CUPS as job-id %d", cups_job_id)
         else:
             logger.warning("Could not parse CUPS job-id from lp output: %r",
-                           (result.stdout or "").strip())
-        if result.stdout:
-            logger.debug("CUPS output: %s", result.stdout.strip())
+                           (stdout or "").strip())
+        if stdout:
+            logger.debug("CUPS output: %s", stdout.strip())
     except subprocess.CalledProcessError as e:
         logger.error("CUPS command failed (exit %d): %s", e.returncode, e.stderr)
         raise RuntimeError(f"Failed to submit print job to CUPS: {e.stderr}") from e
     except subprocess.TimeoutExpired:
-        logger.error("CUPS command timed out after 30 seconds")
+        logger.error("CUPS command timed out after %.0f seconds", timeout)
         raise RuntimeError("Print job submission timed out") from None
     finally:
         if cleanup:
-            try:
-                os.remove(pdf_path)
-            except OSError:
-                pass
+            remove_spool_file(pdf_path)
 
     return cups_job_id
 
@@ -413,6 +654,8 @@ def add_printer(
     logger.info("Printer '%s' added successfully", printer_name)
 
 
+@_single_flight
+@_backend_first
 def list_printers() -> list[dict]:
     """List all CUPS printers with their status, URI, and default flag.
 
@@ -470,6 +713,7 @@ def list_printers() -> list[dict]:
     return printer_list
 
 
+@_backend_first
 def remove_printer(printer_name: str) -> None:
     """Remove a printer from CUPS using lpadmin -x."""
     logger.info("Removing printer '%s'", printer_name)
@@ -490,6 +734,7 @@ def remove_printer(printer_name: str) -> None:
     logger.info("Printer '%s' removed successfully", printer_name)
 
 
+@_backend_first
 def set_default_printer(printer_name: str) -> None:
     """Set the default CUPS printer using lpadmin -d."""
     logger.info("Setting default printer to '%s'", printer_name)
@@ -510,6 +755,7 @@ def set_default_printer(printer_name: str) -> None:
     logger.info("Default printer set to '%s'", printer_name)
 
 
+@_single_flight
 def get_printer_options(printer_name: str) -> dict:
     """Get printer options with current values and choices via lpoptions -l.
 
@@ -581,6 +827,7 @@ def set_printer_options(printer_name: str, options: dict) -> None:
     logger.info("Printer options set successfully for '%s'", printer_name)
 
 
+@_backend_first
 def get_printer_status(printer_name: str) -> str:
     """Get printer status via lpstat. Returns 'idle', 'printing', 'disabled', or 'unknown'."""
     try:
@@ -626,46 +873,39 @@ def _run_admin(cmd: list[str], description: str, timeout: int = 30) -> None:
         raise RuntimeError(f"{description} failed: {error_msg}")
 
 
+@_backend_first
 def enable_printer(printer_name: str) -> None:
     """Enable (resume) a CUPS print queue via cupsenable."""
     _run_admin(["cupsenable", printer_name], f"Enable printer '{printer_name}'")
 
 
-def _sanitize_reason(reason: str) -> str:
-    """Make a reason safe for ``cupsdisable -r`` / ``cupsreject -r``.
-
-    CUPS only accepts latin-1 reasons up to 255 chars; non-latin-1 codepoints
-    are replaced with ``?`` so the call doesn't crash on UTF-8 emoji etc.
-    """
-    if not reason:
-        return ""
-    sanitized = reason.encode("latin-1", errors="replace").decode("latin-1")
-    return sanitized[:255]
-
-
+@_backend_first
 def disable_printer(printer_name: str, reason: str = "") -> None:
     """Disable (stop) a CUPS print queue via cupsdisable, optional reason."""
     cmd = ["cupsdisable"]
     if reason:
-        cmd.extend(["-r", _sanitize_reason(reason)])
+        cmd.extend(["-r", sanitize_reason(reason)])
     cmd.append(printer_name)
     _run_admin(cmd, f"Disable printer '{printer_name}'")
 
 
+@_backend_first
 def accept_jobs(printer_name: str) -> None:
     """Configure a CUPS queue to accept new jobs via cupsaccept."""
     _run_admin(["cupsaccept", printer_name], f"Accept jobs on '{printer_name}'")
 
 
+@_backend_first
 def reject_jobs(printer_name: str, reason: str = "") -> None:
     """Configure a CUPS queue to reject new jobs via cupsreject, optional reason."""
     cmd = ["cupsreject"]
     if reason:
-        cmd.extend(["-r", _sanitize_reason(reason)])
+        cmd.extend(["-r", sanitize_reason(reason)])
     cmd.append(printer_name)
     _run_admin(cmd, f"Reject jobs on '{printer_name}'")
 
 
+@_backend_first
 def cancel_job(job_id: str | int, purge: bool = False) -> None:
     """Cancel a single CUPS job. job_id may be numeric ('42') or namespaced ('hp-42').
 
@@ -678,6 +918,7 @@ def cancel_job(job_id: str | int, purge: bool = False) -> None:
     _run_admin(cmd, f"Cancel job '{job_id}'")
 
 
+@_backend_first
 def clear_queue(printer_name: str, purge: bool = False) -> None:
     """Cancel every pending job on a printer (cancel -a). purge=True removes data files."""
     cmd = ["cancel", "-a"]
@@ -755,6 +996,32 @@ def _extract_reasons(text: str) -> list[str]:
     return reasons
 
 
+def _parse_printer_block(lines: list[str]) -> dict:
+    """state, state_reasons and state_message from one printer's ``lpstat -l -p`` block."""
+    state, summary = _parse_state_line(lines[0].strip())
+    # Indented continuation lines after the state line carry the operator
+    # message (from cupsdisable -r) and possibly Alerts/reasons output.
+    message_parts = []
+    block = [lines[0]]
+    for line in lines[1:]:
+        if line.startswith((" ", "\t")):
+            block.append(line)
+            stripped = line.strip()
+            if stripped and not stripped.startswith(("Description:", "Location:", "Connection:", "Interface:")):
+                message_parts.append(stripped)
+        else:
+            # Stop at the next non-indented block (defensive — shouldn't happen
+            # for single-printer lpstat).
+            break
+    return {
+        "state": state,
+        "state_message": " ".join(message_parts).strip(),
+        "state_reasons": _extract_reasons("\n".join(block) + "\n " + summary),
+    }
+
+
+@_single_flight
+@_backend_first
 def get_printer_detail(printer_name: str) -> dict:
     """Get detailed CUPS queue diagnostics for a single printer.
 
@@ -782,23 +1049,7 @@ def get_printer_detail(printer_name: str) -> dict:
 
     lines = p.stdout.splitlines()
     if lines:
-        first_line = lines[0].strip()
-        state, summary = _parse_state_line(first_line)
-        detail["state"] = state
-        # Indented continuation lines after the state line carry the operator
-        # message (from cupsdisable -r) and possibly Alerts/reasons output.
-        message_parts = []
-        for line in lines[1:]:
-            if line.startswith((" ", "\t")):
-                stripped = line.strip()
-                if stripped and not stripped.startswith(("Description:", "Location:", "Connection:", "Interface:")):
-                    message_parts.append(stripped)
-            else:
-                # Stop at the next non-indented block (defensive — shouldn't happen
-                # for single-printer lpstat).
-                break
-        detail["state_message"] = " ".join(message_parts).strip()
-        detail["state_reasons"] = _extract_reasons(p.stdout + " " + summary)
+        detail.update(_parse_printer_block(lines))
 
     try:
         a = subprocess.run(
@@ -826,6 +1077,42 @@ def _parse_lpstat_date(text: str) -> Optional[float]:
         return None
 
 
+# Header line: "<queue>-<id>  <user>  <kbytes>  <weekday> <mon> <day> HH:MM:SS YYYY"
+_JOB_LINE = re.compile(
+    r"^(?P<jobname>\S+?)-(?P<job_id>\d+)\s+"
+    r"(?P<user>\S+)\s+"
+    r"(?P<size>\d+)\s+"
+    r"(?P<date>.+?)\s*$"
+)
+
+
+def _parse_job_lines(stdout: str) -> list[tuple[str, dict]]:
+    """(queue, job) per header line of ``lpstat -l -W not-completed -o`` output."""
+    jobs: list[tuple[str, dict]] = []
+    for line in stdout.splitlines():
+        if not line.strip():
+            continue
+        if line.startswith((" ", "\t")):
+            continue  # detail line under a previous header (with -l)
+        m = _JOB_LINE.match(line)
+        if not m:
+            logger.debug("Skipping unparseable lpstat -o line: %r", line)
+            continue
+        job: dict = {
+            "job-id": int(m.group("job_id")),
+            "job-originating-user-name": m.group("user"),
+            "job-k-octets": int(m.group("size")),
+            "job-state": "pending",
+        }
+        epoch = _parse_lpstat_date(m.group("date"))
+        if epoch is not None:
+            job["time-at-creation"] = int(epoch)
+        jobs.append((m.group("jobname"), job))
+    return jobs
+
+
+@_single_flight
+@_backend_first
 def list_jobs(printer_name: str) -> list[dict]:
     """List pending+active jobs via ``lpstat -l -W not-completed -o``.
 
@@ -838,7 +1125,8 @@ def list_jobs(printer_name: str) -> list[dict]:
 
     Fields the CLI cannot reliably surface (job-name title, job-state-reasons,
     document-format, …) are OMITTED — the server applies its own defaults.
-    They will appear naturally once a pycups-based backend lands.
+    The IPP backend (cups_backend.IppBackend) adds "job-name" and
+    "job-state-reasons" and reports the real job-state.
     """
     jobs: list[dict] = []
     try:
@@ -857,33 +1145,51 @@ def list_jobs(printer_name: str) -> list[dict]:
                      printer_name, result.returncode, result.stderr.strip())
         return jobs
 
-    # Header line: "<queue>-<id>  <user>  <kbytes>  <weekday> <mon> <day> HH:MM:SS YYYY"
-    # With -l, indented detail lines follow each header — we skip those.
-    pattern = re.compile(
-        r"^(?P<jobname>\S+?)-(?P<job_id>\d+)\s+"
-        r"(?P<user>\S+)\s+"
-        r"(?P<size>\d+)\s+"
-        r"(?P<date>.+?)\s*$"
-    )
-    for line in result.stdout.splitlines():
-        if not line.strip():
-            continue
-        if line.startswith((" ", "\t")):
-            continue  # detail line under a previous header
-        m = pattern.match(line)
-        if not m:
-            logger.debug("Skipping unparseable lpstat -o line: %r", line)
-            continue
-        job: dict = {
-            "job-id": int(m.group("job_id")),
-            "job-originating-user-name": m.group("user"),
-            "job-k-octets": int(m.group("size")),
-            "job-state": "pending",
-        }
-        epoch = _parse_lpstat_date(m.group("date"))
-        if epoch is not None:
-            job["time-at-creation"] = int(epoch)
-        jobs.append(job)
+    jobs = [job for _, job in _parse_job_lines(result.stdout)]
 
     logger.info("Listed %d pending job(s) on '%s'", len(jobs), printer_name)
     return jobs
+
+
+@_single_flight
+@_backend_first
+def printer_snapshot() -> list[dict]:
+    """Diagnostics for every CUPS queue in one pass, for multi-printer heartbeats.
+
+    One dict per printer with the ``list_printers`` keys (name, uri, info,
+    is_default), the ``get_printer_detail`` keys (state, state_reasons,
+    accepting_jobs, state_message) and ``jobs`` as ``list_jobs`` returns
+    them. Four lpstat calls in total however many queues there are, instead
+    of four per queue.
+    """
+    printers = {p["name"]: {**p, "state_reasons": [], "accepting_jobs": False,
+                            "state_message": "", "jobs": []}
+                for p in list_printers()}
+
+    def lpstat(*args: str) -> str:
+        try:
+            result = subprocess.run(
+                ["lpstat", *args], capture_output=True, text=True, timeout=10, env=_c_locale_env(),
+            )
+        except Exception as e:
+            logger.warning("lpstat %s failed: %s", " ".join(args), e)
+            return ""
+        return result.stdout
+
+    lines = lpstat("-l", "-p").splitlines()
+    for i, line in enumerate(lines):
+        m = re.match(r"printer\s+(\S+)\s", line)
+        if m and m.group(1) in printers:
+            printers[m.group(1)].update(_parse_printer_block(lines[i:]))
+
+    for line in lpstat("-a").splitlines():
+        if line.strip() and not line.startswith((" ", "\t")):
+            name = line.split(None, 1)[0]
+            if name in printers:
+                printers[name]["accepting_jobs"] = "not accepting" not in line.lower()
+
+    for queue, job in _parse_job_lines(lpstat("-l", "-W", "not-completed", "-o")):
+        if queue in printers:
+            printers[queue]["jobs"].append(job)
+
+    return list(printers.values())
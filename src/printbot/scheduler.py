@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from collections import defaultdict
+
+SCHEDULER_POLICIES = ("fifo", "priority", "sjf", "fair")
+
+# Seconds of waiting worth one step of rank: one priority level, one
+# doubling of document size, or one job of a source's share. Keeps a low
+# rank job from waiting behind a steady stream of better ones for ever.
+DEFAULT_AGING_SECONDS = 30.0
+
+# Size assumed for sjf when the job does not say (e.g. a payload_url job
+# without payload_size).
+UNKNOWN_SIZE = 1024 * 1024
+
+
+def job_priority(job: dict) -> int:
+    """``metadata.priority`` as an int (higher runs first); 0 when absent or invalid."""
+    try:
+        return int((job.get("metadata") or {}).get("priority") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def job_size(job: dict) -> int:
+    """Best guess of the document size in bytes, for shortest-job-first."""
+    size = job.get("payload_size")
+    if isinstance(size, int) and size >= 0:
+        return size
+    spool_path = job.get("spool_path")
+    if spool_path:
+        try:
+            return os.path.getsize(spool_path)
+        except OSError:
+            return UNKNOWN_SIZE
+    payload = job.get("payload")
+    if payload:
+        return len(payload) * 3 // 4
+    return UNKNOWN_SIZE
+
+
+def job_source(job: dict) -> str:
+    return str((job.get("metadata") or {}).get("source") or "")
+
+
+class WaitStats:
+    """Queue-wait time per priority class, across every lane."""
+
+    def __init__(self):
+        self._count: dict[str, int] = defaultdict(int)
+        self._total: dict[str, float] = defaultdict(float)
+        self._max: dict[str, float] = defaultdict(float)
+
+    def observe(self, priority: int, waited: float) -> None:
+        key = str(priority)
+        self._count[key] += 1
+        self._total[key] += waited
+        self._max[key] = max(self._max[key], waited)
+
+    def snapshot(self) -> dict:
+        return {
+            key: {
+                "count": count,
+                "avg_ms": round(self._total[key] / count * 1000),
+                "max_ms": round(self._max[key] * 1000),
+            }
+            for key, count in sorted(self._count.items())
+        }
+
+
+class _Entry:
+    __slots__ = ("job", "seq", "enqueued", "priority", "size_rank", "source")
+
+    def __init__(self, job: dict, seq: int, enqueued: float):
+        self.job = job
+        self.seq = seq
+        self.enqueued = enqueued
+        self.priority = job_priority(job)
+        self.size_rank = -math.log2(max(job_size(job), 1))
+        self.source = job_source(job)
+
+
+class JobScheduler(asyncio.Queue):
+    """A lane's inbox: an ``asyncio.Queue`` that hands out jobs by policy.
+
+    - ``fifo``: arrival order (the default, and the behaviour before
+      scheduling existed)
+    - ``priority``: highest ``metadata.priority`` first
+    - ``sjf``: smallest document first (``payload_size``, spool file or
+      inline payload size)
+    - ``fair``: round-robin between ``metadata.source`` tags, FIFO within one
+
+    Every policy but fifo adds one rank step per ``aging`` seconds a job has
+    waited, so nothing starves; ties go to the earlier job. Queues are a
+    handful of jobs deep, so ``get`` simply scans them.
+    """
+
+    def __init__(
+        self,
+        policy: str = "fifo",
+        aging: float = DEFAULT_AGING_SECONDS,
+        stats: WaitStats | None = None,
+        clock=time.monotonic,
+    ):
+        if policy not in SCHEDULER_POLICIES:
+            raise ValueError(f"Unknown scheduler policy {policy!r} (expected one of {', '.join(SCHEDULER_POLICIES)})")
+        self.policy = policy
+        self._aging = aging
+        self._stats = stats
+        self._clock = clock
+        self._seq = itertools.count()
+        # fair: jobs handed out per source (virtual time).
+        self._served: dict[str, int] = defaultdict(int)
+        super().__init__()
+
+    def _init(self, maxsize):
+        self._queue: list[_Entry] = []
+
+    def _qsize(self):
+        return len(self._queue)
+
+    def _put(self, job):
+        entry = _Entry(job, next(self._seq), self._clock())
+        if self.policy == "fair" and entry.source not in {e.source for e in self._queue}:
+            # A source that was idle starts level with the queued source
+            # that has had the fewest turns, instead of cashing in the
+            # turns it did not use.
+            floor = min((self._served[e.source] for e in self._queue), default=0)
+            self._served[entry.source] = max(self._served[entry.source], floor)
+        self._queue.append(entry)
+
+    def _rank(self, entry: _Entry, now: float) -> float:
+        if self.policy == "priority":
+            base = entry.priority
+        elif self.policy == "sjf":
+            base = entry.size_rank
+        else:
+            base = -self._served[entry.source]
+        return base + (now - entry.enqueued) / self._aging
+
+    def _get(self):
+        now = self._clock()
+        if self.policy == "fifo":
+            index = 0
+        else:
+            index = max(
+                range(len(self._queue)),
+                key=lambda i: (self._rank(self._queue[i], now), -self._queue[i].seq),
+            )
+        entry = self._queue.pop(index)
+        self._served[entry.source] += 1
+        if self._stats is not None:
+            self._stats.observe(entry.priority, now - entry.enqueued)
+        return entry.job
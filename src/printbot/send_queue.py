@@ -0,0 +1,212 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from enum import IntEnum
+
+from .messages import dumps
+
+
+class Lane(IntEnum):
+    """Outbound message classes, highest priority first."""
+
+    JOB_STATUS = 0
+    CUPS = 1
+    HEARTBEAT = 2
+    DISCOVERY_STATUS = 3
+
+
+# Message type -> lane. Anything not listed is a request/response and rides
+# the CUPS lane. Short control messages (pong, hello, flow_credit), printer
+# events and OTA progress share the top lane with job status — they are rare
+# and time-sensitive.
+_LANE_BY_TYPE = {
+    "job_status": Lane.JOB_STATUS,
+    "job_status_batch": Lane.JOB_STATUS,
+    "ota_status": Lane.JOB_STATUS,
+    "pong": Lane.JOB_STATUS,
+    "hello": Lane.JOB_STATUS,
+    "flow_credit": Lane.JOB_STATUS,
+    "printer_event": Lane.JOB_STATUS,
+    "heartbeat": Lane.HEARTBEAT,
+    "discover_devices_status": Lane.DISCOVERY_STATUS,
+}
+
+
+def lane_for(msg: dict) -> Lane:
+    return _LANE_BY_TYPE.get(msg.get("type"), Lane.CUPS)
+
+
+class _LaneState:
+    __slots__ = ("frames", "maxlen", "sent", "dropped", "wait_total", "wait_max", "window_sent")
+
+    def __init__(self, maxlen: int | None):
+        self.frames: deque[tuple[float, str, Callable[[], None] | None]] = deque()
+        self.maxlen = maxlen
+        self.sent = 0
+        self.dropped = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.window_sent = 0
+
+
+class SendQueue:
+    """Priority queue feeding the single WebSocket writer task.
+
+    Lanes are served in priority order (job status > CUPS responses >
+    heartbeat > discovery status). To stay fair under a sustained burst on a
+    high lane, a lower lane whose oldest frame has waited longer than
+    ``starvation_after`` seconds is served first. The heartbeat lane keeps at
+    most ``heartbeat_depth`` frames and drops the oldest — a stale heartbeat
+    is worthless once a newer one exists.
+
+    Frames are serialised on ``put`` (orjson when available) so the message is captured as it was
+    when the caller sent it. A frame put with ``on_sent`` has it called once
+    the writer reports it written (``sent``); such frames belong to their
+    caller (e.g. outbox rows being replayed) and are not returned by ``clear``.
+    """
+
+    def __init__(self, heartbeat_depth: int = 1, starvation_after: float = 2.0):
+        self._lanes = {
+            lane: _LaneState(heartbeat_depth if lane is Lane.HEARTBEAT else None)
+            for lane in Lane
+        }
+        self._starvation_after = starvation_after
+        self._ready = asyncio.Event()
+        # on_sent of the frame last handed out by `get`.
+        self._on_sent: Callable[[], None] | None = None
+
+    def put(self, msg: dict, lane: Lane | None = None, on_sent: Callable[[], None] | None = None) -> None:
+        state = self._lanes[lane if lane is not None else lane_for(msg)]
+        if state.maxlen is not None and len(state.frames) >= state.maxlen:
+            state.frames.popleft()
+            state.dropped += 1
+        state.frames.append((time.monotonic(), dumps(msg), on_sent))
+        self._ready.set()
+
+    def requeue(self, lane: Lane, frame: str) -> None:
+        """Put a frame that could not be written back at the head of its lane."""
+        self._lanes[lane].frames.appendleft((time.monotonic(), frame, self._on_sent))
+        self._on_sent = None
+        self._ready.set()
+
+    def sent(self) -> None:
+        """The frame last returned by ``get`` is on the wire."""
+        on_sent, self._on_sent = self._on_sent, None
+        if on_sent is not None:
+            on_sent()
+
+    async def get(self) -> tuple[Lane, str]:
+        """Wait for the next frame to send; returns (lane, serialised frame)."""
+        while True:
+            lane = self._pick()
+            if lane is not None:
+                state = self._lanes[lane]
+                enqueued_at, frame, self._on_sent = state.frames.popleft()
+                wait = time.monotonic() - enqueued_at
+                state.sent += 1
+                state.window_sent += 1
+                state.wait_total += wait
+                state.wait_max = max(state.wait_max, wait)
+                return lane, frame
+            self._ready.clear()
+            await self._ready.wait()
+
+    def _pick(self) -> Lane | None:
+        now = time.monotonic()
+        starving = [
+            lane for lane, state in self._lanes.items()
+            if state.frames and now - state.frames[0][0] > self._starvation_after
+        ]
+        if starving:
+            # Oldest starving frame first, so no lane waits forever.
+            return min(starving, key=lambda lane: self._lanes[lane].frames[0][0])
+        for lane, state in self._lanes.items():
+            if state.frames:
+                return lane
+        return None
+
+    def qsize(self) -> int:
+        return sum(len(s.frames) for s in self._lanes.values())
+
+    def clear(self) -> list[str]:
+        """Drop all queued frames (e.g. on disconnect); returns them in priority
+        order, except those put with ``on_sent``."""
+        frames = []
+        for state in self._lanes.values():
+            frames.extend(frame for _, frame, on_sent in state.frames if on_sent is None)
+            state.frames.clear()
+        self._on_sent = None
+        return frames
+
+    def snapshot(self) -> dict:
+        """Per-lane depth and wait-time metrics.
+
+        ``sent``/``dropped`` are cumulative; ``wait_ms_avg``/``wait_ms_max``
+        cover the frames sent since the previous snapshot.
+        """
+        out = {}
+        for lane, state in self._lanes.items():
+            avg = state.wait_total / state.window_sent if state.window_sent else 0.0
+            out[lane.name.lower()] = {
+                "depth": len(state.frames),
+                "sent": state.sent,
+                "dropped": state.dropped,
+                "wait_ms_avg": round(avg * 1000, 1),
+                "wait_ms_max": round(state.wait_max * 1000, 1),
+            }
+            state.wait_total = 0.0
+            state.wait_max = 0.0
+            state.window_sent = 0
+        return out
+
+
+class JobStatusBatcher:
+    """Coalesce ``job_status`` messages into ``job_status_batch`` frames.
+
+    Entries are collected for up to ``window`` seconds or ``max_entries``
+    messages, whichever comes first, and sent as one frame. Entries keep
+    their arrival order inside a batch and batches go out in order, so the
+    per-job status sequence is preserved. Only used when the server
+    advertised ``job_status_batch``.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[dict], Awaitable[None]],
+        window: float = 0.05,
+        max_entries: int = 64,
+    ):
+        self._send = send
+        self._window = window
+        self._max_entries = max_entries
+        self._entries: list[dict] = []
+        self._timer: asyncio.Task | None = None
+
+    async def add(self, msg: dict) -> None:
+        self._entries.append({k: v for k, v in msg.items() if k != "type"})
+        if len(self._entries) >= self._max_entries:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._window)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        entries, self._entries = self._entries, []
+        if entries:
+            await self._send({"type": "job_status_batch", "statuses": entries})
+
+    def clear(self) -> list[dict]:
+        """Drop pending entries without sending; returns them as job_status messages."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        entries, self._entries = self._entries, []
+        return [{"type": "job_status", **e} for e in entries]
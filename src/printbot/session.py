@@ -0,0 +1,82 @@
+import logging
+import uuid
+
+from .job_handler import DB_SCHEMA as PRINTED_JOBS_SCHEMA
+from .state_db import StateDb
+
+logger = logging.getLogger(__name__)
+
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gateway_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Upper bound on job ids listed in one `hello`; anything older is covered by
+# the job_status messages the server already has (or gets from the outbox).
+MAX_PRINTED_IDS = 500
+
+_ACK_KEY = "printed_acked_utc"
+
+
+class SessionState:
+    """Bookkeeping for the ``hello`` / ``hello_ack`` reconnect handshake.
+
+    ``session_id`` identifies this gateway process: a restart loses the
+    in-memory job queue, so the server must not assume anything announced
+    under an older session is still held. The printed-jobs cursor lives in
+    ``state.db`` and survives restarts — ``printed_since_ack`` lists the jobs
+    marked printed since the server last acknowledged a ``hello``.
+
+    Database methods are blocking; call them from a worker thread.
+    """
+
+    def __init__(self, state_dir: str):
+        self.session_id = uuid.uuid4().hex
+        # Highest `seq` seen on a server message during this session.
+        self.last_seq: int | None = None
+        self._db = StateDb(state_dir, PRINTED_JOBS_SCHEMA, DB_SCHEMA)
+
+    def observe(self, msg: dict) -> None:
+        seq = msg.get("seq")
+        if isinstance(seq, int) and (self.last_seq is None or seq > self.last_seq):
+            self.last_seq = seq
+
+    def printed_since_ack(self, limit: int = MAX_PRINTED_IDS) -> tuple[list[str], str | None]:
+        """Job ids printed since the last acked hello, oldest first.
+
+        Returns (job_ids, cursor); pass the cursor to ``ack`` once the server
+        confirmed the hello. The cursor is None when nothing is listed.
+        """
+        con = self._db.connect()
+        try:
+            row = con.execute(
+                "SELECT value FROM gateway_state WHERE key = ?", (_ACK_KEY,)
+            ).fetchone()
+            rows = con.execute(
+                "SELECT job_id, printed_utc FROM printed_jobs WHERE printed_utc > ? "
+                "ORDER BY printed_utc LIMIT ?",
+                (row[0] if row else "", limit),
+            ).fetchall()
+        finally:
+            con.close()
+        if not rows:
+            return [], None
+        return [job_id for job_id, _ in rows], rows[-1][1]
+
+    def ack(self, cursor: str | None) -> None:
+        """Record that the server has seen every printed job up to ``cursor``."""
+        if cursor is None:
+            return
+        con = self._db.connect()
+        try:
+            con.execute(
+                "INSERT INTO gateway_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value "
+                "WHERE excluded.value > gateway_state.value",
+                (_ACK_KEY, cursor),
+            )
+            con.commit()
+        finally:
+            con.close()
@@ -0,0 +1,241 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from .messages import LazyPayload
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PREFIX = "printbot_"
+
+# RAM tier: a tmpfs directory (systemd's PrivateTmp leaves /tmp on the SD
+# card, /dev/shm stays in memory). Spool files of known size up to
+# DEFAULT_RAM_MAX_FILE go there while the tier holds less than its budget.
+DEFAULT_RAM_DIR = "/dev/shm"
+DEFAULT_RAM_BYTES = 32 * 1024 * 1024
+DEFAULT_RAM_MAX_FILE = 4 * 1024 * 1024
+
+_SUFFIXES = {"pdf": ".pdf", "raw": ".prn"}
+
+
+def suffix_for(payload_type: str) -> str:
+    """Spool file suffix for a payload type (``.pdf`` / ``.prn``)."""
+    return _SUFFIXES.get(payload_type, ".bin")
+
+
+class SpoolManager:
+    """Decides where spool files live: a RAM tier or the disk tier.
+
+    A file whose final size is known up front goes to ``ram_dir`` when it
+    is at most ``ram_max_file`` bytes and fits in what is left of the
+    ``ram_bytes`` budget; everything else (large or unknown-size payloads)
+    goes to ``disk_dir`` (system temp dir if unset). The budget is reserved
+    at creation and given back by ``release`` when the file is removed. CUPS
+    gets the file by path either way.
+
+    Thread-safe: spool files are created from worker threads.
+    """
+
+    def __init__(
+        self,
+        ram_dir: str | None = DEFAULT_RAM_DIR,
+        ram_bytes: int = DEFAULT_RAM_BYTES,
+        ram_max_file: int = DEFAULT_RAM_MAX_FILE,
+        disk_dir: str | None = None,
+    ):
+        if ram_bytes > 0 and ram_dir and not os.path.isdir(ram_dir):
+            logger.warning("Spool RAM dir %s does not exist, spooling to disk only", ram_dir)
+            ram_dir = None
+        self.ram_dir = ram_dir if ram_bytes > 0 else None
+        self.disk_dir = disk_dir or None
+        self._ram_bytes = ram_bytes
+        self._ram_max_file = ram_max_file
+        self._lock = threading.Lock()
+        self._ram_files: dict[str, int] = {}
+        self._ram_used = 0
+        self._ram_spooled = 0
+        self._disk_spooled = 0
+
+    def _reserve(self, expected_size: int | None) -> bool:
+        if self.ram_dir is None or expected_size is None or expected_size > self._ram_max_file:
+            return False
+        with self._lock:
+            if self._ram_used + expected_size > self._ram_bytes:
+                return False
+            self._ram_used += expected_size
+            return True
+
+    def create(self, suffix: str, expected_size: int | None = None) -> tuple[int, str]:
+        """Create a spool file; returns (fd, path) like ``tempfile.mkstemp``."""
+        if self._reserve(expected_size):
+            try:
+                fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix=suffix, dir=self.ram_dir)
+            except OSError as e:
+                with self._lock:
+                    self._ram_used -= expected_size
+                logger.warning("RAM spool unavailable (%s), using disk", e)
+            else:
+                with self._lock:
+                    self._ram_files[path] = expected_size
+                    self._ram_spooled += 1
+                return fd, path
+        fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix=suffix, dir=self.disk_dir)
+        with self._lock:
+            self._disk_spooled += 1
+        return fd, path
+
+    def release(self, path: str) -> None:
+        """Give a removed file's RAM reservation back to the budget."""
+        with self._lock:
+            size = self._ram_files.pop(path, None)
+            if size is not None:
+                self._ram_used -= size
+
+    def sweep_orphans(self) -> int:
+        """Delete ``printbot_*`` files left in the spool dirs by a crashed run.
+
+        Call once at startup, before any job is spooled. Returns the number
+        of files removed.
+        """
+        removed = 0
+        for directory in {self.ram_dir, self.disk_dir or tempfile.gettempdir()} - {None}:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.name.startswith(SPOOL_PREFIX) or not entry.is_file(follow_symlinks=False):
+                    continue
+                with self._lock:
+                    if entry.path in self._ram_files:
+                        continue
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError as e:
+                    logger.debug("Could not remove orphan spool file %s: %s", entry.path, e)
+        if removed:
+            logger.info("Removed %d orphaned spool file(s)", removed)
+        return removed
+
+    def snapshot(self) -> dict:
+        """RAM tier usage now plus cumulative files spooled per tier."""
+        with self._lock:
+            return {
+                "ram_bytes": self._ram_used,
+                "ram_budget": self._ram_bytes if self.ram_dir else 0,
+                "ram_files": len(self._ram_files),
+                "ram_spooled": self._ram_spooled,
+                "disk_spooled": self._disk_spooled,
+            }
+
+
+# Disk only until main() installs the configured manager.
+_manager = SpoolManager(ram_bytes=0)
+
+
+def set_spool_manager(manager: SpoolManager) -> None:
+    global _manager
+    _manager = manager
+
+
+def spool_manager() -> SpoolManager:
+    return _manager
+
+
+class SpoolWriter:
+    """Append payload bytes to a spool file as they arrive.
+
+    Used for payloads that reach the gateway as raw bytes rather than one
+    base64 string: the bytes go straight to a spool file (RAM or disk tier,
+    see SpoolManager), so the document is never held in process memory as
+    a whole. A running SHA-256 is kept so callers can
+    verify the payload once it is complete (``digest=False`` skips it).
+
+    Not thread-safe — one writer per job, fed by a single producer.
+    """
+
+    def __init__(self, suffix: str = ".bin", expected_size: int | None = None, digest: bool = True):
+        fd, self.path = _manager.create(suffix, expected_size)
+        self._file = os.fdopen(fd, "wb")
+        self.expected_size = expected_size
+        self.size = 0
+        self._sha256 = hashlib.sha256() if digest else None
+
+    @property
+    def complete(self) -> bool:
+        return self.expected_size is not None and self.size >= self.expected_size
+
+    def write(self, data: bytes) -> None:
+        if self.expected_size is not None and self.size + len(data) > self.expected_size:
+            raise ValueError(
+                f"Payload overrun: expected {self.expected_size} bytes, "
+                f"got at least {self.size + len(data)}"
+            )
+        self._file.write(data)
+        if self._sha256 is not None:
+            self._sha256.update(data)
+        self.size += len(data)
+
+    def truncate(self) -> None:
+        """Drop everything written so far (e.g. a download restarting from 0)."""
+        self._file.seek(0)
+        self._file.truncate()
+        if self._sha256 is not None:
+            self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+    def close(self) -> str:
+        """Flush and close the file; returns its path. Caller owns the file."""
+        self._file.close()
+        return self.path
+
+    def discard(self) -> None:
+        """Close and delete the (partial) spool file."""
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        remove_spool_file(self.path)
+
+
+def spool_base64(payload: LazyPayload, suffix: str = ".bin") -> str:
+    """Decode ``payload`` into a new spool file, one window at a time.
+
+    Only one window of base64 and its decoded bytes is in memory at once.
+    Returns the path (caller owns the file); raises ValueError on invalid
+    base64, leaving nothing behind.
+    """
+    writer = SpoolWriter(suffix, payload.decoded_size(), digest=False)
+    try:
+        for chunk in payload.iter_decoded():
+            writer.write(chunk)
+        if not writer.complete:
+            raise ValueError(f"Payload decoded to {writer.size} bytes, expected {writer.expected_size}")
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.close()
+
+
+def reserve_spool_file(suffix: str = ".bin", expected_size: int | None = None) -> str:
+    """Create an empty spool file for another process to fill; returns its path."""
+    fd, path = _manager.create(suffix, expected_size)
+    os.close(fd)
+    return path
+
+
+def remove_spool_file(path: str | None) -> None:
+    """Best-effort delete of a spool file; missing files are fine."""
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    _manager.release(path)
@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import threading
+
+# Every gateway store (printed jobs, outbox, session cursor) keeps its tables
+# in this one file under STATE_DIR.
+DB_NAME = "state.db"
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open ``state.db``; the caller closes the connection."""
+    return sqlite3.connect(db_path)
+
+
+def init_db(state_dir: str, *schemas: str) -> str:
+    """Create ``state_dir``, ``state.db`` and the tables in ``schemas``; returns the path."""
+    os.makedirs(state_dir, exist_ok=True)
+    db_path = os.path.join(state_dir, DB_NAME)
+    con = connect(db_path)
+    try:
+        for schema in schemas:
+            con.execute(schema)
+        con.commit()
+    finally:
+        con.close()
+    return db_path
+
+
+class StateDb:
+    """``state.db`` in ``state_dir``, set up on first use.
+
+    The directory, file and ``schemas`` are created by the first ``connect``,
+    once, however many threads get there at the same time. Blocking — call
+    from a worker thread.
+    """
+
+    def __init__(self, state_dir: str, *schemas: str):
+        self._state_dir = state_dir
+        self._schemas = schemas
+        self._db_path: str | None = None
+        self._init_lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        if self._db_path is None:
+            with self._init_lock:
+                if self._db_path is None:
+                    self._db_path = init_db(self._state_dir, *self._schemas)
+        return connect(self._db_path)
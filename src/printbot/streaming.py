@@ -0,0 +1,138 @@
+import asyncio
+import base64
+import binascii
+import logging
+
+from .spool import SpoolWriter, suffix_for
+
+logger = logging.getLogger(__name__)
+
+
+class StreamError(Exception):
+    """A streamed payload is malformed (bad chunk, gap, size or checksum)."""
+
+
+class StreamBudget:
+    """Rolling ceiling on chunk bytes received but not yet on disk.
+
+    Shared by every in-flight stream. While the spool writers keep up, chunks
+    pass straight through; when the SD card falls behind the receive loop
+    waits here instead of buffering an unbounded backlog in RAM. A single
+    chunk larger than the ceiling is still admitted once nothing else is
+    buffered, so an oversized chunk can never deadlock a stream.
+    """
+
+    def __init__(self, ceiling: int):
+        self.ceiling = ceiling
+        self.buffered = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, n: int) -> None:
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: self.buffered == 0 or self.buffered + n <= self.ceiling
+            )
+            self.buffered += n
+
+    async def release(self, n: int) -> None:
+        async with self._cond:
+            self.buffered -= n
+            self._cond.notify_all()
+
+
+class PayloadStream:
+    """One ``print_begin`` … ``print_end`` transfer being written to a spool file.
+
+    Chunks are decoded and handed to a per-stream writer task, which appends
+    them to the spool file in order and keeps a running SHA-256.
+    """
+
+    def __init__(self, header: dict, budget: StreamBudget):
+        self.header = header
+        self.job_id = header.get("job_id", "unknown")
+        self._budget = budget
+        self._expected_size = header.get("payload_size")
+        self._next_seq = 0
+        self._writer: SpoolWriter | None = None
+        self._chunks: asyncio.Queue = asyncio.Queue()
+        self._write_task: asyncio.Task | None = None
+        self._write_error: Exception | None = None
+
+    @property
+    def size(self) -> int:
+        return self._writer.size if self._writer else 0
+
+    async def open(self) -> None:
+        self._writer = await asyncio.to_thread(
+            SpoolWriter, suffix_for(self.header.get("payload_type", "pdf")), self._expected_size,
+        )
+        self._write_task = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self) -> None:
+        while True:
+            chunk = await self._chunks.get()
+            if chunk is None:
+                return
+            try:
+                if self._write_error is None:
+                    await asyncio.to_thread(self._writer.write, chunk)
+            except Exception as e:
+                self._write_error = e
+            finally:
+                await self._budget.release(len(chunk))
+
+    async def feed(self, seq, data: str) -> None:
+        """Queue one chunk. ``seq`` must count up from 0 without gaps."""
+        if self._write_error is not None:
+            raise StreamError(str(self._write_error))
+        if seq != self._next_seq:
+            raise StreamError(f"Chunk out of order: expected seq {self._next_seq}, got {seq}")
+        try:
+            chunk = base64.b64decode(data, validate=True)
+        except (binascii.Error, TypeError, ValueError) as e:
+            raise StreamError(f"Invalid chunk data: {e}") from e
+        self._next_seq += 1
+        if not chunk:
+            return
+        await self._budget.acquire(len(chunk))
+        self._chunks.put_nowait(chunk)
+
+    async def finish(self, sha256: str | None = None) -> str:
+        """Flush, verify size/checksum and return the spool path (caller owns it)."""
+        await self._drain()
+        if self._write_error is not None:
+            raise StreamError(str(self._write_error))
+        if self._expected_size is not None and self._writer.size != self._expected_size:
+            raise StreamError(
+                f"Size mismatch: expected {self._expected_size} bytes, got {self._writer.size}"
+            )
+        expected = (sha256 or self.header.get("sha256") or "").removeprefix("sha256:")
+        if expected and self._writer.hexdigest() != expected.lower():
+            raise StreamError(
+                f"Checksum mismatch: expected {expected}, got {self._writer.hexdigest()}"
+            )
+        return await asyncio.to_thread(self._writer.close)
+
+    async def abort(self) -> None:
+        """Stop writing and delete the partial spool file."""
+        if self._write_task is not None:
+            self._write_task.cancel()
+            try:
+                await self._write_task
+            except asyncio.CancelledError:
+                pass
+            self._write_task = None
+        # Give back budget for chunks that never reached the writer.
+        while not self._chunks.empty():
+            chunk = self._chunks.get_nowait()
+            if chunk is not None:
+                await self._budget.release(len(chunk))
+        if self._writer is not None:
+            self._writer.discard()
+
+    async def _drain(self) -> None:
+        if self._write_task is None:
+            return
+        self._chunks.put_nowait(None)
+        await self._write_task
+        self._write_task = None
@@ -1,16 +1,37 @@
 import asyncio
-import json
+import functools
 import logging
 import random
 import socket
 import time
+from collections.abc import Callable
+from typing import NamedTuple
 
 import websockets
 
 from . import __version__
 from .config import Settings
-from .job_handler import handle_print_job
+from .control import ControlSupervisor
+from .cups_backend import IppBackend
+from .cups_events import CupsEventWatcher
+from .decode_pool import DecodePool
+from .fetcher import PayloadFetcher
+from .flow import CreditWindow
+from .heartbeat import DeltaEncoder, HeartbeatCadence, HeartbeatCollector, PrinterRounds
+from .job_handler import PreparedJob, prepare_print_job, record_print_job, submit_print_job
+from .lanes import PrinterLanes
+from . import messages
+from .messages import (
+    AddPrinter,
+    CancelJob,
+    ClearQueue,
+    ConfigUpdate,
+    PrinterReasonRequest,
+    PrinterRequest,
+    SetPrinterOptions,
+)
 from .ota_updater import perform_ota_update, request_restart
+from .outbox import Outbox
 from .printing import (
     accept_jobs,
     add_printer,
@@ -21,17 +42,102 @@ from .printing import (
     enable_printer,
     get_printer_detail,
     get_printer_options,
+    get_backend,
     get_printer_status,
     list_jobs,
     list_printers,
+    printer_snapshot,
     reject_jobs,
     remove_printer,
     set_default_printer,
     set_printer_options,
+    single_flight_stats,
 )
+from .scheduler import JobScheduler, WaitStats
+from .send_queue import JobStatusBatcher, SendQueue
+from .session import SessionState
+from .spool import SpoolWriter, remove_spool_file, spool_manager, suffix_for
+from .streaming import PayloadStream, StreamBudget, StreamError
 
 logger = logging.getLogger(__name__)
 
+# Protocol features this gateway understands, advertised in the `hello`
+# message right after connecting. The server only uses an
+# optional encoding once the gateway has advertised it, so old servers keep
+# talking base64-in-JSON and never see a difference.
+GATEWAY_FEATURES = (
+    "binary_payload", "chunked_payload", "payload_url", "job_status_batch", "flow_credit",
+    "heartbeat_delta", "printer_event",
+)
+
+# Messages that must reach the server even if the socket is down when they
+# are produced: kept in the SQLite outbox and replayed after reconnect.
+DURABLE_TYPES = frozenset({"job_status", "job_status_batch", "ota_status"})
+
+# Outbox rows replayed per round trip to SQLite after a reconnect.
+OUTBOX_DRAIN_BATCH = 50
+
+# Concurrent print_begin … print_end transfers accepted at once.
+MAX_PAYLOAD_STREAMS = 4
+
+# Seconds the heartbeat reuses the local IP before looking it up again.
+LOCAL_IP_TTL = 300
+
+# While printer events reach the server, the idle heartbeat ceiling (without
+# HEARTBEAT_MAX_INTERVAL) is this many times HEARTBEAT_INTERVAL.
+EVENT_HEARTBEAT_FACTOR = 4
+
+# Longest pause between CUPS event polls while cupsd cannot be reached.
+PRINTER_EVENTS_RETRY_MAX = 60
+
+
+class Route(NamedTuple):
+    handler: str
+    # Run as a background task instead of inline in the receive loop, so a
+    # slow handler does not hold up the next frame.
+    detached: bool = False
+    # Control-plane request: runs under the ControlSupervisor with at most
+    # this many of the type at once (implies detached).
+    limit: int | None = None
+
+
+# Read-only CUPS queries may overlap a little; anything that mutates CUPS
+# state or runs for seconds goes one at a time.
+_READ = 2
+_SERIAL = 1
+
+
+# Message type -> handler. The argument is the typed struct from
+# messages.MESSAGE_STRUCTS, or the raw dict for the print family.
+_ROUTES = {
+    "print": Route("_handle_print"),
+    "print_begin": Route("_handle_print_begin"),
+    "print_chunk": Route("_handle_print_chunk"),
+    "print_end": Route("_handle_print_end"),
+    "hello_ack": Route("_handle_hello_ack"),
+    "capabilities": Route("_handle_capabilities"),
+    "ping": Route("_handle_ping"),
+    "heartbeat_resync": Route("_handle_heartbeat_resync"),
+    "config_update": Route("_handle_config_update", limit=_SERIAL),
+    "discover_devices": Route("_handle_discover_devices_request", limit=_SERIAL),
+    "cups_add_printer": Route("_handle_cups_add_printer", limit=_SERIAL),
+    "cups_list_printers": Route("_handle_cups_list_printers", limit=_READ),
+    "cups_remove_printer": Route("_handle_cups_remove_printer", limit=_SERIAL),
+    "cups_set_default": Route("_handle_cups_set_default", limit=_SERIAL),
+    "cups_get_printer_options": Route("_handle_cups_get_printer_options", limit=_READ),
+    "cups_set_printer_options": Route("_handle_cups_set_printer_options", limit=_SERIAL),
+    # queue control (PR3)
+    "cups_resume_printer": Route("_handle_cups_resume_printer", limit=_SERIAL),
+    "cups_enable_printer": Route("_handle_cups_enable_printer", limit=_SERIAL),
+    "cups_disable_printer": Route("_handle_cups_disable_printer", limit=_SERIAL),
+    "cups_accept_jobs": Route("_handle_cups_accept_jobs", limit=_SERIAL),
+    "cups_reject_jobs": Route("_handle_cups_reject_jobs", limit=_SERIAL),
+    "cups_list_jobs": Route("_handle_cups_list_jobs", limit=_READ),
+    "cups_cancel_job": Route("_handle_cups_cancel_job", limit=_SERIAL),
+    "cups_clear_queue": Route("_handle_cups_clear_queue", limit=_SERIAL),
+    "ota_update": Route("_handle_ota_update_request", detached=True),
+}
+
 
 def _get_local_ip() -> str:
     """Get the local LAN IP address."""
@@ -66,7 +172,19 @@ def _build_printer_entry(printer_name: str) -> dict | None:
         return None
 
     summary = next((p for p in all_printers if p["name"] == printer_name), None)
+    return _printer_entry(printer_name, detail, jobs, summary)
+
 
+def _build_printer_entries() -> dict[str, dict]:
+    """Heartbeat entries for every CUPS queue, from one batched collection
+    pass (``printer_snapshot``) instead of four lpstat calls per printer."""
+    return {
+        p["name"]: _printer_entry(p["name"], p, p["jobs"], p)
+        for p in printer_snapshot()
+    }
+
+
+def _printer_entry(printer_name: str, detail: dict, jobs: list[dict], summary: dict | None) -> dict:
     oldest_age: int | None = None
     creation_times = [j["time-at-creation"] for j in jobs if "time-at-creation" in j]
     if creation_times:
@@ -96,34 +214,115 @@ class GatewayClient:
         self.settings = settings
         self._ws = None
         self._job_queue: asyncio.Queue = asyncio.Queue()
+        # One lane per printer, fed from _job_queue by _process_jobs; each
+        # lane's inbox hands jobs out by SCHEDULER_POLICY.
+        self._wait_stats = WaitStats()
+        make_inbox = functools.partial(
+            JobScheduler, settings.scheduler_policy, settings.scheduler_aging, self._wait_stats,
+        )
+        make_inbox()  # fail fast on an unknown SCHEDULER_POLICY
+        self._lanes = PrinterLanes(
+            self._prepare_job, self._submit_job, self._record_job, settings.lane_concurrency,
+            inbox=make_inbox,
+        )
         self._running = False
         self._start_time = time.monotonic()
+        # Heartbeat probes run in threads under a per-beat time budget.
+        self._collector = HeartbeatCollector(settings.heartbeat_budget)
+        self._printer_rounds = PrinterRounds(settings.heartbeat_round_size)
+        # Merge-patch heartbeats for servers that negotiate heartbeat_delta.
+        self._heartbeat_delta = DeltaEncoder(settings.heartbeat_full_every)
+        # Heartbeat interval adapts to printer and job activity.
+        self._cadence = HeartbeatCadence(settings.heartbeat_min_interval)
+        # Set to re-check when the next heartbeat is due (activity shortens
+        # the interval); with _heartbeat_now it is sent at once.
+        self._heartbeat_wake = asyncio.Event()
+        self._heartbeat_now = False
+        # CUPS notification subscription for the whole process; printer
+        # changes are pushed as printer_event instead of waiting for a
+        # heartbeat. Only on the IPP backend (CUPS_BACKEND resolved to ipp).
+        backend = get_backend()
+        self._events = (
+            CupsEventWatcher(backend.client)
+            if settings.printer_events and isinstance(backend, IppBackend) else None
+        )
         self._ota_in_progress: bool = False
+        # Features the server advertised in `hello_ack` (or `capabilities`).
+        self._server_features: set[str] = set()
+        # Reconnect handshake: session id, last server seq, printed-job cursor.
+        self._session = SessionState(settings.state_dir)
+        # Cursor sent in the current hello, persisted once the server acks it.
+        self._hello_cursor: str | None = None
+        # cups_* / config_update / discover_devices tasks, bounded per type.
+        self._control = ControlSupervisor()
+        # Jobs accepted from the server but not yet through the processor, in
+        # arrival order; announced in `hello` so the server need not resend them.
+        self._held_jobs: dict[str, None] = {}
+        # Credits for jobs from header to final status; jobs that do not fit
+        # are deferred back to the server, which keeps the backlog.
+        self._credits = CreditWindow(settings.credit_jobs, settings.credit_bytes)
+        self._credit_update_pending = False
+        # In-flight binary-frame payload: (print header, spool writer).
+        self._binary_rx: tuple[dict, SpoolWriter] | None = None
+        # In-flight chunked payloads keyed by job_id.
+        self._streams: dict[str, PayloadStream] = {}
+        self._stream_budget = StreamBudget(settings.stream_buffer_bytes)
+        # payload_url jobs: downloads start on arrival and run ahead of the
+        # sequential processor, keyed by job_id until the processor claims them.
+        self._fetcher = PayloadFetcher(
+            api_key=settings.api_key, pool_size=max(1, settings.download_concurrency),
+        )
+        self._download_slots = asyncio.Semaphore(max(1, settings.download_concurrency))
+        self._downloads: dict[str, asyncio.Task] = {}
+        # Large base64 payloads are decoded to the spool in worker processes.
+        self._decode_pool = DecodePool(settings.decode_workers)
+        # Outbound frames go through one writer task per connection, fed by a
+        # priority queue so a burst of CUPS responses can't delay job status.
+        self._send_queue = SendQueue()
+        self._writer_task: asyncio.Task | None = None
+        # Coalesces job_status frames when the server advertised job_status_batch.
+        self._status_batcher = JobStatusBatcher(self._send)
+        # Statuses produced while offline; replayed (in order) after reconnect.
+        # While a replay is running new durable messages queue behind it.
+        self._outbox = Outbox(settings.state_dir)
+        self._outbox_draining = False
+        # Held around outbox writes and the replay's peek, so a write started
+        # while draining lands before the replay can see the outbox empty.
+        self._outbox_lock = asyncio.Lock()
 
     async def run(self):
         """Main run loop with auto-reconnect."""
         self._running = True
         delay = self.settings.reconnect_delay
 
-        while self._running:
-            try:
-                await self._connect_and_listen()
-                # Connection closed normally, reset delay
-                delay = self.settings.reconnect_delay
-            except (websockets.ConnectionClosed, ConnectionError, OSError) as e:
-                logger.warning("Connection lost: %s", e)
-            except Exception as e:
-                logger.exception("Unexpected error: %s", e)
-
-            if not self._running:
-                break
+        # The job processor outlives individual connections: queued jobs keep
+        # printing through a network blip and their statuses go to the outbox.
+        processor_task = asyncio.create_task(self._process_jobs())
+        try:
+            while self._running:
+                try:
+                    await self._connect_and_listen()
+                    # Connection closed normally, reset delay
+                    delay = self.settings.reconnect_delay
+                except (websockets.ConnectionClosed, ConnectionError, OSError) as e:
+                    logger.warning("Connection lost: %s", e)
+                except Exception as e:
+                    logger.exception("Unexpected error: %s", e)
+
+                if not self._running:
+                    break
 
-            # Exponential backoff with jitter
-            jitter = random.uniform(0, delay * 0.3)
-            wait = delay + jitter
-            logger.info("Reconnecting in %.1f seconds...", wait)
-            await asyncio.sleep(wait)
-            delay = min(delay * 2, self.settings.max_reconnect_delay)
+                # Exponential backoff with jitter
+                jitter = random.uniform(0, delay * 0.3)
+                wait = delay + jitter
+                logger.info("Reconnecting in %.1f seconds...", wait)
+                await asyncio.sleep(wait)
+                delay = min(delay * 2, self.settings.max_reconnect_delay)
+        finally:
+            processor_task.cancel()
+            self._decode_pool.close()
+            if self._events is not None:
+                await asyncio.to_thread(self._events.close)
 
     async def _connect_and_listen(self):
         """Connect to server and process messages."""
@@ -136,100 +335,487 @@ class GatewayClient:
             ping_interval=20,
             ping_timeout=20,
             close_timeout=10,
+            max_size=self.settings.max_frame_bytes,
         ) as ws:
             self._ws = ws
+            self._server_features = set()
+            self._outbox_draining = True
             logger.info("Connected to server")
+            self._writer_task = asyncio.create_task(self._writer_loop(ws))
+
+            await self._send_hello()
 
-            # Start heartbeat and job processor tasks
+            drain_task = asyncio.create_task(self._drain_outbox())
             heartbeat_task = asyncio.create_task(self._heartbeat_loop())
-            processor_task = asyncio.create_task(self._process_jobs())
+            events_task = asyncio.create_task(self._printer_events_loop()) if self._events else None
 
             try:
                 async for raw in ws:
+                    if isinstance(raw, bytes):
+                        await self._handle_binary_frame(raw)
+                        continue
                     try:
-                        msg = json.loads(raw)
-                    except json.JSONDecodeError:
+                        msg = messages.decode_frame(raw)
+                    except messages.DecodeError:
                         logger.warning("Invalid JSON received")
                         continue
+                    # A large print frame now lives only in its LazyPayload,
+                    # which is dropped once the payload is spooled.
+                    del raw
 
                     await self._handle_message(msg)
             finally:
-                heartbeat_task.cancel()
-                processor_task.cancel()
                 self._ws = None
+                heartbeat_task.cancel()
+                if events_task is not None:
+                    events_task.cancel()
+                drain_task.cancel()
+                self._control.cancel_all()
+                self._writer_task.cancel()
+                self._writer_task = None
+                await self._stash_unsent()
+                self._abort_binary_rx("connection closed")
+                await self._abort_streams("connection closed")
+
+    # --- offline outbox ---------------------------------------------------------
+
+    async def _stash_unsent(self):
+        """On disconnect, move durable messages that never hit the wire to the outbox."""
+        pending = [messages.loads(frame) for frame in self._send_queue.clear()]
+        pending.extend(self._status_batcher.clear())
+        durable = [m for m in pending if m.get("type") in DURABLE_TYPES]
+        if durable:
+            async with self._outbox_lock:
+                await asyncio.to_thread(self._outbox.extend, durable)
+        if pending:
+            logger.warning("Disconnected with %d unsent message(s); %d kept in outbox",
+                           len(pending), len(durable))
+
+    async def _drain_outbox(self):
+        """Replay outbox messages oldest-first, in batches, right after connect.
+
+        Until every row has been queued, new durable messages are appended
+        to the outbox (see `_send`) so they cannot overtake older ones. The
+        peek and clearing `_outbox_draining` hold `_outbox_lock`, so a write
+        still in flight is either seen by the peek or finds the flag cleared.
+
+        A row is only deleted once the writer has put its frame on the wire.
+        If the link drops first, the row is still in place, ahead of anything
+        stashed since, and is replayed again after the next connect.
+        """
+        replayed = 0
+        last_id = 0
+        while True:
+            async with self._outbox_lock:
+                rows = await asyncio.to_thread(self._outbox.peek, OUTBOX_DRAIN_BATCH, last_id)
+                if not rows:
+                    self._outbox_draining = False
+            if not rows:
+                if replayed:
+                    logger.info("Replayed %d message(s) from outbox", replayed)
+                return
+
+            batching = "job_status_batch" in self._server_features
+            frames: list[dict] = []
+            entries: list[dict] = []
+            for _, msg in rows:
+                if msg.get("type") == "job_status_batch":
+                    statuses = msg.get("statuses", [])
+                elif msg.get("type") == "job_status":
+                    statuses = [{k: v for k, v in msg.items() if k != "type"}]
+                else:
+                    frames.append(msg)
+                    continue
+                if batching:
+                    entries.extend(statuses)
+                else:
+                    frames.extend({"type": "job_status", **status} for status in statuses)
+            if entries:
+                frames.append({"type": "job_status_batch", "statuses": entries})
+
+            # Durable types share one FIFO lane: once the batch's last frame
+            # is written, all of its rows are.
+            ids = [row_id for row_id, _ in rows]
+            for frame in frames[:-1]:
+                self._send_queue.put(frame)
+            if frames:
+                self._send_queue.put(frames[-1], on_sent=functools.partial(self._ack_outbox, ids))
+            else:
+                await asyncio.to_thread(self._outbox.ack, ids)
+            last_id = ids[-1]
+            replayed += len(rows)
 
-    async def _handle_message(self, msg: dict):
-        """Route incoming messages by type."""
-        msg_type = msg.get("type")
-
-        if msg_type == "print":
-            await self._job_queue.put(msg)
-            logger.info("Print job queued: %s", msg.get("job_id", "?"))
-
-        elif msg_type == "ping":
-            await self._send({"type": "pong", "timestamp": msg.get("timestamp", "")})
-
-        elif msg_type == "config_update":
-            asyncio.create_task(self._handle_config_update(msg))
-
-        elif msg_type == "discover_devices":
-            request_id = msg.get("request_id", "")
-            timeout = msg.get("timeout", 10)
-            logger.info("Device discovery requested (request_id=%s)", request_id)
-            asyncio.create_task(self._handle_discover_devices(request_id, timeout))
-
-        elif msg_type == "cups_add_printer":
-            asyncio.create_task(self._handle_cups_add_printer(msg))
-
-        elif msg_type == "cups_list_printers":
-            asyncio.create_task(self._handle_cups_list_printers(msg))
-
-        elif msg_type == "cups_remove_printer":
-            asyncio.create_task(self._handle_cups_remove_printer(msg))
-
-        elif msg_type == "cups_set_default":
-            asyncio.create_task(self._handle_cups_set_default(msg))
-
-        elif msg_type == "cups_get_printer_options":
-            asyncio.create_task(self._handle_cups_get_printer_options(msg))
+    def _ack_outbox(self, ids: list[int]):
+        asyncio.create_task(asyncio.to_thread(self._outbox.ack, ids))
 
-        elif msg_type == "cups_set_printer_options":
-            asyncio.create_task(self._handle_cups_set_printer_options(msg))
+    # --- session handshake -----------------------------------------------------
 
-        # --- queue control (PR3) -------------------------------------------
-        elif msg_type == "cups_resume_printer":
-            asyncio.create_task(self._handle_cups_resume_printer(msg))
+    async def _send_hello(self):
+        """Tell the server what this gateway already holds, so it can skip resends."""
+        printed, self._hello_cursor = await asyncio.to_thread(self._session.printed_since_ack)
+        await self._send({
+            "type": "hello",
+            "session_id": self._session.session_id,
+            "last_seq": self._session.last_seq,
+            "features": list(GATEWAY_FEATURES),
+            "spooled": list(self._held_jobs),
+            "printed": printed,
+            "credit": self._credits.available(),
+        })
 
-        elif msg_type == "cups_enable_printer":
-            asyncio.create_task(self._handle_cups_enable_printer(msg))
+    async def _handle_hello_ack(self, msg: messages.Features):
+        self._server_features = set(msg.features)
+        logger.info("Server features: %s", sorted(self._server_features) or "none")
+        cursor, self._hello_cursor = self._hello_cursor, None
+        await asyncio.to_thread(self._session.ack, cursor)
+
+    def _is_held(self, msg: dict) -> bool:
+        """True for a retransmission of a job that is already queued locally."""
+        if msg.get("job_id") in self._held_jobs:
+            logger.info("Job %s already queued, ignoring retransmission", msg["job_id"])
+            return True
+        return False
+
+    async def _enqueue_job(self, msg: dict) -> bool:
+        if self._is_held(msg):
+            remove_spool_file(msg.get("spool_path"))
+            return False
+        self._held_jobs[msg.get("job_id", "unknown")] = None
+        await self._job_queue.put(msg)
+        self._heartbeat_activity()
+        return True
+
+    # --- flow control -----------------------------------------------------------
+    # Every print job takes credits (one job, its payload bytes) when its
+    # header arrives and gives them back with its final status. A job that
+    # does not fit is answered with job_status "deferred" before any payload
+    # is spooled; the server keeps it and resends after a `flow_credit`.
+    # Servers that did not negotiate flow_credit know no "deferred" and would
+    # drop the job, so their jobs are always taken.
+
+    async def _admit(self, msg: dict) -> bool:
+        job_id = msg.get("job_id", "unknown")
+        if "flow_credit" not in self._server_features or self._credits.acquire(job_id, msg):
+            return True
+        logger.info("Job %s deferred: credit window exhausted (%d jobs held)",
+                    job_id, len(self._held_jobs))
+        await self._send_job_status(job_id, "deferred", error="Gateway busy, credit window exhausted")
+        return False
+
+    def _release_credit(self, job_id: str):
+        """Return a job's credits, unless a retransmission of it is still held."""
+        if job_id in self._held_jobs or not self._credits.release(job_id):
+            return
+        if "flow_credit" in self._server_features and not self._credit_update_pending:
+            # One flow_credit for all releases in this loop iteration.
+            self._credit_update_pending = True
+            asyncio.get_running_loop().call_soon(self._send_credit)
 
-        elif msg_type == "cups_disable_printer":
-            asyncio.create_task(self._handle_cups_disable_printer(msg))
+    def _send_credit(self):
+        self._credit_update_pending = False
+        if self._writer_task is not None:
+            self._send_queue.put({"type": "flow_credit", **self._credits.available()})
 
-        elif msg_type == "cups_accept_jobs":
-            asyncio.create_task(self._handle_cups_accept_jobs(msg))
+    async def _handle_message(self, msg: dict):
+        """Route an incoming message through the `_ROUTES` table."""
+        msg_type = msg.get("type")
+        self._session.observe(msg)
 
-        elif msg_type == "cups_reject_jobs":
-            asyncio.create_task(self._handle_cups_reject_jobs(msg))
+        route = _ROUTES.get(msg_type)
+        if route is None:
+            logger.warning("Unknown message type: %s", msg_type)
+            return
+        # Looked up by name at call time so handlers can be patched per instance.
+        handler = getattr(self, route.handler)
+        arg = messages.decode(msg)
+        if route.limit is not None:
+            if not self._control.submit(msg_type, route.limit, lambda: handler(arg)):
+                await self._send_busy(msg_type, arg)
+        elif route.detached:
+            asyncio.create_task(handler(arg))
+        else:
+            await handler(arg)
+
+    async def _send_busy(self, msg_type: str, msg):
+        """Answer a control request the supervisor had no room for."""
+        error = "Gateway busy, retry later"
+        request_id = getattr(msg, "request_id", "")
+        if msg_type == "discover_devices":
+            reply = {"type": "discover_devices_response", "request_id": request_id,
+                     "devices": [], "error": error}
+        elif msg_type == "config_update":
+            reply = {"type": "config_response", "success": False, "applied": {}, "error": error}
+        else:
+            reply = {"type": "cups_response", "request_id": request_id,
+                     "success": False, "data": None, "error": error}
+        reply["busy"] = True
+        await self._send(reply)
+
+    async def _handle_print(self, msg: dict):
+        if msg.get("payload_encoding") == "binary":
+            await self._begin_binary_rx(msg)
+            return
+        if self._is_held(msg):
+            return
+        if msg.get("payload_url") and not msg.get("sha256"):
+            # Never print a download that nothing vouches for.
+            await self._send_job_status(msg.get("job_id", "unknown"), "failed",
+                                        error="payload_url without sha256")
+            return
+        if not await self._admit(msg):
+            return
+        if msg.get("payload_url"):
+            self._start_download(msg)
+        elif isinstance(msg.get("payload"), messages.LazyPayload):
+            if not await self._spool_inline_payload(msg):
+                self._release_credit(msg.get("job_id", "unknown"))
+                return
+        await self._enqueue_job(msg)
+        logger.info("Print job queued: %s", msg.get("job_id", "?"))
+
+    async def _spool_inline_payload(self, msg: dict) -> bool:
+        """Decode a large base64 ``payload`` into a spool file before queueing.
+
+        The job then waits in the queue as a path instead of pinning the
+        whole frame (~1.33x the document) in memory. Returns False (job
+        failed and reported) when the payload is not valid base64.
+        """
+        job_id = msg.get("job_id", "unknown")
+        payload = msg.pop("payload")
+        try:
+            msg["spool_path"] = await self._decode_pool.spool(
+                payload, suffix_for(msg.get("payload_type", "pdf")),
+            )
+        except Exception as e:
+            logger.error("Job %s: could not spool payload: %s", job_id, e)
+            await self._send_job_status(job_id, "failed", error=f"Invalid payload: {e}")
+            return False
+        return True
+
+    async def _handle_capabilities(self, msg: messages.Features):
+        # Pre-hello servers announce their features separately.
+        self._server_features = set(msg.features)
+        logger.info("Server features: %s", sorted(self._server_features) or "none")
+
+    async def _handle_ping(self, msg: messages.Ping):
+        await self._send({"type": "pong", "timestamp": msg.timestamp})
+
+    async def _handle_heartbeat_resync(self, msg: dict):
+        # The server lost the delta baseline: send a full heartbeat right away.
+        self._heartbeat_delta.request_full()
+        self._heartbeat_now = True
+        self._heartbeat_wake.set()
+
+    def _heartbeat_activity(self):
+        """Job arrived or finished: bring the next heartbeat forward."""
+        self._cadence.activity()
+        self._heartbeat_wake.set()
+
+    async def _handle_discover_devices_request(self, msg: messages.DiscoverDevices):
+        logger.info("Device discovery requested (request_id=%s)", msg.request_id)
+        await self._handle_discover_devices(msg.request_id, msg.timeout)
+
+    async def _handle_ota_update_request(self, msg: messages.OtaUpdate):
+        logger.info("OTA update available: v%s", msg.version)
+        await self._handle_ota_update(msg.url, msg.checksum, msg.version)
+
+    # --- binary-frame payloads ------------------------------------------------
+    # A `print` header with payload_encoding="binary" and payload_size=N is
+    # followed by binary frames carrying exactly N raw bytes. The bytes are
+    # appended to a spool file as they arrive and the job is queued with
+    # `spool_path` once complete — no base64, no whole-document str/bytes copy.
+    # Only one binary payload is in flight at a time (frames carry no job id).
+
+    async def _begin_binary_rx(self, msg: dict):
+        job_id = msg.get("job_id", "unknown")
+        if self._binary_rx is not None:
+            prev_job_id = self._binary_rx[0].get("job_id", "unknown")
+            self._abort_binary_rx(f"superseded by job {job_id}")
+            await self._send_job_status(prev_job_id, "failed", error="Binary payload incomplete")
+        try:
+            size = int(msg.get("payload_size"))
+            if size < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            logger.warning("Job %s: invalid payload_size %r", job_id, msg.get("payload_size"))
+            await self._send_job_status(job_id, "failed", error="Invalid payload_size for binary payload")
+            return
+        if not await self._admit(msg):
+            return
 
-        elif msg_type == "cups_list_jobs":
-            asyncio.create_task(self._handle_cups_list_jobs(msg))
+        try:
+            writer = await asyncio.to_thread(
+                SpoolWriter, suffix_for(msg.get("payload_type", "pdf")), size,
+            )
+        except Exception as e:
+            logger.exception("Job %s: could not open spool file: %s", job_id, e)
+            self._release_credit(job_id)
+            await self._send_job_status(job_id, "failed", error=str(e))
+            return
+        self._binary_rx = (msg, writer)
+        logger.info("Job %s: receiving %d byte binary payload", job_id, size)
+        if size == 0:
+            await self._finish_binary_rx()
+
+    async def _handle_binary_frame(self, data: bytes):
+        if self._binary_rx is None:
+            logger.warning("Unexpected binary frame (%d bytes), dropping", len(data))
+            return
+        msg, writer = self._binary_rx
+        try:
+            await asyncio.to_thread(writer.write, data)
+        except Exception as e:
+            logger.warning("Job %s: binary payload rejected: %s", msg.get("job_id", "unknown"), e)
+            self._abort_binary_rx(str(e))
+            await self._send_job_status(msg.get("job_id", "unknown"), "failed", error=str(e))
+            return
+        if writer.complete:
+            await self._finish_binary_rx()
+
+    async def _finish_binary_rx(self):
+        msg, writer = self._binary_rx
+        self._binary_rx = None
+        job_id = msg.get("job_id", "unknown")
+        msg = dict(msg)
+        msg.pop("payload", None)
+        try:
+            msg["spool_path"] = await asyncio.to_thread(writer.close)
+        except Exception as e:
+            logger.exception("Job %s: could not finish spool file: %s", job_id, e)
+            writer.discard()
+            self._release_credit(job_id)
+            await self._send_job_status(job_id, "failed", error=str(e))
+            return
+        if await self._enqueue_job(msg):
+            logger.info("Print job queued: %s (binary, %d bytes)", msg.get("job_id", "?"), writer.size)
 
-        elif msg_type == "cups_cancel_job":
-            asyncio.create_task(self._handle_cups_cancel_job(msg))
+    def _abort_binary_rx(self, reason: str):
+        if self._binary_rx is None:
+            return
+        msg, writer = self._binary_rx
+        self._binary_rx = None
+        writer.discard()
+        self._release_credit(msg.get("job_id", "unknown"))
+        logger.warning("Job %s: binary payload aborted (%s, %d/%s bytes)",
+                       msg.get("job_id", "unknown"), reason, writer.size, writer.expected_size)
+
+    # --- chunked payload streams ----------------------------------------------
+    # print_begin carries the job header (everything a `print` message has
+    # except the payload, plus optional payload_size/sha256), each print_chunk
+    # a base64 slice with a gap-free `seq`, and print_end an optional sha256.
+    # Chunks are appended to the spool file as they arrive, so neither the
+    # frame size limit nor RAM bounds the document size.
+
+    async def _handle_print_begin(self, msg: dict):
+        job_id = msg.get("job_id", "unknown")
+        stream = self._streams.pop(job_id, None)
+        if stream is not None:
+            # The server restarted the transfer: drop the partial one quietly,
+            # so the job gets one status sequence.
+            logger.warning("Job %s: print_begin for a running stream, restarting it", job_id)
+            await stream.abort()
+            self._release_credit(job_id)
+        if len(self._streams) >= MAX_PAYLOAD_STREAMS:
+            logger.warning("Job %s: too many concurrent payload streams", job_id)
+            await self._send_job_status(job_id, "failed", error="Too many concurrent payload streams")
+            return
+        size = msg.get("payload_size")
+        if size is not None and (not isinstance(size, int) or size < 0):
+            await self._send_job_status(job_id, "failed", error="Invalid payload_size")
+            return
+        if not await self._admit(msg):
+            return
 
-        elif msg_type == "cups_clear_queue":
-            asyncio.create_task(self._handle_cups_clear_queue(msg))
+        stream = PayloadStream(msg, self._stream_budget)
+        try:
+            await stream.open()
+        except Exception as e:
+            logger.exception("Job %s: could not open spool file: %s", job_id, e)
+            self._release_credit(job_id)
+            await self._send_job_status(job_id, "failed", error=str(e))
+            return
+        self._streams[job_id] = stream
+        logger.info("Job %s: payload stream started (%s bytes announced)", job_id, size)
+
+    async def _handle_print_chunk(self, msg: dict):
+        job_id = msg.get("job_id", "unknown")
+        stream = self._streams.get(job_id)
+        if stream is None:
+            logger.warning("Job %s: print_chunk without print_begin, dropping", job_id)
+            return
+        try:
+            await stream.feed(msg.get("seq"), msg.get("data", ""))
+        except StreamError as e:
+            await self._fail_stream(job_id, str(e))
+
+    async def _handle_print_end(self, msg: dict):
+        job_id = msg.get("job_id", "unknown")
+        stream = self._streams.pop(job_id, None)
+        if stream is None:
+            logger.warning("Job %s: print_end without print_begin, dropping", job_id)
+            return
+        try:
+            spool_path = await stream.finish(msg.get("sha256"))
+        except StreamError as e:
+            logger.warning("Job %s: payload stream failed: %s", job_id, e)
+            await stream.abort()
+            self._release_credit(job_id)
+            await self._send_job_status(job_id, "failed", error=str(e))
+            return
 
-        elif msg_type == "ota_update":
-            url = msg.get("url", "")
-            checksum = msg.get("checksum", "")
-            version = msg.get("version", "?")
-            logger.info("OTA update available: v%s", version)
-            asyncio.create_task(self._handle_ota_update(url, checksum, version))
+        job = {k: v for k, v in stream.header.items() if k not in ("payload_size", "sha256")}
+        job["type"] = "print"
+        job["spool_path"] = spool_path
+        if await self._enqueue_job(job):
+            logger.info("Print job queued: %s (streamed, %d bytes)", job_id, stream.size)
+
+    async def _fail_stream(self, job_id: str, error: str):
+        stream = self._streams.pop(job_id, None)
+        if stream is not None:
+            await stream.abort()
+            self._release_credit(job_id)
+        logger.warning("Job %s: payload stream failed: %s", job_id, error)
+        await self._send_job_status(job_id, "failed", error=error)
+
+    async def _abort_streams(self, reason: str):
+        streams, self._streams = self._streams, {}
+        for job_id, stream in streams.items():
+            logger.warning("Job %s: payload stream aborted (%s)", job_id, reason)
+            await stream.abort()
+            self._release_credit(job_id)
+
+    # --- out-of-band payloads ---------------------------------------------------
+    # A `print` message may carry payload_url + sha256 (+ optional payload_size)
+    # instead of inline bytes. The download starts as soon as the message
+    # arrives so it overlaps with whatever job the processor is printing, and
+    # the big transfer never touches the control WebSocket.
+
+    def _start_download(self, msg: dict):
+        job_id = msg.get("job_id", "unknown")
+        if job_id not in self._downloads:
+            self._downloads[job_id] = asyncio.create_task(self._download_payload(msg))
+
+    async def _download_payload(self, msg: dict) -> str:
+        async with self._download_slots:
+            logger.info("Job %s: downloading payload from %s", msg.get("job_id", "unknown"), msg["payload_url"])
+            return await asyncio.to_thread(
+                self._fetcher.fetch,
+                msg["payload_url"],
+                msg["sha256"],
+                suffix_for(msg.get("payload_type", "pdf")),
+                msg.get("payload_size"),
+            )
 
-        else:
-            logger.warning("Unknown message type: %s", msg_type)
+    async def _resolve_payload(self, msg: dict) -> dict:
+        """Wait for a payload_url job's download; returns the job with spool_path."""
+        job_id = msg.get("job_id", "unknown")
+        task = self._downloads.pop(job_id, None)
+        if task is None:
+            task = asyncio.create_task(self._download_payload(msg))
+        spool_path = await task
+        job = {k: v for k, v in msg.items() if k not in ("payload_url", "sha256", "payload_size")}
+        job["spool_path"] = spool_path
+        return job
 
     async def _handle_discover_devices(self, request_id: str, timeout: int):
         """Run device discovery and send results back to the server.
@@ -282,11 +868,11 @@ class GatewayClient:
             "message": message,
         })
 
-    async def _handle_cups_add_printer(self, msg: dict):
+    async def _handle_cups_add_printer(self, msg: AddPrinter):
         """Add a printer to CUPS and send the result back."""
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
-        device_uri = msg.get("device_uri", "")
+        request_id = msg.request_id
+        printer_name = msg.printer_name
+        device_uri = msg.device_uri
         logger.info(
             "cups_add_printer request (request_id=%s, name=%s, uri=%s)",
             request_id, printer_name, device_uri,
@@ -296,10 +882,10 @@ class GatewayClient:
                 add_printer,
                 printer_name=printer_name,
                 device_uri=device_uri,
-                ppd=msg.get("ppd", ""),
-                description=msg.get("description", ""),
-                location=msg.get("location", ""),
-                options=msg.get("options") or None,
+                ppd=msg.ppd,
+                description=msg.description,
+                location=msg.location,
+                options=msg.options or None,
             )
             await self._send({
                 "type": "cups_response",
@@ -318,9 +904,9 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_list_printers(self, msg: dict):
+    async def _handle_cups_list_printers(self, msg: PrinterRequest):
         """List CUPS printers and send the result back."""
-        request_id = msg.get("request_id", "")
+        request_id = msg.request_id
         logger.info("cups_list_printers request (request_id=%s)", request_id)
         try:
             printers = await asyncio.to_thread(list_printers)
@@ -341,10 +927,10 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_remove_printer(self, msg: dict):
+    async def _handle_cups_remove_printer(self, msg: PrinterRequest):
         """Remove a CUPS printer and send the result back."""
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
+        request_id = msg.request_id
+        printer_name = msg.printer_name
         logger.info(
             "cups_remove_printer request (request_id=%s, name=%s)",
             request_id, printer_name,
@@ -368,10 +954,10 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_set_default(self, msg: dict):
+    async def _handle_cups_set_default(self, msg: PrinterRequest):
         """Set the default CUPS printer and send the result back."""
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
+        request_id = msg.request_id
+        printer_name = msg.printer_name
         logger.info(
             "cups_set_default request (request_id=%s, name=%s)",
             request_id, printer_name,
@@ -395,10 +981,10 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_get_printer_options(self, msg: dict):
+    async def _handle_cups_get_printer_options(self, msg: PrinterRequest):
         """Get CUPS printer options and send the result back."""
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
+        request_id = msg.request_id
+        printer_name = msg.printer_name
         logger.info(
             "cups_get_printer_options request (request_id=%s, name=%s)",
             request_id, printer_name,
@@ -422,11 +1008,11 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_set_printer_options(self, msg: dict):
+    async def _handle_cups_set_printer_options(self, msg: SetPrinterOptions):
         """Set CUPS printer options and send the result back."""
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
-        options = msg.get("options", {})
+        request_id = msg.request_id
+        printer_name = msg.printer_name
+        options = msg.options
         logger.info(
             "cups_set_printer_options request (request_id=%s, name=%s, options=%s)",
             request_id, printer_name, options,
@@ -457,11 +1043,11 @@ class GatewayClient:
     # don't add extra handling. cancel_job on a missing/completed id surfaces
     # CUPS's own error to the server via success=False.
 
-    async def _handle_cups_resume_printer(self, msg: dict):
+    async def _handle_cups_resume_printer(self, msg: PrinterRequest):
         """One-click recovery: cupsenable + cupsaccept. Matches the workaround
         from the original incident where re-adding the printer was the only fix."""
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
+        request_id = msg.request_id
+        printer_name = msg.printer_name
         logger.info(
             "cups_resume_printer request (request_id=%s, name=%s)",
             request_id, printer_name,
@@ -486,9 +1072,9 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_enable_printer(self, msg: dict):
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
+    async def _handle_cups_enable_printer(self, msg: PrinterRequest):
+        request_id = msg.request_id
+        printer_name = msg.printer_name
         logger.info(
             "cups_enable_printer request (request_id=%s, name=%s)",
             request_id, printer_name,
@@ -512,10 +1098,10 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_disable_printer(self, msg: dict):
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
-        reason = msg.get("reason", "") or ""
+    async def _handle_cups_disable_printer(self, msg: PrinterReasonRequest):
+        request_id = msg.request_id
+        printer_name = msg.printer_name
+        reason = msg.reason
         logger.info(
             "cups_disable_printer request (request_id=%s, name=%s, reason=%r)",
             request_id, printer_name, reason,
@@ -539,9 +1125,9 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_accept_jobs(self, msg: dict):
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
+    async def _handle_cups_accept_jobs(self, msg: PrinterRequest):
+        request_id = msg.request_id
+        printer_name = msg.printer_name
         logger.info(
             "cups_accept_jobs request (request_id=%s, name=%s)",
             request_id, printer_name,
@@ -565,10 +1151,10 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_reject_jobs(self, msg: dict):
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
-        reason = msg.get("reason", "") or ""
+    async def _handle_cups_reject_jobs(self, msg: PrinterReasonRequest):
+        request_id = msg.request_id
+        printer_name = msg.printer_name
+        reason = msg.reason
         logger.info(
             "cups_reject_jobs request (request_id=%s, name=%s, reason=%r)",
             request_id, printer_name, reason,
@@ -592,10 +1178,10 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_list_jobs(self, msg: dict):
+    async def _handle_cups_list_jobs(self, msg: PrinterRequest):
         """Response data shape: {"jobs": [<IPP-attribute kebab-case dicts>]}."""
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
+        request_id = msg.request_id
+        printer_name = msg.printer_name
         logger.info(
             "cups_list_jobs request (request_id=%s, name=%s)",
             request_id, printer_name,
@@ -619,10 +1205,10 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_cancel_job(self, msg: dict):
-        request_id = msg.get("request_id", "")
-        job_id = msg.get("job_id")
-        purge = bool(msg.get("purge", False))
+    async def _handle_cups_cancel_job(self, msg: CancelJob):
+        request_id = msg.request_id
+        job_id = msg.job_id
+        purge = msg.purge
         logger.info(
             "cups_cancel_job request (request_id=%s, job_id=%s, purge=%s)",
             request_id, job_id, purge,
@@ -648,10 +1234,10 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_cups_clear_queue(self, msg: dict):
-        request_id = msg.get("request_id", "")
-        printer_name = msg.get("printer_name", "")
-        purge = bool(msg.get("purge", False))
+    async def _handle_cups_clear_queue(self, msg: ClearQueue):
+        request_id = msg.request_id
+        printer_name = msg.printer_name
+        purge = msg.purge
         logger.info(
             "cups_clear_queue request (request_id=%s, name=%s, purge=%s)",
             request_id, printer_name, purge,
@@ -675,42 +1261,42 @@ class GatewayClient:
                 "error": str(e),
             })
 
-    async def _handle_config_update(self, msg: dict):
+    async def _handle_config_update(self, msg: ConfigUpdate):
         """Apply remote config changes, persist to .env, and send response."""
         applied = {}
         errors = []
 
         # printer_name
-        if "printer_name" in msg and msg["printer_name"] is not None:
-            self.settings.printer_name = str(msg["printer_name"])
+        if msg.printer_name is not None:
+            self.settings.printer_name = str(msg.printer_name)
             applied["printer_name"] = self.settings.printer_name
 
         # dry_run
-        if "dry_run" in msg and msg["dry_run"] is not None:
-            self.settings.dry_run = bool(msg["dry_run"])
+        if msg.dry_run is not None:
+            self.settings.dry_run = bool(msg.dry_run)
             applied["dry_run"] = self.settings.dry_run
 
         # log_level
-        if "log_level" in msg and msg["log_level"] is not None:
-            level_str = str(msg["log_level"]).upper()
+        if msg.log_level is not None:
+            level_str = str(msg.log_level).upper()
             if level_str in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
                 self.settings.log_level = level_str
                 logging.getLogger().setLevel(level_str)
                 applied["log_level"] = level_str
             else:
-                errors.append(f"Invalid log_level: {msg['log_level']}")
+                errors.append(f"Invalid log_level: {msg.log_level}")
 
         # heartbeat_interval
-        if "heartbeat_interval" in msg and msg["heartbeat_interval"] is not None:
+        if msg.heartbeat_interval is not None:
             try:
-                interval = int(msg["heartbeat_interval"])
+                interval = int(msg.heartbeat_interval)
                 if 10 <= interval <= 300:
                     self.settings.heartbeat_interval = interval
                     applied["heartbeat_interval"] = interval
                 else:
                     errors.append(f"heartbeat_interval must be 10-300, got {interval}")
             except (ValueError, TypeError):
-                errors.append(f"Invalid heartbeat_interval: {msg['heartbeat_interval']}")
+                errors.append(f"Invalid heartbeat_interval: {msg.heartbeat_interval}")
 
         # Persist to .env
         if applied:
@@ -763,31 +1349,69 @@ class GatewayClient:
         Adds a per-printer `printers[]` array (server-aligned, forward-compatible
         for multi-printer gateways). The legacy top-level `printer_status`
         scalar stays for v0.4.0 server compat — server derives any aggregates
-        it needs from `printers[]`, we don't pre-compute them.
+        it needs from `printers[]`, we don't pre-compute them. Each entry
+        carries its print lane depth (`lane`), and printers other than the
+        configured one are listed while their lane has work.
+
+        Every lpstat/IPP probe runs in a worker thread, all at once, within
+        HEARTBEAT_BUDGET seconds (see HeartbeatCollector): a hung cupsd
+        delays nothing on the event loop, and probes that miss the deadline
+        are sent from their last good value and named in `stale`.
+
+        When the server negotiated `heartbeat_delta`, heartbeats are sent as
+        merge patches against the last full one (see DeltaEncoder); each
+        connection starts with a full snapshot.
+
+        The interval adapts (see HeartbeatCadence): HEARTBEAT_MIN_INTERVAL
+        after a change or while jobs are in flight, doubling while idle up
+        to HEARTBEAT_MAX_INTERVAL. Each heartbeat reports the chosen
+        `interval`, i.e. when the next one is due at the latest. While
+        printer events are pushed (see `_printer_events_loop`) the idle
+        heartbeat is only a consistency check and backs off further.
         """
+        self._heartbeat_delta.request_full()
         while True:
+            sent_at = time.monotonic()
             try:
-                printer_status = get_printer_status(self.settings.printer_name)
                 uptime = int(time.monotonic() - self._start_time)
+                all_printers = self.settings.heartbeat_printers == "all"
+                names = self._heartbeat_printers()
+                probes = {
+                    "printer_status": functools.partial(get_printer_status, self.settings.printer_name),
+                    "local_ip": _get_local_ip,
+                }
+                if all_printers:
+                    probes["printers"] = _build_printer_entries
+                else:
+                    for name in names:
+                        probes[f"printer:{name}"] = functools.partial(_build_printer_entry, name)
+                values, stale = await self._collector.collect(probes, ttl={"local_ip": LOCAL_IP_TTL})
+                printer_status = values.get("printer_status", "unknown")
+
+                printers_round = None
+                if all_printers:
+                    entries = values.get("printers") or {}
+                    names, printers_round = self._printer_rounds.select(list(entries), names)
+                    entries = {name: (entries.get(name), "printers") for name in names}
+                else:
+                    entries = {name: (values.get(f"printer:{name}"), f"printer:{name}") for name in names}
 
-                # Per-printer enrichment runs three lpstat calls — push to a
-                # worker thread so the websocket loop stays responsive even on
-                # a slow cupsd.
                 printers: list[dict] = []
-                if self.settings.printer_name and self.settings.printer_name.strip():
-                    entry = await asyncio.to_thread(
-                        _build_printer_entry, self.settings.printer_name
-                    )
+                for name, (entry, probe) in entries.items():
                     if entry is not None:
+                        # The collector keeps the last entry; never mutate it.
+                        entry = dict(entry, lane=self._lanes.depth(name))
+                        if probe in stale:
+                            entry["stale"] = True
                         printers.append(entry)
 
-                await self._send({
+                heartbeat = {
                     "type": "heartbeat",
                     "gateway_id": self.settings.gateway_id,
                     "version": __version__,
                     "printer_status": printer_status,
                     "uptime": uptime,
-                    "local_ip": _get_local_ip(),
+                    "local_ip": values.get("local_ip", ""),
                     "printers": printers,
                     "config": {
                         "printer_name": self.settings.printer_name,
@@ -795,66 +1419,215 @@ class GatewayClient:
                         "log_level": self.settings.log_level,
                         "heartbeat_interval": self.settings.heartbeat_interval,
                     },
-                })
+                    # Gateway-internal health; servers that don't know the key ignore it.
+                    "metrics": {
+                        "send_queue": self._send_queue.snapshot(),
+                        "control": self._control.snapshot(),
+                        "cups_single_flight": single_flight_stats(),
+                        "spool": spool_manager().snapshot(),
+                        "scheduler": {
+                            "policy": self.settings.scheduler_policy,
+                            "wait_by_priority": self._wait_stats.snapshot(),
+                        },
+                        "flow": self._credits.snapshot(),
+                    },
+                }
+                if stale:
+                    heartbeat["stale"] = stale
+                if printers_round is not None:
+                    heartbeat["printers_round"] = printers_round
+                self._cadence.maximum = self._heartbeat_ceiling()
+                state = {p["name"]: self._printer_signature(p) for p in printers}
+                state[""] = printer_status  # printer names are never empty
+                heartbeat["interval"] = self._cadence.observe(state, active=bool(self._lanes.busy()))
+                on_sent = None
+                if "heartbeat_delta" in self._server_features:
+                    heartbeat = self._heartbeat_delta.encode(heartbeat)
+                    if heartbeat.get("full"):
+                        # Deltas refer to this snapshot only once it is written.
+                        on_sent = functools.partial(self._heartbeat_delta.confirm, heartbeat["hb_seq"])
+                await self._send(heartbeat, on_sent=on_sent)
                 logger.debug("Heartbeat sent (printer=%s, uptime=%ds, printers=%d)",
                              printer_status, uptime, len(printers))
             except Exception as e:
                 logger.error("Heartbeat error: %s", e)
 
-            await asyncio.sleep(self.settings.heartbeat_interval)
+            await self._wait_heartbeat(sent_at)
+
+    async def _wait_heartbeat(self, sent_at: float):
+        """Sleep until ``sent_at`` + the current interval, which activity may shorten."""
+        while not self._heartbeat_now:
+            remaining = sent_at + self._cadence.interval - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._heartbeat_wake.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+            self._heartbeat_wake.clear()
+        self._heartbeat_now = False
+
+    def _heartbeat_ceiling(self) -> float:
+        """Longest idle heartbeat interval: HEARTBEAT_MAX_INTERVAL, else
+        HEARTBEAT_INTERVAL, stretched while the server gets printer events."""
+        if self.settings.heartbeat_max_interval:
+            return self.settings.heartbeat_max_interval
+        interval = self.settings.heartbeat_interval
+        if self._events is not None and self._events.live and "printer_event" in self._server_features:
+            interval *= EVENT_HEARTBEAT_FACTOR
+        return interval
+
+    async def _printer_events_loop(self):
+        """Push CUPS printer changes as they happen (see CupsEventWatcher).
+
+        Polls the subscription every PRINTER_EVENTS_POLL seconds. A change is
+        sent as `printer_event` when the server negotiated it; servers that
+        did not get the next heartbeat at once instead. Any printer or job
+        event brings the heartbeat forward, which confirms the change with a
+        full lpstat/IPP read. While cupsd cannot be reached the poll backs
+        off up to PRINTER_EVENTS_RETRY_MAX seconds.
+        """
+        delay = self.settings.printer_events_poll
+        while True:
+            try:
+                events, job_activity = await asyncio.to_thread(self._events.poll)
+                delay = self.settings.printer_events_poll
+            except Exception as e:
+                if delay == self.settings.printer_events_poll:
+                    logger.warning("CUPS printer events unavailable: %s", e)
+                delay = min(max(delay, 1) * 2, PRINTER_EVENTS_RETRY_MAX)
+                events, job_activity = [], False
+
+            if events and "printer_event" in self._server_features:
+                for event in events:
+                    logger.info("Printer event: %s %s %s", event["printer_name"], event["event"],
+                                event.get("state", ""))
+                    await self._send(event)
+            elif events:
+                self._heartbeat_now = True
+            if events or job_activity:
+                self._heartbeat_activity()
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _printer_signature(entry: dict) -> tuple:
+        """What counts as a printer change for the heartbeat cadence."""
+        return (
+            entry.get("state"), tuple(entry.get("state_reasons", ())),
+            entry.get("accepting_jobs"), entry.get("cups_pending_jobs"),
+        )
+
+    def _heartbeat_printers(self) -> list[str]:
+        """The configured printer plus any other printer with jobs in its lane."""
+        names = [self.settings.printer_name] + self._lanes.busy()
+        return [n for n in dict.fromkeys(names) if n and n.strip()]
 
     async def _process_jobs(self):
-        """Process print jobs from queue sequentially.
+        """Dispatch queued print jobs to their printer's lane.
+
+        Each effective printer (``metadata.target_printer``, else the
+        configured ``printer_name``) has its own FIFO lane, so a jammed
+        printer only delays its own jobs. Within a lane jobs flow through
+        prepare → submit → record stages (see PrinterLanes), overlapping the
+        preparation of the next job with the submission of this one.
+        ``_job_queue.task_done`` is called once a job's final status is sent.
+        """
+        try:
+            while True:
+                msg = await self._job_queue.get()
+                self._lanes.submit(self._job_printer(msg), msg)
+        finally:
+            self._lanes.cancel_all()
+
+    def _job_printer(self, msg: dict) -> str:
+        metadata = msg.get("metadata") or {}
+        return metadata.get("target_printer") or self.settings.printer_name
+
+    async def _prepare_job(self, msg: dict) -> PreparedJob | None:
+        """Lane stage 1: ack the job, fetch its payload, check and prepare it.
+
+        Returns None when the job is already finished (duplicate, invalid,
+        download failed) and its status has been sent.
+        """
+        job_id = msg.get("job_id", "unknown")
+        try:
+            await self._send_job_status(job_id, "received")
+
+            if msg.get("payload_url"):
+                msg = await self._resolve_payload(msg)
+
+            prepared = await asyncio.to_thread(
+                prepare_print_job,
+                msg,
+                self.settings.printer_name,
+                self.settings.state_dir,
+                self.settings.dry_run,
+            )
+        except Exception as e:
+            logger.exception("Job %s failed: %s", job_id, e)
+            await self._finish_job(job_id, {"status": "failed", "error": str(e)})
+            return None
+        if isinstance(prepared, dict):
+            await self._finish_job(job_id, prepared)
+            return None
+        return prepared
+
+    async def _submit_job(self, prepared: PreparedJob) -> dict:
+        """Lane stage 2: submit to CUPS."""
+        try:
+            return await asyncio.to_thread(submit_print_job, prepared)
+        except Exception as e:
+            logger.exception("Job %s failed: %s", prepared.job_id, e)
+            prepared.discard()
+            return {"status": "failed", "error": str(e)}
+
+    async def _record_job(self, prepared: PreparedJob, result: dict):
+        """Lane stage 3: mark a printed job as such, then report the outcome."""
+        if result["status"] == "completed":
+            try:
+                await asyncio.to_thread(record_print_job, prepared)
+            except Exception as e:
+                logger.exception("Job %s failed: %s", prepared.job_id, e)
+                result = {"status": "failed", "error": str(e)}
+        await self._finish_job(prepared.job_id, result)
+
+    async def _finish_job(self, job_id: str, result: dict):
+        """Report a job's final status.
 
         Status sequence:
           - received  : ack-only, before submit (cups_job_id not yet known)
-          - printing  : emitted only when handle_print_job actually submitted
+          - printing  : emitted only when the job was actually submitted
                         to CUPS (the result dict carries the `cups_job_id` key,
                         even if its value is None on parse failure). Skipped
                         for the dedup path where no `lp` call happened.
           - completed : terminal success
           - failed    : terminal failure (cups_job_id may be absent if submit blew up)
         """
-        while True:
-            msg = await self._job_queue.get()
-            job_id = msg.get("job_id", "unknown")
-
-            try:
-                await self._send_job_status(job_id, "received")
-
-                result = await asyncio.to_thread(
-                    handle_print_job,
-                    msg,
-                    self.settings.printer_name,
-                    self.settings.state_dir,
-                    self.settings.dry_run,
-                )
-
-                cups_job_id = result.get("cups_job_id")
-                # Presence-of-key (not value) signals "submission happened".
-                # Dedup path returns {"status": "completed"} with no cups_job_id key.
-                submitted_to_cups = "cups_job_id" in result
+        try:
+            cups_job_id = result.get("cups_job_id")
+            # Presence-of-key (not value) signals "submission happened".
+            # Dedup path returns {"status": "completed"} with no cups_job_id key.
+            submitted_to_cups = "cups_job_id" in result
 
-                if result["status"] == "completed":
-                    if submitted_to_cups:
-                        await self._send_job_status(
-                            job_id, "printing", cups_job_id=cups_job_id
-                        )
+            if result["status"] == "completed":
+                if submitted_to_cups:
                     await self._send_job_status(
-                        job_id, "completed", cups_job_id=cups_job_id
+                        job_id, "printing", cups_job_id=cups_job_id
                     )
-                else:
-                    await self._send_job_status(
-                        job_id, result["status"],
-                        error=result.get("error"),
-                        cups_job_id=cups_job_id,
-                    )
-
-            except Exception as e:
-                logger.exception("Job %s failed: %s", job_id, e)
-                await self._send_job_status(job_id, "failed", error=str(e))
-
+                await self._send_job_status(
+                    job_id, "completed", cups_job_id=cups_job_id
+                )
+            else:
+                await self._send_job_status(
+                    job_id, result["status"],
+                    error=result.get("error"),
+                    cups_job_id=cups_job_id,
+                )
+        finally:
+            self._held_jobs.pop(job_id, None)
+            self._release_credit(job_id)
             self._job_queue.task_done()
+            self._heartbeat_activity()
 
     async def _send_job_status(
         self,
@@ -869,12 +1642,50 @@ class GatewayClient:
             msg["error"] = error
         if cups_job_id is not None:
             msg["cups_job_id"] = cups_job_id
-        await self._send(msg)
+        if (
+            "job_status_batch" in self._server_features
+            and self._ws is not None
+            and not self._outbox_draining
+        ):
+            await self._status_batcher.add(msg)
+        else:
+            await self._send(msg)
 
-    async def _send(self, msg: dict):
-        """Send JSON message via WebSocket."""
-        if self._ws:
-            await self._ws.send(json.dumps(msg))
+    async def _send(self, msg: dict, on_sent: Callable[[], None] | None = None):
+        """Send JSON message via WebSocket.
+
+        While connected, messages are queued for the writer task (priority
+        lanes, see send_queue). Without a writer — i.e. outside the
+        connect loop — they are written directly. Durable messages (job and
+        OTA status) produced while offline, or while the outbox is still
+        being replayed, are appended to the outbox instead. ``on_sent`` is
+        called once the message is written.
+        """
+        if msg.get("type") in DURABLE_TYPES and (self._ws is None or self._outbox_draining):
+            async with self._outbox_lock:
+                # The replay may have finished while we waited for the lock.
+                if self._ws is None or self._outbox_draining:
+                    await asyncio.to_thread(self._outbox.put, msg)
+                    return
+        if self._writer_task is not None:
+            self._send_queue.put(msg, on_sent=on_sent)
+        elif self._ws:
+            await self._ws.send(messages.dumps(msg))
+            if on_sent is not None:
+                on_sent()
+
+    async def _writer_loop(self, ws):
+        """Single writer: drain the send queue onto the socket in lane order."""
+        while True:
+            lane, frame = await self._send_queue.get()
+            try:
+                await ws.send(frame)
+                self._send_queue.sent()
+            except websockets.ConnectionClosed:
+                # The receive loop sees the close too and tears down the
+                # connection; keep the frame so it can be stashed.
+                self._send_queue.requeue(lane, frame)
+                return
 
     async def shutdown(self):
         """Graceful shutdown: wait for current job, close connection."""
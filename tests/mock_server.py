@@ -2,17 +2,31 @@
 
 Usage:
     python -m tests.mock_server
+    python -m tests.mock_server --encoding binary --size-mb 20
 
 Starts a WebSocket server on ws://localhost:8765/ws/gateway that:
 - Accepts any Bearer token
+- Answers the gateway's ``hello`` with ``hello_ack``
 - Sends a test print job on connect
 - Logs heartbeats and job status updates
+
+``--encoding`` selects how the payload is shipped: ``base64`` (classic
+base64-in-JSON), ``binary`` (JSON header + raw binary frames, only used when
+the gateway advertised ``binary_payload``) or ``chunked`` (``print_begin`` /
+``print_chunk`` / ``print_end`` stream, needs ``chunked_payload``).
+``--size-mb`` pads the test PDF to a given size so the encodings can be
+compared on large documents; the server logs wire bytes and
+send-to-completed throughput per job. Measure the gateway's peak RSS
+alongside, e.g. with ``/usr/bin/time -v python -m printbot.main``.
 """
 
+import argparse
 import asyncio
 import base64
+import hashlib
 import json
 import logging
+import time
 
 import websockets
 
@@ -22,65 +36,136 @@ logger = logging.getLogger("mock_server")
 # Minimal test PDF (blank page)
 TEST_PDF = b"%PDF-1.0\n1 0 obj<</Pages 2 0 R>>endobj\n2 0 obj<</Kids[3 0 R]/Count 1>>endobj\n3 0 obj<</MediaBox[0 0 595 842]>>endobj\nxref\n0 4\ntrailer<</Size 4/Root 1 0 R>>\nstartxref\n0\n%%EOF"
 
-
-async def handler(websocket):
-    path = websocket.request.path if hasattr(websocket, 'request') else ""
-    logger.info("Gateway connected (path=%s)", path)
-
-    # Send a test print job after 2 seconds
-    async def send_test_job():
-        await asyncio.sleep(2)
-        job = {
-            "type": "print",
-            "job_id": "test-job-001",
-            "payload": base64.b64encode(TEST_PDF).decode(),
-            "payload_type": "pdf",
-            "metadata": {
-                "title": "Test Print Job",
-                "copies": 1,
-                "duplex": False,
-            },
-        }
-        await websocket.send(json.dumps(job))
-        logger.info("Sent test print job")
-
-    send_task = asyncio.create_task(send_test_job())
-
-    try:
-        async for raw in websocket:
-            msg = json.loads(raw)
-            msg_type = msg.get("type")
-
-            if msg_type == "heartbeat":
-                logger.info(
-                    "Heartbeat: printer=%s, version=%s, uptime=%ds",
-                    msg.get("printer_status"), msg.get("version"), msg.get("uptime", 0),
-                )
-
-            elif msg_type == "job_status":
-                logger.info(
-                    "Job %s → %s%s",
-                    msg.get("job_id"), msg.get("status"),
-                    f" (error: {msg['error']})" if msg.get("error") else "",
-                )
-
-            elif msg_type == "pong":
-                logger.debug("Pong received")
-
+# Binary payload frames stay well below the websockets default max_size (1 MiB).
+BINARY_FRAME_SIZE = 256 * 1024
+# Raw bytes per print_chunk (base64 inflates this by a third on the wire).
+CHUNK_SIZE = 192 * 1024
+
+
+def build_pdf(size_mb: float) -> bytes:
+    """Return the test PDF, padded with trailing comment bytes to ~size_mb."""
+    target = int(size_mb * 1024 * 1024)
+    if target <= len(TEST_PDF):
+        return TEST_PDF
+    return TEST_PDF + b"\n%" + b"x" * (target - len(TEST_PDF) - 2)
+
+
+def make_handler(encoding: str, pdf: bytes):
+    async def handler(websocket):
+        path = websocket.request.path if hasattr(websocket, 'request') else ""
+        logger.info("Gateway connected (path=%s)", path)
+
+        gateway_features: set[str] = set()
+        sent_at: dict[str, tuple[float, int]] = {}
+
+        # Send a test print job after 2 seconds
+        async def send_test_job():
+            await asyncio.sleep(2)
+            job_id = "test-job-001"
+            job = {
+                "type": "print",
+                "job_id": job_id,
+                "seq": 1,
+                "payload_type": "pdf",
+                "metadata": {
+                    "title": "Test Print Job",
+                    "copies": 1,
+                    "duplex": False,
+                },
+            }
+            started = time.monotonic()
+            if encoding == "binary" and "binary_payload" in gateway_features:
+                job["payload_encoding"] = "binary"
+                job["payload_size"] = len(pdf)
+                header = json.dumps(job)
+                await websocket.send(header)
+                for offset in range(0, len(pdf), BINARY_FRAME_SIZE):
+                    await websocket.send(pdf[offset:offset + BINARY_FRAME_SIZE])
+                wire_bytes = len(header) + len(pdf)
+            elif encoding == "chunked" and "chunked_payload" in gateway_features:
+                sha256 = hashlib.sha256(pdf).hexdigest()
+                begin = dict(job, type="print_begin", payload_size=len(pdf), sha256=sha256)
+                frames = [json.dumps(begin)]
+                for seq, offset in enumerate(range(0, len(pdf), CHUNK_SIZE)):
+                    frames.append(json.dumps({
+                        "type": "print_chunk", "job_id": job_id, "seq": seq,
+                        "data": base64.b64encode(pdf[offset:offset + CHUNK_SIZE]).decode(),
+                    }))
+                frames.append(json.dumps({"type": "print_end", "job_id": job_id, "sha256": sha256}))
+                for frame in frames:
+                    await websocket.send(frame)
+                wire_bytes = sum(len(f) for f in frames)
             else:
-                logger.info("Received: %s", msg)
-
-    except websockets.ConnectionClosed:
-        logger.info("Gateway disconnected")
-    finally:
-        send_task.cancel()
-
-
-async def main():
-    logger.info("Mock Print Gateway Server starting on ws://localhost:8765/ws/gateway")
-    async with websockets.serve(handler, "localhost", 8765):
+                if encoding != "base64":
+                    logger.warning("Gateway did not advertise %s support, falling back to base64", encoding)
+                job["payload"] = base64.b64encode(pdf).decode()
+                frame = json.dumps(job)
+                await websocket.send(frame)
+                wire_bytes = len(frame)
+            sent_at[job_id] = (started, wire_bytes)
+            logger.info("Sent test print job (%d document bytes, %d wire bytes)", len(pdf), wire_bytes)
+
+        send_task = asyncio.create_task(send_test_job())
+
+        try:
+            async for raw in websocket:
+                msg = json.loads(raw)
+                msg_type = msg.get("type")
+
+                if msg_type == "hello":
+                    gateway_features = set(msg.get("features") or [])
+                    logger.info(
+                        "Gateway hello: session=%s, last_seq=%s, features=%s, spooled=%s, printed=%s",
+                        msg.get("session_id"), msg.get("last_seq"), sorted(gateway_features),
+                        msg.get("spooled"), msg.get("printed"),
+                    )
+                    await websocket.send(json.dumps({"type": "hello_ack", "features": []}))
+
+                elif msg_type == "heartbeat":
+                    logger.info(
+                        "Heartbeat: printer=%s, version=%s, uptime=%ds",
+                        msg.get("printer_status"), msg.get("version"), msg.get("uptime", 0),
+                    )
+
+                elif msg_type == "job_status":
+                    logger.info(
+                        "Job %s → %s%s",
+                        msg.get("job_id"), msg.get("status"),
+                        f" (error: {msg['error']})" if msg.get("error") else "",
+                    )
+                    if msg.get("status") == "completed" and msg.get("job_id") in sent_at:
+                        started, wire_bytes = sent_at.pop(msg["job_id"])
+                        elapsed = time.monotonic() - started
+                        logger.info(
+                            "Job %s: %.2fs send→completed, %.1f MB/s on the wire",
+                            msg["job_id"], elapsed, wire_bytes / 1e6 / max(elapsed, 1e-6),
+                        )
+
+                elif msg_type == "pong":
+                    logger.debug("Pong received")
+
+                else:
+                    logger.info("Received: %s", msg)
+
+        except websockets.ConnectionClosed:
+            logger.info("Gateway disconnected")
+        finally:
+            send_task.cancel()
+
+    return handler
+
+
+async def main(encoding: str = "base64", size_mb: float = 0):
+    logger.info("Mock Print Gateway Server starting on ws://localhost:8765/ws/gateway "
+                "(encoding=%s)", encoding)
+    async with websockets.serve(make_handler(encoding, build_pdf(size_mb)), "localhost", 8765):
         await asyncio.Future()  # run forever
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--encoding", choices=("base64", "binary", "chunked"), default="base64")
+    parser.add_argument("--size-mb", type=float, default=0,
+                        help="pad the test PDF to this many MiB")
+    args = parser.parse_args()
+    asyncio.run(main(args.encoding, args.size_mb))
@@ -0,0 +1,97 @@
+"""Tests for the control-plane task supervisor."""
+
+import asyncio
+
+from printbot.control import ControlSupervisor
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_per_type_limit():
+    supervisor = ControlSupervisor(max_pending=10, max_running=10)
+    gate = asyncio.Event()
+    active, peak = 0, 0
+
+    async def work():
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await gate.wait()
+        active -= 1
+
+    for _ in range(5):
+        assert supervisor.submit("cups_list_printers", 2, work)
+    await _settle()
+    assert supervisor.snapshot()["running"] == 2
+    assert supervisor.snapshot()["waiting"] == 3
+
+    gate.set()
+    await _settle()
+    assert peak == 2
+    assert supervisor.snapshot()["completed"] == 5
+
+
+async def test_global_limit_across_types():
+    supervisor = ControlSupervisor(max_pending=10, max_running=1)
+    gate = asyncio.Event()
+    supervisor.submit("cups_list_printers", 2, gate.wait)
+    supervisor.submit("cups_list_jobs", 2, gate.wait)
+    await _settle()
+    assert supervisor.snapshot()["running"] == 1
+    gate.set()
+    await _settle()
+    assert supervisor.snapshot()["completed"] == 2
+
+
+async def test_rejects_when_pending_full():
+    supervisor = ControlSupervisor(max_pending=2)
+    gate = asyncio.Event()
+    started = []
+
+    async def work():
+        started.append(1)
+        await gate.wait()
+
+    assert supervisor.submit("cups_add_printer", 1, work)
+    assert supervisor.submit("cups_add_printer", 1, work)
+    assert not supervisor.submit("cups_add_printer", 1, work)
+    snap = supervisor.snapshot()
+    assert snap["rejected"] == 1
+    assert snap["rejected_by_type"] == {"cups_add_printer": 1}
+    gate.set()
+    await _settle()
+    assert len(started) == 2
+
+
+async def test_cancel_all_releases_slots():
+    supervisor = ControlSupervisor(max_pending=10, max_running=1)
+    for _ in range(3):
+        supervisor.submit("discover_devices", 1, asyncio.Event().wait)
+    await _settle()
+    assert supervisor.cancel_all() == 3
+    await _settle()
+    assert supervisor.snapshot()["running"] == 0
+    assert supervisor.snapshot()["waiting"] == 0
+
+    done = asyncio.Event()
+
+    async def work():
+        done.set()
+
+    supervisor.submit("discover_devices", 1, work)
+    await asyncio.wait_for(done.wait(), timeout=1)
+
+
+async def test_failing_task_counted_and_logged(caplog):
+    supervisor = ControlSupervisor()
+
+    async def boom():
+        raise RuntimeError("lpadmin exploded")
+
+    supervisor.submit("cups_add_printer", 1, boom)
+    await _settle()
+    assert supervisor.snapshot()["completed"] == 1
+    assert "lpadmin exploded" in caplog.text
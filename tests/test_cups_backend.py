@@ -0,0 +1,268 @@
+"""Tests for the CUPS backend interface and the IPP backend."""
+
+import pytest
+
+from printbot import ipp
+from printbot.cups_backend import BackendUnavailable, CupsBackend, IppBackend, create_backend
+from printbot.ipp import IppError, IppUnavailable
+
+
+class FakeClient:
+    """Records requests and answers with queued response groups (or raises)."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def printer_uri(self, name):
+        return f"ipp://localhost/printers/{name}"
+
+    def request(self, operation, attributes, path="/", admin=False):
+        self.requests.append((operation, {name: value for _, name, value in attributes}, path, admin))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def send_document(self, operation, attributes, job_attributes, file_path, path, timeout):
+        self.requests.append((
+            operation,
+            {name: value for _, name, value in attributes},
+            {name: (tag, value) for tag, name, value in job_attributes},
+            path,
+            timeout,
+        ))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def close(self):
+        pass
+
+
+OP = (ipp.OPERATION_GROUP, {"status-message": "successful-ok"})
+
+
+class TestReads:
+    def test_list_printers(self):
+        client = FakeClient([
+            OP,
+            (ipp.PRINTER_GROUP, {"printer-name": "hp", "device-uri": "usb://HP/1", "printer-state": 3,
+                                 "printer-info": "Office", "printer-type": 0x20000 | 0x4}),
+            (ipp.PRINTER_GROUP, {"printer-name": "zebra", "device-uri": "socket://10.0.0.5",
+                                 "printer-state": 5, "printer-type": 0x4}),
+        ])
+        printers = IppBackend(client).list_printers()
+        assert printers == [
+            {"name": "hp", "uri": "usb://HP/1", "state": "idle", "info": "Office", "is_default": True},
+            {"name": "zebra", "uri": "socket://10.0.0.5", "state": "stopped", "info": "", "is_default": False},
+        ]
+        assert client.requests[0][0] == ipp.CUPS_GET_PRINTERS
+
+    def test_list_printers_none_configured(self):
+        client = FakeClient(IppError(0x0406, "No destinations added."))
+        assert IppBackend(client).list_printers() == []
+
+    def test_printer_detail(self):
+        client = FakeClient([OP, (ipp.PRINTER_GROUP, {
+            "printer-state": 5,
+            "printer-state-reasons": ["paused", "media-empty-error", "paused"],
+            "printer-is-accepting-jobs": False,
+            "printer-state-message": "Out of paper ",
+        })])
+        detail = IppBackend(client).get_printer_detail("hp")
+        assert detail == {
+            "state": "stopped",
+            "state_reasons": ["paused", "media-empty-error"],
+            "accepting_jobs": False,
+            "state_message": "Out of paper",
+        }
+        op, attrs, _, admin = client.requests[0]
+        assert op == ipp.GET_PRINTER_ATTRIBUTES
+        assert attrs["printer-uri"] == "ipp://localhost/printers/hp"
+        assert not admin
+
+    def test_printer_detail_none_reason_and_unknown_printer(self):
+        client = FakeClient(
+            [OP, (ipp.PRINTER_GROUP, {"printer-state": 3, "printer-state-reasons": "none",
+                                      "printer-is-accepting-jobs": True})],
+            IppError(0x0406, "The printer or class does not exist."),
+        )
+        backend = IppBackend(client)
+        assert backend.get_printer_detail("hp")["state_reasons"] == []
+        assert backend.get_printer_detail("nope") == {
+            "state": "unknown", "state_reasons": [], "accepting_jobs": False, "state_message": "",
+        }
+
+    def test_printer_status(self):
+        client = FakeClient(
+            [OP, (ipp.PRINTER_GROUP, {"printer-state": 4})],
+            [OP, (ipp.PRINTER_GROUP, {"printer-state": 5})],
+            IppError(0x0406, ""),
+        )
+        backend = IppBackend(client)
+        assert backend.get_printer_status("hp") == "printing"
+        assert backend.get_printer_status("hp") == "disabled"
+        assert backend.get_printer_status("hp") == "unknown"
+
+    def test_list_jobs(self):
+        client = FakeClient([
+            OP,
+            (ipp.JOB_GROUP, {"job-id": 41, "job-originating-user-name": "alice", "job-k-octets": 12,
+                             "time-at-creation": 1714000000, "job-state": 5, "job-name": "Invoice",
+                             "job-state-reasons": "job-printing"}),
+            (ipp.JOB_GROUP, {"job-id": 42, "job-originating-user-name": "bob", "job-k-octets": 3,
+                             "job-state": 4, "job-state-reasons": ["job-hold-until-specified"]}),
+        ])
+        jobs = IppBackend(client).list_jobs("hp")
+        assert jobs == [
+            {"job-id": 41, "job-originating-user-name": "alice", "job-k-octets": 12,
+             "job-state": "processing", "time-at-creation": 1714000000, "job-name": "Invoice",
+             "job-state-reasons": ["job-printing"]},
+            {"job-id": 42, "job-originating-user-name": "bob", "job-k-octets": 3,
+             "job-state": "pending-held", "job-state-reasons": ["job-hold-until-specified"]},
+        ]
+        assert client.requests[0][1]["which-jobs"] == "not-completed"
+
+    def test_printer_snapshot(self):
+        client = FakeClient(
+            [OP, (ipp.PRINTER_GROUP, {
+                "printer-name": "hp", "device-uri": "usb://HP/1", "printer-state": 5,
+                "printer-type": 0x20000, "printer-state-reasons": ["media-empty-error"],
+                "printer-is-accepting-jobs": True, "printer-state-message": "Out of paper",
+            }), (ipp.PRINTER_GROUP, {"printer-name": "my zebra", "printer-state": 3})],
+            [OP, (ipp.JOB_GROUP, {"job-id": 7, "job-state": 3,
+                                  "job-printer-uri": "ipp://localhost/printers/my%20zebra"}),
+             (ipp.JOB_GROUP, {"job-id": 8, "job-printer-uri": "ipp://localhost/printers/gone"})],
+        )
+        hp, zebra = IppBackend(client).printer_snapshot()
+        assert hp == {
+            "name": "hp", "uri": "usb://HP/1", "info": "", "is_default": True,
+            "state": "stopped", "state_reasons": ["media-empty-error"],
+            "accepting_jobs": True, "state_message": "Out of paper", "jobs": [],
+        }
+        assert zebra["state"] == "idle"
+        assert zebra["jobs"] == [{"job-id": 7, "job-originating-user-name": "", "job-k-octets": 0,
+                                  "job-state": "pending"}]
+        assert [r[0] for r in client.requests] == [ipp.CUPS_GET_PRINTERS, ipp.GET_JOBS]
+        assert client.requests[1][1]["printer-uri"] == "ipp://localhost/"
+
+
+class TestAdmin:
+    @pytest.mark.parametrize("method, args, op", [
+        ("enable_printer", ("hp",), ipp.RESUME_PRINTER),
+        ("disable_printer", ("hp",), ipp.PAUSE_PRINTER),
+        ("accept_jobs", ("hp",), ipp.CUPS_ACCEPT_JOBS),
+        ("reject_jobs", ("hp",), ipp.CUPS_REJECT_JOBS),
+        ("clear_queue", ("hp",), ipp.CANCEL_JOBS),
+        ("clear_queue", ("hp", True), ipp.PURGE_JOBS),
+        ("remove_printer", ("hp",), ipp.CUPS_DELETE_PRINTER),
+        ("set_default_printer", ("hp",), ipp.CUPS_SET_DEFAULT),
+    ])
+    def test_printer_operations(self, method, args, op):
+        client = FakeClient([OP])
+        getattr(IppBackend(client), method)(*args)
+        sent_op, attrs, path, admin = client.requests[0]
+        assert sent_op == op
+        assert attrs["printer-uri"] == "ipp://localhost/printers/hp"
+        assert path == "/admin/" and admin
+
+    def test_reason_is_sanitized(self):
+        client = FakeClient([OP])
+        IppBackend(client).disable_printer("hp", reason="Papier op 🙈" + "x" * 300)
+        message = client.requests[0][1]["printer-state-message"]
+        assert message.startswith("Papier op ?")
+        assert len(message) == 255
+
+    def test_cancel_job_namespaced_and_purge(self):
+        client = FakeClient([OP])
+        IppBackend(client).cancel_job("hp-42", purge=True)
+        op, attrs, _, _ = client.requests[0]
+        assert op == ipp.CANCEL_JOB
+        assert attrs == {"job-uri": "ipp://localhost/jobs/42", "purge-job": True}
+
+    def test_cancel_job_non_numeric_falls_back(self):
+        with pytest.raises(BackendUnavailable):
+            IppBackend(FakeClient()).cancel_job("hp-abc")
+
+    def test_error_becomes_runtime_error(self):
+        client = FakeClient(IppError(0x0406, "The printer or class does not exist."))
+        with pytest.raises(RuntimeError, match="Enable printer 'nope' failed: The printer"):
+            IppBackend(client).enable_printer("nope")
+
+    def test_unavailable_becomes_backend_unavailable(self):
+        client = FakeClient(IppUnavailable("IPP request not authorized: Forbidden"))
+        with pytest.raises(BackendUnavailable):
+            IppBackend(client).enable_printer("hp")
+
+
+class TestPrintFile:
+    def test_print_job(self):
+        client = FakeClient([OP, (ipp.JOB_GROUP, {"job-id": 88, "job-state": 3})])
+        job_id = IppBackend(client).print_file(
+            "hp", "Invoice", "/tmp/doc.pdf", "application/pdf",
+            {"copies": 2, "media": "A4", "orientation-requested": "3", "fit-to-page": "true",
+             "InputSlot": "Tray1"},
+            timeout=42,
+        )
+        assert job_id == 88
+        op, attrs, job_attrs, path, timeout = client.requests[0]
+        assert op == ipp.PRINT_JOB
+        assert attrs == {
+            "printer-uri": "ipp://localhost/printers/hp",
+            "job-name": "Invoice",
+            "document-format": "application/pdf",
+        }
+        assert job_attrs == {
+            "copies": (ipp.TAG_INTEGER, 2),
+            "media": (ipp.TAG_KEYWORD, "A4"),
+            "orientation-requested": (ipp.TAG_ENUM, 3),
+            "fit-to-page": (ipp.TAG_BOOLEAN, True),
+            "InputSlot": (ipp.TAG_KEYWORD, "Tray1"),
+        }
+        assert path == "/printers/hp"
+        assert timeout == 42
+
+    def test_default_printer_resolved(self):
+        client = FakeClient(
+            [OP, (ipp.PRINTER_GROUP, {"printer-name": "zebra"})],
+            [OP, (ipp.JOB_GROUP, {"job-id": 5})],
+        )
+        assert IppBackend(client).print_file("", "Label", "/tmp/x.zpl", "application/vnd.cups-raw") == 5
+        assert client.requests[0][0] == ipp.CUPS_GET_DEFAULT
+        assert client.requests[1][1]["printer-uri"] == "ipp://localhost/printers/zebra"
+
+    def test_refused_falls_back(self):
+        client = FakeClient(IppUnavailable("cupsd unreachable"))
+        with pytest.raises(BackendUnavailable):
+            IppBackend(client).print_file("hp", "t", "/tmp/x", "application/pdf")
+
+    def test_rejected_job_is_an_error(self):
+        client = FakeClient(IppError(0x0506, "Destination not accepting jobs."))
+        with pytest.raises(RuntimeError, match="not accepting"):
+            IppBackend(client).print_file("hp", "t", "/tmp/x", "application/pdf")
+
+
+class TestCreateBackend:
+    def test_base_backend_implements_nothing(self):
+        with pytest.raises(BackendUnavailable):
+            CupsBackend().list_printers()
+
+    def test_cli(self, tmp_path):
+        assert create_backend("cli") is None
+
+    def test_auto_without_socket(self, tmp_path):
+        assert create_backend("auto", socket_path=str(tmp_path / "cups.sock")) is None
+
+    def test_auto_with_socket(self, tmp_path):
+        sock = tmp_path / "cups.sock"
+        sock.touch()
+        assert isinstance(create_backend("auto", socket_path=str(sock)), IppBackend)
+
+    def test_ipp_forced(self, tmp_path):
+        assert isinstance(create_backend("IPP", socket_path=str(tmp_path / "none")), IppBackend)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            create_backend("pycups")
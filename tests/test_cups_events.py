@@ -0,0 +1,152 @@
+"""Tests for the CUPS notification subscription (printer events)."""
+
+import pytest
+
+from printbot import ipp
+from printbot.cups_events import CupsEventWatcher
+from printbot.ipp import IppError, IppUnavailable
+
+
+class FakeClient:
+    """Records requests and answers with queued response groups (or raises)."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def request(self, operation, attributes, path="/", admin=False, subscription=()):
+        self.requests.append((
+            operation,
+            {name: value for _, name, value in attributes},
+            {name: value for _, name, value in subscription},
+            admin,
+        ))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+OP = (ipp.OPERATION_GROUP, {"status-message": "successful-ok"})
+
+
+def subscribed(sub_id: int = 7) -> list:
+    return [OP, (ipp.SUBSCRIPTION_GROUP, {"notify-subscription-id": sub_id})]
+
+
+def notifications(*events: dict) -> list:
+    return [(ipp.OPERATION_GROUP, {"notify-get-interval": 30}),
+            *((ipp.EVENT_NOTIFICATION_GROUP, event) for event in events)]
+
+
+def printer_event(seq: int, name: str = "laser", state: int = 3, reasons="none",
+                  accepting: bool = True, event: str = "printer-state-changed") -> dict:
+    return {
+        "notify-subscription-id": 7,
+        "notify-sequence-number": seq,
+        "notify-subscribed-event": event,
+        "notify-text": f"Printer {name} changed ",
+        "printer-name": name,
+        "printer-state": state,
+        "printer-state-reasons": reasons,
+        "printer-is-accepting-jobs": accepting,
+    }
+
+
+class TestCupsEventWatcher:
+    def test_subscribes_then_polls_from_next_sequence(self):
+        client = FakeClient(
+            subscribed(),
+            notifications(printer_event(1, state=5, reasons=["media-empty-error", "paused"])),
+            notifications(),
+        )
+        watcher = CupsEventWatcher(client)
+        events, job_activity = watcher.poll()
+        assert events == [{
+            "type": "printer_event", "printer_name": "laser", "event": "printer-state-changed",
+            "state": "stopped", "state_reasons": ["media-empty-error", "paused"],
+            "accepting_jobs": True, "message": "Printer laser changed",
+        }]
+        assert not job_activity
+        assert watcher.live
+
+        op, attrs, template, admin = client.requests[0]
+        assert op == ipp.CREATE_PRINTER_SUBSCRIPTIONS
+        assert attrs["printer-uri"] == "ipp://localhost/"
+        assert template["notify-pull-method"] == "ippget"
+        assert "printer-state-changed" in template["notify-events"]
+        assert template["notify-lease-duration"] == watcher.lease
+        assert admin
+
+        watcher.poll()
+        op, attrs, _, _ = client.requests[2]
+        assert op == ipp.GET_NOTIFICATIONS
+        assert attrs["notify-subscription-ids"] == 7
+        assert attrs["notify-sequence-numbers"] == 2
+
+    def test_unchanged_state_is_not_repeated(self):
+        client = FakeClient(
+            subscribed(),
+            notifications(printer_event(1), printer_event(2), printer_event(3, accepting=False)),
+        )
+        events, _ = CupsEventWatcher(client).poll()
+        assert [e["accepting_jobs"] for e in events] == [True, False]
+
+    def test_job_events_only_flag_activity(self):
+        client = FakeClient(
+            subscribed(),
+            notifications({"notify-sequence-number": 1, "notify-subscribed-event": "job-completed",
+                           "printer-name": "laser", "job-id": 12}),
+        )
+        assert CupsEventWatcher(client).poll() == ([], True)
+
+    def test_deleted_printer(self):
+        client = FakeClient(
+            subscribed(),
+            notifications(printer_event(1), printer_event(2, event="printer-deleted")),
+        )
+        events, _ = CupsEventWatcher(client).poll()
+        assert events[1] == {"type": "printer_event", "printer_name": "laser", "event": "printer-deleted"}
+
+    def test_renews_at_half_lease(self):
+        now = [0.0]
+        client = FakeClient(subscribed(), notifications(), [OP], notifications())
+        watcher = CupsEventWatcher(client, lease=100, clock=lambda: now[0])
+        watcher.poll()
+        now[0] = 50
+        watcher.poll()
+        op, attrs, template, _ = client.requests[2]
+        assert op == ipp.RENEW_SUBSCRIPTION
+        assert attrs["notify-subscription-id"] == 7
+        assert template == {"notify-lease-duration": 100}
+
+    def test_lost_subscription_is_created_again(self):
+        client = FakeClient(
+            subscribed(7), notifications(printer_event(1)),
+            IppError(0x0406, "not found"), subscribed(8),
+            notifications(),
+        )
+        watcher = CupsEventWatcher(client)
+        watcher.poll()
+        # Nothing to report, but a heartbeat should re-read the state.
+        assert watcher.poll() == ([], True)
+        assert watcher.subscription_id == 8
+        watcher.poll()
+        assert client.requests[-1][1]["notify-sequence-numbers"] == 1
+
+    def test_unreachable_cupsd_raises_and_is_not_live(self):
+        watcher = CupsEventWatcher(FakeClient(subscribed(), notifications(), IppUnavailable("down")))
+        watcher.poll()
+        with pytest.raises(IppUnavailable):
+            watcher.poll()
+        assert not watcher.live
+        assert watcher.subscription_id == 7
+
+    def test_close_cancels_subscription(self):
+        client = FakeClient(subscribed(), notifications(), [OP])
+        watcher = CupsEventWatcher(client)
+        watcher.poll()
+        watcher.close()
+        assert client.requests[-1][0] == ipp.CANCEL_SUBSCRIPTION
+        assert client.requests[-1][1]["notify-subscription-id"] == 7
+        assert not watcher.live
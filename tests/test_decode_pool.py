@@ -0,0 +1,58 @@
+"""Tests for the base64 decode process pool."""
+
+import base64
+import os
+
+import pytest
+
+from printbot.decode_pool import DecodePool
+from printbot.messages import LazyPayload
+from printbot.spool import SpoolManager, set_spool_manager, spool_manager
+
+
+def lazy(data: bytes) -> LazyPayload:
+    b64 = base64.b64encode(data).decode()
+    return LazyPayload(b64, 0, len(b64))
+
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    previous = spool_manager()
+    set_spool_manager(SpoolManager(ram_bytes=0, disk_dir=str(tmp_path)))
+    yield tmp_path
+    set_spool_manager(previous)
+
+
+@pytest.fixture
+def pool():
+    pool = DecodePool(workers=1, min_bytes=1024, window=4096)
+    yield pool
+    pool.close()
+
+
+class TestDecodePool:
+    async def test_large_payload_decoded_in_worker(self, pool, spool_dir):
+        data = os.urandom(300_001)
+        path = await pool.spool(lazy(data), ".pdf")
+        assert os.path.dirname(path) == str(spool_dir)
+        assert path.endswith(".pdf")
+        with open(path, "rb") as f:
+            assert f.read() == data
+        assert pool.offloaded == 1
+
+    async def test_small_payload_stays_in_thread(self, pool, spool_dir):
+        path = await pool.spool(lazy(b"%PDF tiny"), ".pdf")
+        with open(path, "rb") as f:
+            assert f.read() == b"%PDF tiny"
+        assert pool.offloaded == 0
+        assert pool._executor is None
+
+    @pytest.mark.parametrize("workers", [0, 1])
+    async def test_invalid_base64_leaves_nothing(self, workers, spool_dir):
+        pool = DecodePool(workers=workers, min_bytes=0)
+        try:
+            with pytest.raises(ValueError):
+                await pool.spool(LazyPayload("AAAA!!!!" * 512, 0, 4096))
+        finally:
+            pool.close()
+        assert os.listdir(spool_dir) == []
@@ -0,0 +1,125 @@
+"""Tests for out-of-band payload downloads."""
+
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+import requests
+
+from printbot.fetcher import PayloadFetcher
+
+PAYLOAD = bytes(range(256)) * 400  # 100 KiB
+
+
+class _PayloadHandler(http.server.BaseHTTPRequestHandler):
+    """Serves PAYLOAD with Range support; can cut the first response short."""
+
+    drop_first_after: int | None = None
+    honour_range = True
+    requests_seen: list = []
+
+    def do_GET(self):
+        type(self).requests_seen.append(self.headers.get("Range"))
+        if self.path != "/payload.pdf":
+            self.send_error(404)
+            return
+        start = 0
+        rng = self.headers.get("Range")
+        if rng and self.honour_range:
+            start = int(rng.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            self.send_response(200)
+        body = PAYLOAD[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        cut = type(self).drop_first_after
+        if cut is not None:
+            type(self).drop_first_after = None
+            self.wfile.write(body[:cut])
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    handler = type("Handler", (_PayloadHandler,), {"requests_seen": []})
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield handler, f"http://127.0.0.1:{httpd.server_address[1]}/payload.pdf"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _fetcher() -> PayloadFetcher:
+    return PayloadFetcher(attempts=3, timeout=5, chunk_size=4096)
+
+
+SHA = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+def test_plain_download(server):
+    _, url = server
+    path = _fetcher().fetch(url, f"sha256:{SHA}", ".pdf", len(PAYLOAD))
+    try:
+        with open(path, "rb") as f:
+            assert f.read() == PAYLOAD
+    finally:
+        os.remove(path)
+
+
+def test_resumes_with_range_after_drop(server):
+    handler, url = server
+    handler.drop_first_after = 30000
+    path = _fetcher().fetch(url, SHA, ".pdf")
+    try:
+        with open(path, "rb") as f:
+            assert f.read() == PAYLOAD
+        assert handler.requests_seen[0] is None
+        resumed_at = int(handler.requests_seen[1].split("=")[1].rstrip("-"))
+        assert resumed_at > 0
+    finally:
+        os.remove(path)
+
+
+def test_restarts_when_range_ignored(server):
+    handler, url = server
+    handler.drop_first_after = 30000
+    handler.honour_range = False
+    path = _fetcher().fetch(url, SHA, ".pdf")
+    try:
+        with open(path, "rb") as f:
+            assert f.read() == PAYLOAD
+    finally:
+        os.remove(path)
+
+
+def test_checksum_mismatch_removes_file(server, tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    _, url = server
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        _fetcher().fetch(url, "0" * 64, ".pdf")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_missing_checksum_not_downloaded(server):
+    handler, url = server
+    with pytest.raises(ValueError, match="No sha256"):
+        _fetcher().fetch(url, "", ".pdf")
+    assert handler.requests_seen == []
+
+
+def test_http_error_not_retried(server):
+    handler, url = server
+    with pytest.raises(requests.HTTPError):
+        _fetcher().fetch(url.replace("payload.pdf", "missing.pdf"), SHA)
+    assert len(handler.requests_seen) == 1
@@ -0,0 +1,40 @@
+"""Tests for the flow-control credit window."""
+
+from printbot.flow import CreditWindow
+
+
+class TestCreditWindow:
+    def test_job_credits(self):
+        window = CreditWindow(jobs=2, size=1000)
+        assert window.acquire("a", {"payload_size": 10})
+        assert window.acquire("b", {"payload_size": 10})
+        assert not window.acquire("c", {"payload_size": 10})
+        assert window.available() == {"jobs": 0, "bytes": 980}
+        assert window.deferred == 1
+
+        assert window.release("a")
+        assert window.acquire("c", {"payload_size": 10})
+
+    def test_byte_credits(self):
+        window = CreditWindow(jobs=10, size=100)
+        assert window.acquire("a", {"payload_size": 60})
+        assert not window.acquire("b", {"payload_size": 60})
+        assert window.acquire("c", {"payload_size": 40})
+        assert window.available() == {"jobs": 8, "bytes": 0}
+
+    def test_oversized_job_accepted_when_idle(self):
+        window = CreditWindow(jobs=10, size=100)
+        assert window.acquire("huge", {"payload_size": 500})
+        assert window.available()["bytes"] == 0
+        assert not window.acquire("next", {"payload_size": 1})
+
+    def test_retransmission_not_counted_twice(self):
+        window = CreditWindow(jobs=1, size=100)
+        assert window.acquire("a", {"payload_size": 10})
+        assert window.acquire("a", {"payload_size": 10})
+        assert window.release("a")
+        assert not window.release("a")
+        assert window.snapshot() == {
+            "held_jobs": 0, "held_bytes": 0,
+            "available_jobs": 1, "available_bytes": 100, "deferred": 0,
+        }
@@ -0,0 +1,164 @@
+"""Tests for the deadline-budgeted heartbeat collector."""
+
+import asyncio
+import threading
+
+from printbot.heartbeat import DeltaEncoder, HeartbeatCadence, HeartbeatCollector, PrinterRounds, merge_patch
+
+
+class TestHeartbeatCollector:
+    async def test_fresh_values(self):
+        collector = HeartbeatCollector(budget=1)
+        values, stale = await collector.collect({"a": lambda: 1, "b": lambda: "x"})
+        assert values == {"a": 1, "b": "x"}
+        assert stale == []
+
+    async def test_slow_probe_reported_stale_from_last_good_value(self):
+        collector = HeartbeatCollector(budget=0.05)
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            if len(calls) > 1:
+                release.wait(5)
+            return len(calls)
+
+        assert await collector.collect({"slow": slow}) == ({"slow": 1}, [])
+        values, stale = await collector.collect({"slow": slow})
+        assert values == {"slow": 1}
+        assert stale == ["slow"]
+
+        # Still hung: not started a second time.
+        await collector.collect({"slow": slow})
+        assert len(calls) == 2
+        assert collector.missed == 2
+
+        release.set()
+        await asyncio.sleep(0.05)
+        assert await collector.collect({"slow": slow}) == ({"slow": 3}, [])
+
+    async def test_failing_probe_without_value_left_out(self):
+        collector = HeartbeatCollector(budget=1)
+
+        def boom():
+            raise RuntimeError("cupsd down")
+
+        values, stale = await collector.collect({"boom": boom, "ok": lambda: 1})
+        assert values == {"ok": 1}
+        assert stale == ["boom"]
+
+    async def test_ttl_skips_probe(self):
+        collector = HeartbeatCollector(budget=1)
+        calls = []
+
+        def probe():
+            calls.append(1)
+            return "10.0.0.2"
+
+        for _ in range(3):
+            values, stale = await collector.collect({"ip": probe}, ttl={"ip": 60})
+        assert values == {"ip": "10.0.0.2"}
+        assert stale == []
+        assert len(calls) == 1
+
+
+class TestPrinterRounds:
+    def test_small_set_not_split(self):
+        assert PrinterRounds(5).select(["b", "a"], ["a"]) == (["a", "b"], None)
+
+    def test_rounds_cycle_and_keep_pinned_printers(self):
+        rounds = PrinterRounds(2)
+        names = ["p1", "p2", "p3", "p4", "p5"]
+        assert rounds.select(names, ["p5"]) == (["p1", "p2", "p5"], {"index": 0, "count": 3, "total": 5})
+        assert rounds.select(names, ["p5"])[0] == ["p3", "p4", "p5"]
+        assert rounds.select(names, ["p5"])[0] == ["p5"]
+        assert rounds.select(names, ["gone"])[0] == ["p1", "p2"]
+
+
+class TestMergePatch:
+    def test_changed_added_and_removed_keys(self):
+        old = {"a": 1, "b": {"x": 1, "y": 2}, "c": [1], "gone": 3}
+        new = {"a": 1, "b": {"x": 1, "y": 3}, "c": [1, 2], "d": None}
+        assert merge_patch(old, new) == {"b": {"y": 3}, "c": [1, 2], "d": None, "gone": None}
+
+    def test_unchanged(self):
+        assert merge_patch({"a": {"b": 1}}, {"a": {"b": 1}}) == {}
+
+
+class TestDeltaEncoder:
+    def beat(self, uptime: int, state: str = "idle") -> dict:
+        return {
+            "type": "heartbeat", "gateway_id": "gw", "uptime": uptime, "version": "1.0",
+            "printers": [{"name": "hp", "state": state, "uri": "usb://HP"}],
+        }
+
+    def test_deltas_against_last_full_snapshot(self):
+        encoder = DeltaEncoder(full_every=2)
+        full = encoder.encode(self.beat(10))
+        assert full == {**self.beat(10), "hb_seq": 1, "full": True}
+        encoder.confirm(1)
+
+        assert encoder.encode(self.beat(40, "stopped")) == {
+            "type": "heartbeat", "gateway_id": "gw", "hb_seq": 2, "base_seq": 1,
+            "patch": {"uptime": 40, "printers": {"hp": {"state": "stopped"}}},
+        }
+        # Still against seq 1, not against the previous delta.
+        assert encoder.encode(self.beat(70))["patch"] == {"uptime": 70}
+        assert encoder.encode(self.beat(100))["full"] is True
+
+    def test_request_full(self):
+        encoder = DeltaEncoder()
+        encoder.encode(self.beat(10))
+        encoder.confirm(1)
+        encoder.request_full()
+        full = encoder.encode(self.beat(40))
+        assert (full["hb_seq"], full["full"]) == (2, True)
+        encoder.confirm(2)
+        assert "patch" in encoder.encode(self.beat(70))
+
+    def test_unsent_snapshot_is_not_a_base(self):
+        encoder = DeltaEncoder()
+        encoder.encode(self.beat(10))
+        # Snapshot 1 was dropped from the queue: the next one is full too.
+        assert encoder.encode(self.beat(40))["full"] is True
+        encoder.confirm(1)
+        assert encoder.encode(self.beat(70))["full"] is True
+        encoder.confirm(3)
+        assert encoder.encode(self.beat(100))["base_seq"] == 3
+
+    def test_printer_removed(self):
+        encoder = DeltaEncoder()
+        encoder.encode(self.beat(10))
+        encoder.confirm(1)
+        beat = self.beat(40)
+        beat["printers"] = []
+        assert encoder.encode(beat)["patch"] == {"uptime": 40, "printers": {"hp": None}}
+
+
+class TestHeartbeatCadence:
+    def test_backs_off_while_idle(self):
+        cadence = HeartbeatCadence(5, 60)
+        intervals = [cadence.observe({"hp": "idle"}) for _ in range(6)]
+        assert intervals == [5, 10, 20, 40, 60, 60]
+
+    def test_change_queue_growth_and_jobs_reset_to_floor(self):
+        cadence = HeartbeatCadence(5, 60)
+        for _ in range(4):
+            cadence.observe({"hp": ("idle", 0)})
+        assert cadence.observe({"hp": ("idle", 1)}) == 5
+        assert cadence.observe({"hp": ("idle", 1)}) == 10
+        assert cadence.observe({"hp": ("idle", 1)}, active=True) == 5
+        cadence.observe({"hp": ("idle", 1)})
+        cadence.activity()
+        assert cadence.interval == 5
+        assert cadence.observe({"hp": ("idle", 1)}) == 5
+
+    def test_partial_state_is_no_change(self):
+        cadence = HeartbeatCadence(5, 60)
+        cadence.observe({"a": 1, "b": 1})
+        assert cadence.observe({"a": 1}) == 10
+        assert cadence.observe({"b": 1}) == 20
+
+    def test_floor_never_above_ceiling(self):
+        assert HeartbeatCadence(5, 2).observe({}) == 2
@@ -0,0 +1,276 @@
+"""Tests for the IPP client."""
+
+import http.server
+import os
+import socketserver
+import struct
+import tempfile
+import threading
+
+import pytest
+
+from printbot import ipp
+from printbot.ipp import IppClient, IppError, IppUnavailable, decode_response, encode_request
+
+
+def ipp_response(status: int, groups: list[tuple[int, list[tuple]]], request_id: int = 1) -> bytes:
+    out = bytearray(struct.pack(">BBHI", 1, 1, status, request_id))
+    for tag, attrs in groups:
+        out.append(tag)
+        for value_tag, name, value in attrs:
+            out += ipp._attr(value_tag, name, value)
+    out.append(ipp.END_OF_ATTRIBUTES)
+    return bytes(out)
+
+
+def ok_operation_group(message: str = "successful-ok") -> tuple[int, list[tuple]]:
+    return (ipp.OPERATION_GROUP, [
+        (ipp.TAG_CHARSET, "attributes-charset", "utf-8"),
+        (ipp.TAG_LANGUAGE, "attributes-natural-language", "en"),
+        (ipp.TAG_TEXT, "status-message", message),
+    ])
+
+
+class TestCodec:
+    def test_request_roundtrip(self):
+        data = encode_request(ipp.GET_JOBS, 7, [
+            (ipp.TAG_URI, "printer-uri", "ipp://localhost/printers/hp"),
+            (ipp.TAG_KEYWORD, "requested-attributes", ["job-id", "job-state"]),
+            (ipp.TAG_INTEGER, "limit", 5),
+            (ipp.TAG_BOOLEAN, "my-jobs", False),
+        ])
+        assert struct.unpack_from(">BBHI", data) == (1, 1, ipp.GET_JOBS, 7)
+        # Requests and responses share the wire format; the op id sits where
+        # a response keeps its status.
+        status, groups = decode_response(data)
+        assert status == ipp.GET_JOBS
+        assert groups == [(ipp.OPERATION_GROUP, {
+            "attributes-charset": "utf-8",
+            "attributes-natural-language": "en",
+            "printer-uri": "ipp://localhost/printers/hp",
+            "requested-attributes": ["job-id", "job-state"],
+            "limit": 5,
+            "my-jobs": False,
+        })]
+
+    def test_request_with_subscription_group(self):
+        data = encode_request(ipp.CREATE_PRINTER_SUBSCRIPTIONS, 1, [
+            (ipp.TAG_URI, "printer-uri", "ipp://localhost/"),
+        ], [
+            (ipp.TAG_KEYWORD, "notify-events", ["printer-state-changed", "printer-added"]),
+            (ipp.TAG_INTEGER, "notify-lease-duration", 3600),
+        ], ipp.SUBSCRIPTION_GROUP)
+        _status, groups = decode_response(data)
+        assert groups[1] == (ipp.SUBSCRIPTION_GROUP, {
+            "notify-events": ["printer-state-changed", "printer-added"],
+            "notify-lease-duration": 3600,
+        })
+
+    def test_decode_multiple_groups(self):
+        data = ipp_response(0, [
+            ok_operation_group(),
+            (ipp.JOB_GROUP, [(ipp.TAG_INTEGER, "job-id", 1), (ipp.TAG_ENUM, "job-state", 3)]),
+            (ipp.JOB_GROUP, [(ipp.TAG_INTEGER, "job-id", 2), (ipp.TAG_ENUM, "job-state", 5)]),
+        ])
+        status, groups = decode_response(data)
+        assert status == 0
+        assert [g[0] for g in groups] == [ipp.OPERATION_GROUP, ipp.JOB_GROUP, ipp.JOB_GROUP]
+        assert groups[2][1] == {"job-id": 2, "job-state": 5}
+
+    def test_decode_out_of_band_and_language_values(self):
+        text = b"en"
+        with_lang = struct.pack(">H", len(text)) + text + struct.pack(">H", 5) + b"hello"
+        data = bytearray(struct.pack(">BBHI", 1, 1, 0, 1))
+        data.append(ipp.PRINTER_GROUP)
+        data += struct.pack(">BH", 0x13, 4) + b"info" + struct.pack(">H", 0)  # no-value
+        data += struct.pack(">BH", 0x35, 3) + b"msg" + struct.pack(">H", len(with_lang)) + with_lang
+        data.append(ipp.END_OF_ATTRIBUTES)
+        _, groups = decode_response(bytes(data))
+        assert groups[0][1] == {"info": None, "msg": "hello"}
+
+    def test_decode_collection(self):
+        def raw(tag, name, value: bytes) -> bytes:
+            return struct.pack(">BH", tag, len(name)) + name + struct.pack(">H", len(value)) + value
+
+        data = bytearray(struct.pack(">BBHI", 1, 1, 0, 1))
+        data.append(ipp.PRINTER_GROUP)
+        data += raw(0x34, b"media-col", b"")
+        data += raw(0x4A, b"", b"media-type")
+        data += raw(ipp.TAG_KEYWORD, b"", b"stationery")
+        data += raw(0x4A, b"", b"media-size")
+        data += raw(0x34, b"", b"")
+        data += raw(0x4A, b"", b"x-dimension")
+        data += raw(ipp.TAG_INTEGER, b"", struct.pack(">i", 21000))
+        data += raw(0x37, b"", b"")
+        data += raw(0x37, b"", b"")
+        data.append(ipp.END_OF_ATTRIBUTES)
+        _, groups = decode_response(bytes(data))
+        assert groups[0][1] == {
+            "media-col": {"media-type": "stationery", "media-size": {"x-dimension": 21000}},
+        }
+
+    def test_truncated_response(self):
+        data = ipp_response(0, [ok_operation_group()])
+        with pytest.raises(ValueError):
+            decode_response(data[:-6])
+
+
+class _FakeCupsd(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _read_chunked(self) -> bytes:
+        body = bytearray()
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            if size == 0:
+                self.rfile.readline()
+                return bytes(body)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+
+    def do_POST(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = self._read_chunked()
+        else:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.path, dict(self.headers), body))
+        reply = self.server.replies.pop(0)
+        if isinstance(reply, int):
+            self.send_response(reply)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/ipp")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cupsd():
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "cups.sock")
+    server = _FakeCupsd(path, _Handler)
+    server.requests = []
+    server.replies = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    os.remove(path)
+    os.rmdir(tmp)
+
+
+class TestIppClient:
+    def test_request_over_socket_reuses_connection(self, cupsd):
+        cupsd.replies = [
+            ipp_response(0, [ok_operation_group(), (ipp.PRINTER_GROUP, [(ipp.TAG_ENUM, "printer-state", 3)])]),
+            ipp_response(0, [ok_operation_group()]),
+        ]
+        client = IppClient(socket_path=cupsd.server_address)
+        try:
+            groups = client.request(ipp.GET_PRINTER_ATTRIBUTES, [
+                (ipp.TAG_URI, "printer-uri", client.printer_uri("hp"))
+            ])
+            assert groups[1] == (ipp.PRINTER_GROUP, {"printer-state": 3})
+            conn = client._conn
+            client.request(ipp.RESUME_PRINTER, [], path="/admin/", admin=True)
+            assert client._conn is conn
+        finally:
+            client.close()
+
+        (path1, headers1, body1), (path2, headers2, _) = cupsd.requests
+        assert path1 == "/" and path2 == "/admin/"
+        assert "Authorization" not in headers1
+        assert headers2["Authorization"].startswith("PeerCred ")
+        _, groups = decode_response(body1)
+        op = groups[0][1]
+        assert op["requesting-user-name"]
+        assert op["printer-uri"] == "ipp://localhost/printers/hp"
+
+    def test_error_status_raises_ipp_error(self, cupsd):
+        cupsd.replies = [ipp_response(0x0406, [ok_operation_group("The printer or class does not exist.")])]
+        client = IppClient(socket_path=cupsd.server_address)
+        with pytest.raises(IppError) as exc:
+            client.request(ipp.GET_PRINTER_ATTRIBUTES, [])
+        assert exc.value.status == 0x0406
+        assert "does not exist" in str(exc.value)
+        client.close()
+
+    def test_forbidden_status_is_unavailable(self, cupsd):
+        cupsd.replies = [ipp_response(0x0403, [ok_operation_group("Forbidden")])]
+        client = IppClient(socket_path=cupsd.server_address)
+        with pytest.raises(IppUnavailable):
+            client.request(ipp.PAUSE_PRINTER, [], path="/admin/", admin=True)
+        client.close()
+
+    def test_http_401_is_unavailable(self, cupsd):
+        cupsd.replies = [401]
+        client = IppClient(socket_path=cupsd.server_address)
+        with pytest.raises(IppUnavailable):
+            client.request(ipp.PAUSE_PRINTER, [], path="/admin/", admin=True)
+        client.close()
+
+    def test_unreachable_is_unavailable(self, tmp_path):
+        # Socket path missing: falls back to TCP, which nothing listens on.
+        client = IppClient(socket_path=str(tmp_path / "missing.sock"), port=1, timeout=1)
+        assert not client.uses_socket
+        with pytest.raises(IppUnavailable):
+            client.request(ipp.CUPS_GET_PRINTERS, [])
+
+    def test_printer_uri_quotes_name(self):
+        client = IppClient(socket_path="")
+        assert client.printer_uri("HP Laser/1") == "ipp://localhost/printers/HP%20Laser%2F1"
+
+
+class TestSendDocument:
+    def test_streams_document_chunked(self, cupsd, tmp_path):
+        document = os.urandom(ipp.DOCUMENT_CHUNK * 3 + 17)
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(document)
+        cupsd.replies = [ipp_response(0, [
+            ok_operation_group(),
+            (ipp.JOB_GROUP, [(ipp.TAG_INTEGER, "job-id", 321), (ipp.TAG_ENUM, "job-state", 3)]),
+        ])]
+        client = IppClient(socket_path=cupsd.server_address)
+        groups = client.send_document(
+            ipp.PRINT_JOB,
+            [(ipp.TAG_URI, "printer-uri", client.printer_uri("hp")),
+             (ipp.TAG_MIME_TYPE, "document-format", "application/pdf")],
+            [(ipp.TAG_INTEGER, "copies", 2)],
+            str(path), path="/printers/hp", timeout=5,
+        )
+        assert groups[1] == (ipp.JOB_GROUP, {"job-id": 321, "job-state": 3})
+        # The shared status connection is left alone.
+        assert client._conn is None
+
+        req_path, headers, body = cupsd.requests[0]
+        assert req_path == "/printers/hp"
+        assert headers["Transfer-Encoding"] == "chunked"
+        assert body.endswith(document)
+        _, groups = decode_response(body[:-len(document)])
+        assert groups[1] == (ipp.JOB_GROUP, {"copies": 2})
+
+    def test_unreachable_is_unavailable(self, tmp_path):
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(b"%PDF")
+        client = IppClient(socket_path=str(tmp_path / "missing.sock"), port=1)
+        with pytest.raises(IppUnavailable):
+            client.send_document(ipp.PRINT_JOB, [], [], str(path), path="/", timeout=1)
+
+    def test_error_status(self, cupsd, tmp_path):
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(b"%PDF")
+        cupsd.replies = [ipp_response(0x0506, [ok_operation_group("Destination not accepting jobs.")])]
+        client = IppClient(socket_path=cupsd.server_address)
+        with pytest.raises(IppError, match="not accepting"):
+            client.send_document(ipp.PRINT_JOB, [], [], str(path), path="/", timeout=5)
@@ -1,12 +1,14 @@
 """Tests for job_handler module."""
 
 import base64
+import json
 import os
 import tempfile
 import unittest
 from unittest.mock import patch
 
-from printbot.job_handler import handle_print_job
+from printbot.job_handler import PreparedJob, handle_print_job, prepare_print_job, submit_print_job
+from printbot.messages import LazyPayload, decode_frame
 
 
 # Minimal valid PDF
@@ -81,6 +83,60 @@ class TestJobHandler(unittest.TestCase):
         self.assertEqual(result2["status"], "completed")
         self.assertEqual(mock_print.call_count, 1)  # Not called again
 
+    @patch("printbot.job_handler.print_pdf")
+    def test_prespooled_payload(self, mock_print):
+        # Binary-frame jobs arrive with spool_path instead of a base64 payload.
+        fd, spool_path = tempfile.mkstemp(prefix="printbot_", suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(MINIMAL_PDF)
+        job = self._make_job(job_id="spooled-001")
+        del job["payload"]
+        job["spool_path"] = spool_path
+
+        result = handle_print_job(job, self.printer_name, self.state_dir)
+
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual(mock_print.call_args.kwargs["pdf_path"], spool_path)
+
+    @patch("printbot.job_handler.print_pdf")
+    def test_prespooled_payload_removed_on_dedup(self, mock_print):
+        handle_print_job(self._make_job(job_id="spooled-dup"), self.printer_name, self.state_dir)
+        fd, spool_path = tempfile.mkstemp(prefix="printbot_", suffix=".pdf")
+        os.close(fd)
+        job = self._make_job(job_id="spooled-dup")
+        job["spool_path"] = spool_path
+
+        handle_print_job(job, self.printer_name, self.state_dir)
+
+        self.assertFalse(os.path.exists(spool_path))
+        self.assertEqual(mock_print.call_count, 1)
+
+    @patch("printbot.job_handler.print_pdf")
+    def test_inline_payload_piped_without_spool_file(self, mock_print):
+        handle_print_job(self._make_job(job_id="inline-001"), self.printer_name, self.state_dir)
+        kwargs = mock_print.call_args.kwargs
+        self.assertIsNone(kwargs["pdf_path"])
+        self.assertEqual(b"".join(kwargs["data"]), MINIMAL_PDF)
+        # Re-iterable, so a fallback submission sees the whole document again.
+        self.assertEqual(b"".join(kwargs["data"]), MINIMAL_PDF)
+
+    @patch("printbot.job_handler.print_pdf")
+    def test_lazy_payload_decoded_while_piped(self, mock_print):
+        # Large frames keep the base64 payload in the raw frame (LazyPayload).
+        document = MINIMAL_PDF + os.urandom(300_000)
+        job = self._make_job(job_id="lazy-001")
+        job["payload"] = base64.b64encode(document).decode()
+        job = decode_frame(json.dumps(job))
+        self.assertIsInstance(job["payload"], LazyPayload)
+
+        piped = []
+        mock_print.side_effect = lambda **kw: piped.append(list(kw["data"]))
+        result = handle_print_job(job, self.printer_name, self.state_dir)
+
+        self.assertEqual(result["status"], "completed")
+        self.assertGreater(len(piped[0]), 1)
+        self.assertEqual(b"".join(piped[0]), document)
+
     def test_unsupported_payload_type(self):
         job = self._make_job(payload_type="escpos")
         result = handle_print_job(job, self.printer_name, self.state_dir)
@@ -95,5 +151,49 @@ class TestJobHandler(unittest.TestCase):
         self.assertIn("CUPS error", result["error"])
 
 
+class TestStages(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp(prefix="printbot_test_")
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+    def _job(self, **metadata):
+        return {
+            "type": "print", "job_id": "stage-001", "payload_type": "pdf",
+            "payload": base64.b64encode(MINIMAL_PDF).decode(),
+            "metadata": {"title": "Stage", "copies": 2, **metadata},
+        }
+
+    @patch("printbot.job_handler.print_pdf", return_value=7)
+    @patch("printbot.job_handler.pdf_options", return_value={"media": "A4"})
+    def test_options_resolved_before_submit(self, mock_options, mock_print):
+        prepared = prepare_print_job(self._job(target_printer="laser"), "default", self.state_dir)
+
+        self.assertIsInstance(prepared, PreparedJob)
+        mock_options.assert_called_once_with("laser", None, False)
+        mock_print.assert_not_called()
+
+        result = submit_print_job(prepared)
+        self.assertEqual(result, {"status": "completed", "cups_job_id": 7})
+        kwargs = mock_print.call_args.kwargs
+        self.assertEqual(kwargs["printer_options"], {"media": "A4"})
+        self.assertTrue(kwargs["resolved"])
+        self.assertEqual(kwargs["copies"], 2)
+
+    @patch("printbot.job_handler.print_pdf", return_value=7)
+    def test_submit_does_not_record(self, _mock_print):
+        prepared = prepare_print_job(self._job(), "default", self.state_dir, dry_run=True)
+        submit_print_job(prepared)
+        # Not recorded yet, so the job is not a duplicate.
+        self.assertIsInstance(prepare_print_job(self._job(), "default", self.state_dir, dry_run=True), PreparedJob)
+
+    def test_invalid_job_finished_in_prepare(self):
+        job = self._job()
+        job["payload_type"] = "raw"
+        self.assertEqual(prepare_print_job(job, "", self.state_dir)["status"], "failed")
+
+
 if __name__ == "__main__":
     unittest.main()
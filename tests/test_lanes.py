@@ -0,0 +1,134 @@
+"""Tests for per-printer print lanes."""
+
+import asyncio
+
+from printbot.lanes import PrinterLanes
+from printbot.scheduler import JobScheduler
+
+
+class Stages:
+    """prepare/submit/record stages; a job's submit finishes once released."""
+
+    def __init__(self):
+        self.log: list[tuple[str, str]] = []
+        self.gates: dict[str, asyncio.Event] = {}
+
+    def release(self, job_id: str):
+        self.gates.setdefault(job_id, asyncio.Event()).set()
+
+    async def prepare(self, job: dict):
+        self.log.append(("prepare", job["job_id"]))
+        return None if job.get("skip") else job
+
+    async def submit(self, job: dict):
+        self.log.append(("submit", job["job_id"]))
+        await self.gates.setdefault(job["job_id"], asyncio.Event()).wait()
+        return "ok"
+
+    async def record(self, job: dict, result):
+        self.log.append(("record", job["job_id"]))
+
+    def lanes(self, **kwargs) -> PrinterLanes:
+        return PrinterLanes(self.prepare, self.submit, self.record, **kwargs)
+
+    def stage(self, name: str) -> list[str]:
+        return [job_id for stage, job_id in self.log if stage == name]
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class TestPrinterLanes:
+    async def test_jammed_printer_does_not_block_others(self):
+        stages = Stages()
+        lanes = stages.lanes()
+        lanes.submit("laser", {"job_id": "a1"})
+        lanes.submit("laser", {"job_id": "a2"})
+        lanes.submit("receipt", {"job_id": "b1"})
+        stages.release("b1")
+        await settle()
+        assert stages.stage("submit") == ["a1", "b1"]
+        assert stages.stage("record") == ["b1"]
+        assert lanes.depth("laser") == {"queued": 1, "active": 1}
+        assert lanes.depth("receipt") == {"queued": 0, "active": 0}
+        lanes.cancel_all()
+
+    async def test_next_job_prepared_while_current_submits(self):
+        stages = Stages()
+        lanes = stages.lanes()
+        for i in range(3):
+            lanes.submit("laser", {"job_id": f"j{i}"})
+        await settle()
+        # j1 is prepared and buffered, j2 prepared and waiting for room.
+        assert stages.stage("prepare") == ["j0", "j1", "j2"]
+        assert stages.stage("submit") == ["j0"]
+        assert lanes.depth("laser") == {"queued": 2, "active": 1}
+        for i in range(3):
+            stages.release(f"j{i}")
+        await settle()
+        assert stages.stage("submit") == ["j0", "j1", "j2"]
+        assert stages.stage("record") == ["j0", "j1", "j2"]
+        assert lanes.busy() == []
+        lanes.cancel_all()
+
+    async def test_concurrency_per_lane(self):
+        stages = Stages()
+        lanes = stages.lanes(concurrency=2)
+        for i in range(3):
+            lanes.submit("laser", {"job_id": f"j{i}"})
+        await settle()
+        assert stages.stage("submit") == ["j0", "j1"]
+        stages.release("j1")
+        await settle()
+        assert stages.stage("submit") == ["j0", "j1", "j2"]
+        assert lanes.depth("laser") == {"queued": 0, "active": 2}
+        lanes.cancel_all()
+
+    async def test_inbox_policy_orders_waiting_jobs(self):
+        stages = Stages()
+        lanes = stages.lanes(inbox=lambda: JobScheduler("priority"))
+        lanes.submit("kitchen", {"job_id": "report"})
+        await settle()
+        for job_id, priority in (("menu", 0), ("stock", 0), ("label", 0), ("ticket", 9)):
+            lanes.submit("kitchen", {"job_id": job_id, "metadata": {"priority": priority}})
+            await settle()
+        for job_id in ("report", "menu", "stock", "label", "ticket"):
+            stages.release(job_id)
+        await settle()
+        # menu and stock were already taken into preparation behind report.
+        assert stages.stage("submit") == ["report", "menu", "stock", "ticket", "label"]
+        lanes.cancel_all()
+
+    async def test_job_finished_in_prepare_skips_submit(self):
+        stages = Stages()
+        lanes = stages.lanes()
+        lanes.submit("laser", {"job_id": "dup", "skip": True})
+        await settle()
+        assert stages.log == [("prepare", "dup")]
+        lanes.cancel_all()
+
+    async def test_failing_stage_keeps_lane_running(self):
+        stages = Stages()
+
+        async def submit(job):
+            if job["job_id"] == "bad":
+                raise RuntimeError("boom")
+            return "ok"
+
+        lanes = PrinterLanes(stages.prepare, submit, stages.record)
+        lanes.submit("laser", {"job_id": "bad"})
+        lanes.submit("laser", {"job_id": "good"})
+        await settle()
+        assert stages.stage("record") == ["good"]
+        lanes.cancel_all()
+
+    async def test_busy_and_unknown_depth(self):
+        stages = Stages()
+        lanes = stages.lanes()
+        assert lanes.depth("nope") == {"queued": 0, "active": 0}
+        lanes.submit("zebra", {"job_id": "z"})
+        await settle()
+        assert lanes.busy() == ["zebra"]
+        lanes.cancel_all()
@@ -7,6 +7,13 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 
 from printbot.config import Settings
+from printbot.messages import (
+    AddPrinter,
+    CancelJob,
+    ClearQueue,
+    PrinterReasonRequest,
+    PrinterRequest,
+)
 from printbot.websocket_client import GatewayClient
 
 
@@ -38,7 +45,7 @@ class TestCupsListPrinters:
         mock_list.return_value = [
             {"name": "HP-Printer", "uri": "ipp://...", "state": "idle", "is_default": True}
         ]
-        await client._handle_cups_list_printers({"request_id": "req-1"})
+        await client._handle_cups_list_printers(PrinterRequest(request_id="req-1"))
 
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["type"] == "cups_response"
@@ -48,7 +55,7 @@ class TestCupsListPrinters:
 
     @patch("printbot.websocket_client.list_printers", side_effect=RuntimeError("lpstat failed"))
     async def test_failure(self, mock_list, client):
-        await client._handle_cups_list_printers({"request_id": "req-2"})
+        await client._handle_cups_list_printers(PrinterRequest(request_id="req-2"))
 
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is False
@@ -58,14 +65,14 @@ class TestCupsListPrinters:
 class TestCupsAddPrinter:
     @patch("printbot.websocket_client.add_printer")
     async def test_success(self, mock_add, client):
-        msg = {
-            "request_id": "req-add",
-            "printer_name": "new-printer",
-            "device_uri": "ipp://192.168.1.50:631",
-            "ppd": "",
-            "description": "Office Printer",
-            "location": "Floor 2",
-        }
+        msg = AddPrinter(
+            request_id="req-add",
+            printer_name="new-printer",
+            device_uri="ipp://192.168.1.50:631",
+            ppd="",
+            description="Office Printer",
+            location="Floor 2",
+        )
         await client._handle_cups_add_printer(msg)
 
         sent = json.loads(client._ws.send.call_args[0][0])
@@ -74,11 +81,11 @@ class TestCupsAddPrinter:
 
     @patch("printbot.websocket_client.add_printer", side_effect=RuntimeError("lpadmin error"))
     async def test_failure(self, mock_add, client):
-        msg = {
-            "request_id": "req-add-fail",
-            "printer_name": "bad-printer",
-            "device_uri": "ipp://bad",
-        }
+        msg = AddPrinter(
+            request_id="req-add-fail",
+            printer_name="bad-printer",
+            device_uri="ipp://bad",
+        )
         await client._handle_cups_add_printer(msg)
 
         sent = json.loads(client._ws.send.call_args[0][0])
@@ -89,10 +96,10 @@ class TestCupsAddPrinter:
 class TestCupsRemovePrinter:
     @patch("printbot.websocket_client.remove_printer")
     async def test_success(self, mock_remove, client):
-        await client._handle_cups_remove_printer({
-            "request_id": "req-rm",
-            "printer_name": "old-printer",
-        })
+        await client._handle_cups_remove_printer(PrinterRequest(
+            request_id="req-rm",
+            printer_name="old-printer",
+        ))
 
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
@@ -102,10 +109,10 @@ class TestCupsRemovePrinter:
 class TestCupsSetDefault:
     @patch("printbot.websocket_client.set_default_printer")
     async def test_success(self, mock_set, client):
-        await client._handle_cups_set_default({
-            "request_id": "req-default",
-            "printer_name": "main-printer",
-        })
+        await client._handle_cups_set_default(PrinterRequest(
+            request_id="req-default",
+            printer_name="main-printer",
+        ))
 
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
@@ -145,10 +152,10 @@ class TestCupsResumePrinter:
     @patch("printbot.websocket_client.accept_jobs")
     @patch("printbot.websocket_client.enable_printer")
     async def test_success(self, mock_enable, mock_accept, client):
-        await client._handle_cups_resume_printer({
-            "request_id": "req-resume",
-            "printer_name": "hp",
-        })
+        await client._handle_cups_resume_printer(PrinterRequest(
+            request_id="req-resume",
+            printer_name="hp",
+        ))
         mock_enable.assert_called_once_with("hp")
         mock_accept.assert_called_once_with("hp")
 
@@ -161,10 +168,10 @@ class TestCupsResumePrinter:
     @patch("printbot.websocket_client.accept_jobs")
     @patch("printbot.websocket_client.enable_printer", side_effect=RuntimeError("Not authorized"))
     async def test_enable_failure_short_circuits(self, mock_enable, mock_accept, client):
-        await client._handle_cups_resume_printer({
-            "request_id": "req-resume-fail",
-            "printer_name": "hp",
-        })
+        await client._handle_cups_resume_printer(PrinterRequest(
+            request_id="req-resume-fail",
+            printer_name="hp",
+        ))
         # accept_jobs must not run if enable failed.
         mock_accept.assert_not_called()
         sent = json.loads(client._ws.send.call_args[0][0])
@@ -175,18 +182,20 @@ class TestCupsResumePrinter:
 class TestCupsEnablePrinter:
     @patch("printbot.websocket_client.enable_printer")
     async def test_success(self, mock_enable, client):
-        await client._handle_cups_enable_printer({
-            "request_id": "req-en", "printer_name": "hp",
-        })
+        await client._handle_cups_enable_printer(PrinterRequest(
+            request_id="req-en",
+            printer_name="hp",
+        ))
         mock_enable.assert_called_once_with("hp")
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
 
     @patch("printbot.websocket_client.enable_printer", side_effect=RuntimeError("cupsd down"))
     async def test_failure(self, mock_enable, client):
-        await client._handle_cups_enable_printer({
-            "request_id": "req-en-fail", "printer_name": "hp",
-        })
+        await client._handle_cups_enable_printer(PrinterRequest(
+            request_id="req-en-fail",
+            printer_name="hp",
+        ))
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is False
         assert "cupsd down" in sent["error"]
@@ -195,28 +204,30 @@ class TestCupsEnablePrinter:
 class TestCupsDisablePrinter:
     @patch("printbot.websocket_client.disable_printer")
     async def test_success_with_reason(self, mock_disable, client):
-        await client._handle_cups_disable_printer({
-            "request_id": "req-dis",
-            "printer_name": "hp",
-            "reason": "maintenance",
-        })
+        await client._handle_cups_disable_printer(PrinterReasonRequest(
+            request_id="req-dis",
+            printer_name="hp",
+            reason="maintenance",
+        ))
         mock_disable.assert_called_once_with("hp", "maintenance")
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
 
     @patch("printbot.websocket_client.disable_printer")
     async def test_success_no_reason(self, mock_disable, client):
-        await client._handle_cups_disable_printer({
-            "request_id": "req-dis-nor", "printer_name": "hp",
-        })
+        await client._handle_cups_disable_printer(PrinterReasonRequest(
+            request_id="req-dis-nor",
+            printer_name="hp",
+        ))
         # Empty reason still passes through; printing.disable_printer skips -r when empty.
         mock_disable.assert_called_once_with("hp", "")
 
     @patch("printbot.websocket_client.disable_printer", side_effect=RuntimeError("not allowed"))
     async def test_failure(self, mock_disable, client):
-        await client._handle_cups_disable_printer({
-            "request_id": "req-dis-fail", "printer_name": "hp",
-        })
+        await client._handle_cups_disable_printer(PrinterReasonRequest(
+            request_id="req-dis-fail",
+            printer_name="hp",
+        ))
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is False
 
@@ -224,9 +235,10 @@ class TestCupsDisablePrinter:
 class TestCupsAcceptJobs:
     @patch("printbot.websocket_client.accept_jobs")
     async def test_success(self, mock_accept, client):
-        await client._handle_cups_accept_jobs({
-            "request_id": "req-acc", "printer_name": "hp",
-        })
+        await client._handle_cups_accept_jobs(PrinterRequest(
+            request_id="req-acc",
+            printer_name="hp",
+        ))
         mock_accept.assert_called_once_with("hp")
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
@@ -235,11 +247,11 @@ class TestCupsAcceptJobs:
 class TestCupsRejectJobs:
     @patch("printbot.websocket_client.reject_jobs")
     async def test_success_with_reason(self, mock_reject, client):
-        await client._handle_cups_reject_jobs({
-            "request_id": "req-rej",
-            "printer_name": "hp",
-            "reason": "paper out",
-        })
+        await client._handle_cups_reject_jobs(PrinterReasonRequest(
+            request_id="req-rej",
+            printer_name="hp",
+            reason="paper out",
+        ))
         mock_reject.assert_called_once_with("hp", "paper out")
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
@@ -258,9 +270,7 @@ class TestCupsListJobs:
                 "job-state": "pending",
             }
         ]
-        await client._handle_cups_list_jobs({
-            "request_id": "req-lj", "printer_name": "hp",
-        })
+        await client._handle_cups_list_jobs(PrinterRequest(request_id="req-lj", printer_name="hp"))
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
         assert sent["data"] == {"jobs": [
@@ -276,18 +286,20 @@ class TestCupsListJobs:
     @patch("printbot.websocket_client.list_jobs")
     async def test_empty_queue_returns_empty_list(self, mock_list, client):
         mock_list.return_value = []
-        await client._handle_cups_list_jobs({
-            "request_id": "req-lj-empty", "printer_name": "hp",
-        })
+        await client._handle_cups_list_jobs(PrinterRequest(
+            request_id="req-lj-empty",
+            printer_name="hp",
+        ))
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
         assert sent["data"] == {"jobs": []}
 
     @patch("printbot.websocket_client.list_jobs", side_effect=RuntimeError("no such printer"))
     async def test_failure(self, mock_list, client):
-        await client._handle_cups_list_jobs({
-            "request_id": "req-lj-fail", "printer_name": "ghost",
-        })
+        await client._handle_cups_list_jobs(PrinterRequest(
+            request_id="req-lj-fail",
+            printer_name="ghost",
+        ))
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is False
         assert "no such printer" in sent["error"]
@@ -296,26 +308,24 @@ class TestCupsListJobs:
 class TestCupsCancelJob:
     @patch("printbot.websocket_client.cancel_job")
     async def test_success_int_id(self, mock_cancel, client):
-        await client._handle_cups_cancel_job({
-            "request_id": "req-cnc", "job_id": 42,
-        })
+        await client._handle_cups_cancel_job(CancelJob(request_id="req-cnc", job_id=42))
         mock_cancel.assert_called_once_with(42, False)
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
 
     @patch("printbot.websocket_client.cancel_job")
     async def test_success_namespaced_id_with_purge(self, mock_cancel, client):
-        await client._handle_cups_cancel_job({
-            "request_id": "req-cnc-purge",
-            "job_id": "hp-42",
-            "purge": True,
-        })
+        await client._handle_cups_cancel_job(CancelJob(
+            request_id="req-cnc-purge",
+            job_id="hp-42",
+            purge=True,
+        ))
         mock_cancel.assert_called_once_with("hp-42", True)
 
     @patch("printbot.websocket_client.cancel_job")
     async def test_missing_job_id_fails(self, mock_cancel, client):
         # Idempotency rule: surfaces a clear error rather than silently no-op.
-        await client._handle_cups_cancel_job({"request_id": "req-cnc-noid"})
+        await client._handle_cups_cancel_job(CancelJob(request_id="req-cnc-noid"))
         mock_cancel.assert_not_called()
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is False
@@ -325,9 +335,7 @@ class TestCupsCancelJob:
     async def test_already_cancelled_returns_failure(self, mock_cancel, client):
         # Server-spec idempotency: cancel on already-canceled/completed job
         # surfaces "job not found" via success=False.
-        await client._handle_cups_cancel_job({
-            "request_id": "req-cnc-gone", "job_id": 999,
-        })
+        await client._handle_cups_cancel_job(CancelJob(request_id="req-cnc-gone", job_id=999))
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is False
         assert "job not found" in sent["error"]
@@ -336,18 +344,18 @@ class TestCupsCancelJob:
 class TestCupsClearQueue:
     @patch("printbot.websocket_client.clear_queue")
     async def test_success(self, mock_clear, client):
-        await client._handle_cups_clear_queue({
-            "request_id": "req-clr", "printer_name": "hp",
-        })
+        await client._handle_cups_clear_queue(ClearQueue(request_id="req-clr", printer_name="hp"))
         mock_clear.assert_called_once_with("hp", False)
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["success"] is True
 
     @patch("printbot.websocket_client.clear_queue")
     async def test_purge(self, mock_clear, client):
-        await client._handle_cups_clear_queue({
-            "request_id": "req-clr-p", "printer_name": "hp", "purge": True,
-        })
+        await client._handle_cups_clear_queue(ClearQueue(
+            request_id="req-clr-p",
+            printer_name="hp",
+            purge=True,
+        ))
         mock_clear.assert_called_once_with("hp", True)
 
 
@@ -376,6 +384,51 @@ class TestCupsControlDispatchInHandleMessage:
         mock_handler.assert_called_once()
 
 
+class TestDispatchTable:
+    @patch("printbot.websocket_client.list_printers", return_value=[])
+    async def test_cups_request_decoded_and_detached(self, mock_list, client):
+        await client._handle_message({"type": "cups_list_printers", "request_id": "r1"})
+        mock_list.assert_not_called()  # runs as a background task
+        await asyncio.sleep(0.05)
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent["request_id"] == "r1"
+        assert sent["data"] == []
+
+    async def test_busy_response_when_control_queue_full(self, client):
+        client._control._max_pending = 0
+        await client._handle_message({"type": "cups_add_printer", "request_id": "r9"})
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent == {"type": "cups_response", "request_id": "r9", "success": False,
+                        "data": None, "error": "Gateway busy, retry later", "busy": True}
+        assert client._control.snapshot()["rejected_by_type"] == {"cups_add_printer": 1}
+
+    async def test_discovery_busy_uses_its_own_response_type(self, client):
+        client._control._max_pending = 0
+        await client._handle_message({"type": "discover_devices", "request_id": "d1"})
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent["type"] == "discover_devices_response"
+        assert sent["busy"] is True
+
+    @patch("printbot.websocket_client.add_printer")
+    async def test_mutations_run_one_at_a_time(self, mock_add, client):
+        loop = asyncio.get_running_loop()
+        gate = asyncio.Event()
+        mock_add.side_effect = lambda **kw: asyncio.run_coroutine_threadsafe(
+            gate.wait(), loop).result()
+        for i in range(3):
+            await client._handle_message({"type": "cups_add_printer", "request_id": str(i)})
+        await asyncio.sleep(0.05)
+        assert mock_add.call_count == 1
+        assert client._control.snapshot()["waiting"] == 2
+        gate.set()
+        await asyncio.sleep(0.1)
+        assert mock_add.call_count == 3
+
+    async def test_unknown_type_ignored(self, client):
+        await client._handle_message({"type": "no_such_thing"})
+        client._ws.send.assert_not_called()
+
+
 class TestOtaStatusProgression:
     @patch("printbot.websocket_client.request_restart")
     @patch("printbot.websocket_client.perform_ota_update")
@@ -0,0 +1,93 @@
+"""Tests for the wire codec and typed control messages."""
+
+import base64
+import json
+import os
+
+import pytest
+
+from printbot import messages
+from printbot.messages import (
+    CancelJob,
+    Features,
+    LazyPayload,
+    PrinterReasonRequest,
+    decode,
+    decode_frame,
+)
+
+
+def _print_frame(data: bytes, **extra) -> str:
+    job = {"type": "print", "job_id": "j1", "payload_type": "pdf",
+           "payload": base64.b64encode(data).decode(), "metadata": {"copies": 1}}
+    job.update(extra)
+    return json.dumps(job)
+
+
+class TestCodec:
+    def test_dumps_returns_text(self):
+        frame = messages.dumps({"type": "pong", "n": 1})
+        assert isinstance(frame, str)
+        assert json.loads(frame) == {"type": "pong", "n": 1}
+
+    def test_invalid_json_raises_decode_error(self):
+        with pytest.raises(messages.DecodeError):
+            decode_frame("{not json")
+
+
+class TestLazyPayload:
+    def test_small_frame_parsed_normally(self):
+        msg = decode_frame(_print_frame(b"%PDF small"))
+        assert msg["payload"] == base64.b64encode(b"%PDF small").decode()
+
+    @pytest.mark.parametrize("as_bytes", [False, True])
+    def test_large_payload_left_in_frame(self, as_bytes):
+        data = os.urandom(200_000)
+        raw = _print_frame(data)
+        msg = decode_frame(raw.encode() if as_bytes else raw)
+
+        assert isinstance(msg["payload"], LazyPayload)
+        assert msg["metadata"] == {"copies": 1}
+        assert msg["payload_type"] == "pdf"
+        assert b"".join(msg["payload"].iter_decoded(window=4096)) == data
+
+    def test_nested_payload_key_not_mistaken(self):
+        data = os.urandom(100_000)
+        raw = json.dumps({"type": "print", "metadata": {"payload": "x"},
+                          "payload": base64.b64encode(data).decode()})
+        msg = decode_frame(raw)
+        assert msg["metadata"] == {"payload": "x"}
+        assert base64.b64decode(msg["payload"]) == data
+
+    def test_escaped_payload_falls_back_to_parser(self):
+        b64 = base64.b64encode(os.urandom(100_000)).decode()
+        raw = '{"type": "print", "payload": "%s"}' % b64.replace("/", "\\/")
+        assert decode_frame(raw)["payload"] == b64
+
+    @pytest.mark.parametrize("size", [99_999, 100_000, 100_001])
+    def test_decoded_size_counts_padding(self, size):
+        msg = decode_frame(_print_frame(os.urandom(size)))
+        assert msg["payload"].decoded_size() == size
+
+    def test_invalid_base64_raises_value_error(self):
+        payload = LazyPayload("AAAAA", 0, 5)  # truncated quantum
+        with pytest.raises(ValueError):
+            b"".join(payload.iter_decoded())
+
+
+class TestDecode:
+    def test_defaults_for_missing_and_null_fields(self):
+        msg = decode({"type": "cups_disable_printer", "request_id": "r", "reason": None})
+        assert msg == PrinterReasonRequest(request_id="r", printer_name="", reason="")
+
+    def test_bool_fields_coerced(self):
+        assert decode({"type": "cups_cancel_job", "job_id": 4, "purge": 1}) == CancelJob(
+            job_id=4, purge=True,
+        )
+
+    def test_unknown_fields_ignored(self):
+        assert decode({"type": "hello_ack", "features": ["a"], "extra": 1}) == Features(["a"])
+
+    def test_print_family_stays_dict(self):
+        msg = {"type": "print_chunk", "job_id": "j1", "seq": 0, "data": ""}
+        assert decode(msg) is msg
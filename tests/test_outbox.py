@@ -0,0 +1,40 @@
+"""Tests for the durable status outbox."""
+
+import pytest
+
+from printbot import outbox as outbox_mod
+from printbot.outbox import Outbox
+
+
+@pytest.fixture
+def box(tmp_path):
+    return Outbox(str(tmp_path))
+
+
+def test_peek_returns_oldest_first(box):
+    box.put({"type": "job_status", "job_id": "a", "status": "received"})
+    box.extend([
+        {"type": "job_status", "job_id": "a", "status": "completed"},
+        {"type": "ota_status", "status": "downloading"},
+    ])
+    rows = box.peek(limit=2)
+    assert [m["status"] for _, m in rows] == ["received", "completed"]
+    assert box.count() == 3
+
+
+def test_ack_removes_rows(box):
+    box.extend([{"type": "job_status", "job_id": str(i)} for i in range(3)])
+    rows = box.peek()
+    box.ack([row_id for row_id, _ in rows[:2]])
+    assert [m["job_id"] for _, m in box.peek()] == ["2"]
+
+
+def test_survives_restart(tmp_path):
+    Outbox(str(tmp_path)).put({"type": "job_status", "job_id": "x"})
+    assert Outbox(str(tmp_path)).peek()[0][1] == {"type": "job_status", "job_id": "x"}
+
+
+def test_oldest_dropped_beyond_max_rows(box, monkeypatch):
+    monkeypatch.setattr(outbox_mod, "MAX_ROWS", 3)
+    box.extend([{"type": "job_status", "job_id": str(i)} for i in range(5)])
+    assert [m["job_id"] for _, m in box.peek()] == ["2", "3", "4"]
@@ -2,9 +2,12 @@
 
 import os
 import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 
+from printbot.cups_backend import BackendUnavailable, CupsBackend
 from printbot.printing import (
     accept_jobs,
     cancel_job,
@@ -12,11 +15,16 @@ from printbot.printing import (
     disable_printer,
     enable_printer,
     get_printer_detail,
+    get_printer_options,
     get_printer_status,
     list_jobs,
+    pdf_options,
     print_pdf,
     print_raw,
+    printer_snapshot,
     reject_jobs,
+    set_backend,
+    single_flight_stats,
     _extract_reasons,
     _parse_lp_request_id,
     _parse_state_line,
@@ -52,8 +60,10 @@ class TestPrintPdf(unittest.TestCase):
         print_pdf("test-printer", "Test Job", self.pdf_path, cleanup=False, copies=3, duplex=True)
 
         cmd = mock_run.call_args[0][0]
-        self.assertIn("-n 3", cmd)
+        self.assertEqual(cmd[cmd.index("-n") + 1], "3")
         self.assertIn("sides=two-sided-long-edge", cmd)
+        self.assertEqual(cmd[-1], self.pdf_path)
+        self.assertNotIn("shell", mock_run.call_args.kwargs)
 
     @patch("printbot.printing.subprocess.run")
     def test_print_without_duplex(self, mock_run):
@@ -61,7 +71,28 @@ class TestPrintPdf(unittest.TestCase):
         print_pdf("test-printer", "Test Job", self.pdf_path, cleanup=False, copies=1, duplex=False)
 
         cmd = mock_run.call_args[0][0]
-        self.assertNotIn("two-sided", cmd)
+        self.assertNotIn("two-sided", " ".join(cmd))
+
+    @patch("printbot.printing.get_printer_defaults")
+    @patch("printbot.printing.subprocess.run")
+    def test_resolved_options_skip_lpoptions(self, mock_run, mock_defaults):
+        mock_run.return_value = MagicMock(returncode=0, stdout="request id is test-1")
+        print_pdf("test-printer", "Test Job", self.pdf_path, cleanup=False,
+                  printer_options={"media": "Letter"}, resolved=True)
+
+        mock_defaults.assert_not_called()
+        cmd = mock_run.call_args[0][0]
+        self.assertIn("media=Letter", cmd)
+        self.assertNotIn("orientation-requested=3", cmd)
+
+    @patch("printbot.printing.get_printer_defaults", return_value={"media": "Letter", "InputSlot": "Tray2"})
+    def test_pdf_options_merge_order(self, _defaults):
+        self.assertEqual(pdf_options("test-printer", {"media": "A5"}, duplex=True), {
+            "media": "A5",
+            "InputSlot": "Tray2",
+            "orientation-requested": "3",
+            "sides": "two-sided-long-edge",
+        })
 
 
 class TestGetPrinterStatus(unittest.TestCase):
@@ -392,6 +423,64 @@ class TestListJobs(unittest.TestCase):
         self.assertEqual(jobs[0]["job-id"], 42)
 
 
+class TestPrinterSnapshot(unittest.TestCase):
+    """Every queue from four lpstat calls."""
+
+    OUTPUT = {
+        ("-p", "-v", "-d"): (
+            "printer hp is idle.  enabled since Mon Apr 24 10:00:00 2026\n"
+            "printer my-zebra disabled since Mon Apr 24 10:00:00 2026 -\n"
+            "device for hp: usb://HP/1\n"
+            "device for my-zebra: socket://10.0.0.5\n"
+            "system default destination: hp\n"
+        ),
+        ("-l", "-p"): (
+            "printer hp is idle.  enabled since Mon Apr 24 10:00:00 2026\n"
+            "\tDescription: HP\n"
+            "\tAlerts: none\n"
+            "printer my-zebra disabled since Mon Apr 24 10:00:00 2026 -\n"
+            "\tcover-open\n"
+            "\tDescription: Zebra\n"
+        ),
+        ("-a",): (
+            "hp accepting requests since Mon Apr 24 10:00:00 2026\n"
+            "my-zebra not accepting requests since Mon Apr 24 10:00:00 2026 -\n"
+            "\tmaintenance\n"
+        ),
+        ("-l", "-W", "not-completed", "-o"): (
+            "my-zebra-7            alice          12      Mon Jan  6 10:00:00 2020\n"
+            "        queued for my-zebra\n"
+            "my-zebra-8            bob            3       Mon Jan  6 10:01:00 2020\n"
+        ),
+    }
+
+    def _run(self, argv, **kwargs):
+        return MagicMock(returncode=0, stdout=self.OUTPUT[tuple(argv[1:])], stderr="")
+
+    @patch("printbot.printing.subprocess.run")
+    def test_all_queues_in_four_calls(self, mock_run):
+        mock_run.side_effect = self._run
+        hp, zebra = printer_snapshot()
+        self.assertEqual(mock_run.call_count, 4)
+
+        self.assertEqual(hp["name"], "hp")
+        self.assertEqual(hp["state"], "idle")
+        self.assertEqual(hp["state_reasons"], [])
+        self.assertTrue(hp["accepting_jobs"])
+        self.assertTrue(hp["is_default"])
+        self.assertEqual(hp["jobs"], [])
+
+        self.assertEqual(zebra["uri"], "socket://10.0.0.5")
+        self.assertEqual(zebra["state"], "stopped")
+        self.assertEqual(zebra["state_reasons"], ["cover-open"])
+        self.assertFalse(zebra["accepting_jobs"])
+        self.assertEqual([j["job-id"] for j in zebra["jobs"]], [7, 8])
+
+    @patch("printbot.printing.subprocess.run", side_effect=Exception("no lpstat"))
+    def test_lpstat_failure_returns_empty(self, _mock_run):
+        self.assertEqual(printer_snapshot(), [])
+
+
 class TestParseLpRequestId(unittest.TestCase):
     """Parse the CUPS job-id out of `lp` stdout (print-verification fase 0)."""
 
@@ -492,3 +581,274 @@ class TestPrintRawReturnsCupsJobId(unittest.TestCase):
 
 if __name__ == "__main__":
     unittest.main()
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Concurrent identical read-only queries share one subprocess."""
+
+    LPSTAT_OUT = "hp-42                 alice          12345   Mon Jan  6 10:00:00 2020\n"
+
+    def _run_concurrently(self, fn, args_list, release):
+        results, errors = [None] * len(args_list), []
+
+        def call(i, args):
+            try:
+                results[i] = fn(*args)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call, args=(i, a)) for i, a in enumerate(args_list)]
+        threads[0].start()
+        # Let the leader enter subprocess.run before the followers arrive.
+        self.assertTrue(release["entered"].wait(2))
+        for t in threads[1:]:
+            t.start()
+        time.sleep(0.1)  # followers reach the in-flight call
+        release["go"].set()
+        for t in threads:
+            t.join(2)
+        return results, errors
+
+    def _slow_run(self, returncode=0, stdout=LPSTAT_OUT, exc=None):
+        release = {"entered": threading.Event(), "go": threading.Event()}
+
+        def run(*args, **kwargs):
+            release["entered"].set()
+            release["go"].wait(2)
+            if exc is not None:
+                raise exc
+            return MagicMock(returncode=returncode, stdout=stdout, stderr="")
+
+        return run, release
+
+    @patch("printbot.printing.subprocess.run")
+    def test_identical_calls_share_one_subprocess(self, mock_run):
+        run, release = self._slow_run()
+        mock_run.side_effect = run
+        before = single_flight_stats()["list_jobs"]
+
+        results, errors = self._run_concurrently(list_jobs, [("hp",)] * 4, release)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertTrue(all(r == results[0] for r in results))
+        # Every caller owns its result.
+        self.assertEqual(len({id(r) for r in results}), 4)
+        after = single_flight_stats()["list_jobs"]
+        self.assertEqual(after["calls"] - before["calls"], 1)
+        self.assertEqual(after["shared"] - before["shared"], 3)
+
+    @patch("printbot.printing.subprocess.run")
+    def test_different_arguments_not_coalesced(self, mock_run):
+        run, release = self._slow_run()
+        mock_run.side_effect = run
+        self._run_concurrently(list_jobs, [("hp",), ("brother",)], release)
+        self.assertEqual(mock_run.call_count, 2)
+
+    @patch("printbot.printing.subprocess.run")
+    def test_error_fans_out(self, mock_run):
+        run, release = self._slow_run(returncode=1, stdout="")
+        mock_run.side_effect = run
+        results, errors = self._run_concurrently(
+            get_printer_options, [("hp",)] * 3, release,
+        )
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertEqual(len(errors), 3)
+
+    @patch("printbot.printing.subprocess.run")
+    def test_sequential_calls_not_cached(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0, stdout="", stderr="")
+        list_jobs("hp")
+        list_jobs("hp")
+        self.assertEqual(mock_run.call_count, 2)
+
+
+class _StubBackend(CupsBackend):
+    name = "stub"
+
+    def __init__(self):
+        self.calls = []
+
+    def list_jobs(self, printer_name):
+        self.calls.append(("list_jobs", printer_name))
+        return [{"job-id": 7, "job-state": "processing"}]
+
+    def enable_printer(self, printer_name):
+        raise BackendUnavailable("socket gone")
+
+    def print_file(self, printer_name, title, file_path, document_format, options=None, timeout=30):
+        self.calls.append(("print_file", printer_name, document_format, options, timeout))
+        if printer_name == "offline":
+            raise BackendUnavailable("socket gone")
+        if printer_name == "broken":
+            raise RuntimeError("Failed to submit print job to CUPS: Destination not accepting jobs.")
+        return 99
+
+
+class TestBackendRouting(unittest.TestCase):
+    def setUp(self):
+        self.backend = _StubBackend()
+        set_backend(self.backend)
+
+    def tearDown(self):
+        set_backend(None)
+
+    @patch("printbot.printing.subprocess.run")
+    def test_backend_serves_call(self, mock_run):
+        self.assertEqual(list_jobs("hp"), [{"job-id": 7, "job-state": "processing"}])
+        self.assertEqual(self.backend.calls, [("list_jobs", "hp")])
+        mock_run.assert_not_called()
+
+    @patch("printbot.printing.subprocess.run")
+    def test_unavailable_falls_back_to_cli(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0, stdout="", stderr="")
+        enable_printer("hp")
+        self.assertEqual(mock_run.call_args[0][0], ["cupsenable", "hp"])
+
+    @patch("printbot.printing.subprocess.run")
+    def test_unimplemented_method_falls_back_to_cli(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0, stdout="", stderr="")
+        accept_jobs("hp")
+        self.assertEqual(mock_run.call_args[0][0], ["cupsaccept", "hp"])
+
+
+class TestBackendSubmission(unittest.TestCase):
+    def setUp(self):
+        self.backend = _StubBackend()
+        set_backend(self.backend)
+        fd, self.path = tempfile.mkstemp(prefix="test_", suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"%PDF-1.0 test content")
+
+    def tearDown(self):
+        set_backend(None)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    @patch("printbot.printing.get_printer_defaults", return_value={"media": "Letter"})
+    @patch("printbot.printing.subprocess.run")
+    def test_pdf_submitted_via_backend(self, mock_run, _defaults):
+        result = print_pdf("hp", "Title", self.path, cleanup=True, copies=2, duplex=True)
+        self.assertEqual(result, 99)
+        mock_run.assert_not_called()
+        self.assertFalse(os.path.exists(self.path))
+        _, printer, fmt, options, timeout = self.backend.calls[0]
+        self.assertEqual((printer, fmt), ("hp", "application/pdf"))
+        self.assertEqual(options, {
+            "media": "Letter", "orientation-requested": "3",
+            "sides": "two-sided-long-edge", "copies": 2,
+        })
+        self.assertGreaterEqual(timeout, 30)
+
+    @patch("printbot.printing.subprocess.run")
+    def test_raw_submitted_via_backend(self, mock_run):
+        self.assertEqual(print_raw("label", "Title", self.path, cleanup=False), 99)
+        mock_run.assert_not_called()
+        self.assertEqual(self.backend.calls[0][2], "application/vnd.cups-raw")
+
+    @patch("printbot.printing.subprocess.run")
+    def test_unavailable_falls_back_to_lp(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0, stdout="request id is offline-12 (1 file(s))\n", stderr="")
+        self.assertEqual(print_raw("offline", "Title", self.path, cleanup=False), 12)
+        self.assertEqual(mock_run.call_args[0][0][:3], ["lp", "-o", "raw"])
+
+    @patch("printbot.printing.subprocess.run")
+    def test_backend_error_not_retried_with_lp(self, mock_run):
+        with self.assertRaises(RuntimeError):
+            print_raw("broken", "Title", self.path, cleanup=True)
+        mock_run.assert_not_called()
+        self.assertFalse(os.path.exists(self.path))
+
+    @patch("printbot.printing.SUBMIT_TIMEOUT_PER_MB", 10.0)
+    def test_timeout_grows_with_size(self):
+        with open(self.path, "wb") as f:
+            f.truncate(20 * 1024 * 1024)
+        print_raw("label", "Title", self.path, cleanup=False)
+        self.assertEqual(self.backend.calls[0][4], 30 + 200)
+
+
+FAKE_LP = """#!{python}
+import json, os, sys, time
+data = b"" if os.path.isfile(sys.argv[-1]) else sys.stdin.buffer.read()
+with open(os.environ["FAKE_LP_OUT"], "w") as f:
+    json.dump({{"argv": sys.argv[1:], "stdin": len(data), "head": data[:8].decode("latin-1")}}, f)
+if os.environ.get("FAKE_LP_SLEEP"):
+    time.sleep(float(os.environ["FAKE_LP_SLEEP"]))
+if os.environ.get("FAKE_LP_FAIL"):
+    sys.stderr.write("lp: The printer or class does not exist.\\n")
+    sys.exit(1)
+print("request id is q-7 (1 file(s))")
+"""
+
+
+class TestLpStdinPipe(unittest.TestCase):
+    """print_pdf/print_raw with ``data`` run a real (fake) lp and feed its stdin."""
+
+    def setUp(self):
+        import json
+        import sys
+
+        self._json = json
+        self.tmp = tempfile.mkdtemp(prefix="printbot_lp_")
+        lp = os.path.join(self.tmp, "lp")
+        with open(lp, "w") as f:
+            f.write(FAKE_LP.format(python=sys.executable))
+        os.chmod(lp, 0o755)
+        self.out = os.path.join(self.tmp, "out.json")
+        env = {"PATH": self.tmp + os.pathsep + os.environ.get("PATH", ""), "FAKE_LP_OUT": self.out}
+        self.env = patch.dict(os.environ, env)
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        import shutil
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _seen(self):
+        with open(self.out) as f:
+            return self._json.load(f)
+
+    class _Data:
+        def __init__(self, chunks):
+            self.chunks = chunks
+
+        def __len__(self):
+            return sum(len(c) for c in self.chunks)
+
+        def __iter__(self):
+            return iter(self.chunks)
+
+    def test_raw_payload_piped_to_stdin(self):
+        data = self._Data([b"\x1b@", b"receipt " * 512, b"\x1dV\x00"])
+        job_id = print_raw("label", "Receipt", None, cleanup=True, data=data)
+        self.assertEqual(job_id, 7)
+        seen = self._seen()
+        self.assertEqual(seen["argv"], ["-o", "raw", "-d", "label", "-t", "Receipt"])
+        self.assertEqual(seen["stdin"], len(data))
+
+    @patch("printbot.printing.get_printer_defaults", return_value={})
+    def test_pdf_title_with_shell_metacharacters(self, _defaults):
+        title = "Factuur $(rm -rf ~); 'quoted' & more"
+        data = self._Data([b"%PDF-1.4\n", os.urandom(100_000)])
+        self.assertEqual(print_pdf("hp", title, None, copies=2, data=data), 7)
+        seen = self._seen()
+        self.assertEqual(seen["argv"][seen["argv"].index("-t") + 1], title)
+        self.assertEqual(seen["head"], "%PDF-1.4")
+        self.assertEqual(seen["stdin"], len(data))
+
+    def test_lp_failure_raises_with_stderr(self):
+        with patch.dict(os.environ, {"FAKE_LP_FAIL": "1"}):
+            with self.assertRaises(RuntimeError) as ctx:
+                print_raw("nope", "t", None, data=self._Data([b"x"]))
+        self.assertIn("does not exist", str(ctx.exception))
+
+    @patch("printbot.printing.SUBMIT_TIMEOUT_BASE", 0.3)
+    def test_timeout_kills_lp(self):
+        with patch.dict(os.environ, {"FAKE_LP_SLEEP": "5"}):
+            start = time.monotonic()
+            with self.assertRaises(RuntimeError) as ctx:
+                print_raw("label", "t", None, data=self._Data([b"x"]))
+        self.assertIn("timed out", str(ctx.exception))
+        self.assertLess(time.monotonic() - start, 3)
@@ -0,0 +1,108 @@
+"""Tests for the lane job scheduler."""
+
+import pytest
+
+from printbot.scheduler import JobScheduler, WaitStats, job_size
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def job(job_id, priority=None, size=None, source=None):
+    metadata = {}
+    if priority is not None:
+        metadata["priority"] = priority
+    if source is not None:
+        metadata["source"] = source
+    msg = {"job_id": job_id, "metadata": metadata}
+    if size is not None:
+        msg["payload_size"] = size
+    return msg
+
+
+def drain(queue: JobScheduler) -> list[str]:
+    return [queue.get_nowait()["job_id"] for _ in range(queue.qsize())]
+
+
+class TestPolicies:
+    def test_fifo(self):
+        q = JobScheduler("fifo")
+        for j in (job("a", priority=1), job("b", priority=9), job("c")):
+            q.put_nowait(j)
+        assert drain(q) == ["a", "b", "c"]
+
+    def test_priority_then_arrival(self):
+        q = JobScheduler("priority")
+        for j in (job("report"), job("ticket", priority=5), job("note"), job("bad", priority="x")):
+            q.put_nowait(j)
+        assert drain(q) == ["ticket", "report", "note", "bad"]
+
+    def test_priority_aging_prevents_starvation(self):
+        clock = Clock()
+        q = JobScheduler("priority", aging=10, clock=clock)
+        q.put_nowait(job("old", priority=0))
+        clock.now += 25  # 2.5 levels of aging
+        q.put_nowait(job("new", priority=2))
+        assert drain(q) == ["old", "new"]
+
+    def test_sjf(self):
+        q = JobScheduler("sjf")
+        q.put_nowait(job("report", size=20_000_000))
+        q.put_nowait(job("unknown"))
+        q.put_nowait(job("ticket", size=900))
+        q.put_nowait({"job_id": "inline", "payload": "QUJD" * 100})
+        assert drain(q) == ["inline", "ticket", "unknown", "report"]
+
+    def test_fair_round_robin_between_sources(self):
+        q = JobScheduler("fair")
+        for i in range(3):
+            q.put_nowait(job(f"shop{i}", source="shop"))
+        q.put_nowait(job("kitchen0", source="kitchen"))
+        q.put_nowait(job("kitchen1", source="kitchen"))
+        assert drain(q) == ["shop0", "kitchen0", "shop1", "kitchen1", "shop2"]
+
+    def test_fair_idle_source_does_not_bank_turns(self):
+        q = JobScheduler("fair")
+        for i in range(4):
+            q.put_nowait(job(f"a{i}", source="a"))
+        assert [q.get_nowait()["job_id"] for _ in range(2)] == ["a0", "a1"]
+        # b was idle while a had two turns; it alternates with a from here
+        # rather than getting its missed turns in a row.
+        q.put_nowait(job("a4", source="a"))
+        for i in range(3):
+            q.put_nowait(job(f"b{i}", source="b"))
+        q.put_nowait(job("a5", source="a"))
+        assert drain(q) == ["a2", "b0", "a3", "b1", "a4", "b2", "a5"]
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError, match="Unknown scheduler policy"):
+            JobScheduler("lifo")
+
+
+class TestWaitStats:
+    def test_wait_recorded_per_priority(self):
+        clock = Clock()
+        stats = WaitStats()
+        q = JobScheduler("priority", stats=stats, clock=clock)
+        q.put_nowait(job("low"))
+        q.put_nowait(job("high", priority=3))
+        clock.now += 0.5
+        q.get_nowait()
+        clock.now += 1.5
+        q.get_nowait()
+        assert stats.snapshot() == {
+            "0": {"count": 1, "avg_ms": 2000, "max_ms": 2000},
+            "3": {"count": 1, "avg_ms": 500, "max_ms": 500},
+        }
+
+
+def test_job_size_from_spool_file(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"x" * 1234)
+    assert job_size({"spool_path": str(path)}) == 1234
+    assert job_size({"spool_path": str(tmp_path / "gone")}) == 1024 * 1024
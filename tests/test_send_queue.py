@@ -0,0 +1,153 @@
+"""Tests for the prioritised outbound send queue."""
+
+import asyncio
+import json
+
+from printbot.send_queue import JobStatusBatcher, Lane, SendQueue, lane_for
+
+
+def _types(frames):
+    return [json.loads(f)["type"] for f in frames]
+
+
+async def _drain(q: SendQueue) -> list[str]:
+    frames = []
+    while q.qsize():
+        _, frame = await q.get()
+        frames.append(frame)
+    return frames
+
+
+class TestLaneFor:
+    def test_known_types(self):
+        assert lane_for({"type": "job_status"}) is Lane.JOB_STATUS
+        assert lane_for({"type": "heartbeat"}) is Lane.HEARTBEAT
+        assert lane_for({"type": "discover_devices_status"}) is Lane.DISCOVERY_STATUS
+
+    def test_responses_default_to_cups_lane(self):
+        assert lane_for({"type": "cups_response"}) is Lane.CUPS
+        assert lane_for({"type": "config_response"}) is Lane.CUPS
+
+
+class TestSendQueue:
+    async def test_priority_order(self):
+        q = SendQueue()
+        q.put({"type": "discover_devices_status"})
+        q.put({"type": "heartbeat"})
+        q.put({"type": "cups_response", "request_id": "1"})
+        q.put({"type": "job_status", "status": "completed"})
+        assert _types(await _drain(q)) == [
+            "job_status", "cups_response", "heartbeat", "discover_devices_status",
+        ]
+
+    async def test_fifo_within_lane(self):
+        q = SendQueue()
+        for i in range(3):
+            q.put({"type": "cups_response", "request_id": str(i)})
+        assert [json.loads(f)["request_id"] for f in await _drain(q)] == ["0", "1", "2"]
+
+    async def test_heartbeat_drop_oldest(self):
+        q = SendQueue(heartbeat_depth=1)
+        q.put({"type": "heartbeat", "uptime": 1})
+        q.put({"type": "heartbeat", "uptime": 2})
+        frames = await _drain(q)
+        assert [json.loads(f)["uptime"] for f in frames] == [2]
+        assert q.snapshot()["heartbeat"]["dropped"] == 1
+
+    async def test_starving_lane_served_first(self):
+        q = SendQueue(starvation_after=0.0)
+        q.put({"type": "discover_devices_status"})
+        await asyncio.sleep(0.01)
+        q.put({"type": "job_status"})
+        assert _types(await _drain(q)) == ["discover_devices_status", "job_status"]
+
+    async def test_get_waits_for_put(self):
+        q = SendQueue()
+        getter = asyncio.create_task(q.get())
+        await asyncio.sleep(0.01)
+        assert not getter.done()
+        q.put({"type": "pong"})
+        lane, frame = await asyncio.wait_for(getter, 1)
+        assert lane is Lane.JOB_STATUS
+        assert json.loads(frame) == {"type": "pong"}
+
+    async def test_snapshot_metrics(self):
+        q = SendQueue()
+        q.put({"type": "cups_response"})
+        q.put({"type": "cups_response"})
+        await q.get()
+        snap = q.snapshot()
+        assert snap["cups"]["depth"] == 1
+        assert snap["cups"]["sent"] == 1
+        assert snap["cups"]["wait_ms_max"] >= 0
+        assert set(snap) == {"job_status", "cups", "heartbeat", "discovery_status"}
+
+    def test_clear(self):
+        q = SendQueue()
+        q.put({"type": "heartbeat"})
+        q.put({"type": "job_status"})
+        assert _types(q.clear()) == ["job_status", "heartbeat"]
+        assert q.qsize() == 0
+
+    async def test_on_sent_fires_after_write(self):
+        q = SendQueue()
+        sent = []
+        q.put({"type": "job_status", "status": "received"}, on_sent=lambda: sent.append(1))
+        lane, frame = await q.get()
+        q.requeue(lane, frame)
+        assert sent == []
+        await q.get()
+        q.sent()
+        q.sent()
+        assert sent == [1]
+
+    def test_clear_keeps_on_sent_frames_out(self):
+        q = SendQueue()
+        q.put({"type": "job_status", "status": "received"}, on_sent=lambda: None)
+        q.put({"type": "job_status", "status": "printing"})
+        assert [json.loads(f)["status"] for f in q.clear()] == ["printing"]
+        assert q.qsize() == 0
+
+
+class TestJobStatusBatcher:
+    async def test_flushes_after_window(self):
+        sent = []
+
+        async def send(msg):
+            sent.append(msg)
+
+        b = JobStatusBatcher(send, window=0.02)
+        await b.add({"type": "job_status", "job_id": "a", "status": "received"})
+        await b.add({"type": "job_status", "job_id": "a", "status": "completed"})
+        assert sent == []
+        await asyncio.sleep(0.05)
+        assert sent == [{
+            "type": "job_status_batch",
+            "statuses": [
+                {"job_id": "a", "status": "received"},
+                {"job_id": "a", "status": "completed"},
+            ],
+        }]
+
+    async def test_flushes_at_max_entries(self):
+        sent = []
+
+        async def send(msg):
+            sent.append(msg)
+
+        b = JobStatusBatcher(send, window=10, max_entries=3)
+        for i in range(7):
+            await b.add({"type": "job_status", "job_id": str(i), "status": "completed"})
+        assert [len(m["statuses"]) for m in sent] == [3, 3]
+        await b.flush()
+        flat = [e["job_id"] for m in sent for e in m["statuses"]]
+        assert flat == [str(i) for i in range(7)]
+
+    async def test_clear_returns_pending(self):
+        async def send(msg):
+            raise AssertionError("should not send")
+
+        b = JobStatusBatcher(send, window=10)
+        await b.add({"type": "job_status", "job_id": "x", "status": "failed", "error": "e"})
+        assert b.clear() == [{"type": "job_status", "job_id": "x", "status": "failed", "error": "e"}]
+        await asyncio.sleep(0)
@@ -0,0 +1,65 @@
+"""Tests for the reconnect handshake bookkeeping."""
+
+import pytest
+
+from printbot.job_handler import _init_db, _mark_printed
+from printbot.session import SessionState
+
+
+@pytest.fixture
+def state_dir(tmp_path):
+    return str(tmp_path)
+
+
+def test_observe_tracks_highest_seq(state_dir):
+    session = SessionState(state_dir)
+    assert session.last_seq is None
+    session.observe({"type": "print", "seq": 4})
+    session.observe({"type": "cups_list_printers", "seq": 2})
+    session.observe({"type": "ping"})
+    assert session.last_seq == 4
+
+
+def test_session_id_is_per_process(state_dir):
+    assert SessionState(state_dir).session_id != SessionState(state_dir).session_id
+
+
+def test_printed_since_ack(state_dir):
+    db_path = _init_db(state_dir)
+    _mark_printed(db_path, "a")
+    _mark_printed(db_path, "b")
+
+    session = SessionState(state_dir)
+    printed, cursor = session.printed_since_ack()
+    assert printed == ["a", "b"]
+
+    session.ack(cursor)
+    _mark_printed(db_path, "c")
+    # The cursor is persisted, so a new process only reports "c".
+    assert SessionState(state_dir).printed_since_ack()[0] == ["c"]
+
+
+def test_printed_since_ack_limit(state_dir):
+    db_path = _init_db(state_dir)
+    for job_id in ("a", "b", "c"):
+        _mark_printed(db_path, job_id)
+
+    session = SessionState(state_dir)
+    printed, cursor = session.printed_since_ack(limit=2)
+    assert printed == ["a", "b"]
+    session.ack(cursor)
+    assert session.printed_since_ack()[0] == ["c"]
+
+
+def test_ack_never_moves_cursor_back(state_dir):
+    db_path = _init_db(state_dir)
+    _mark_printed(db_path, "a")
+    session = SessionState(state_dir)
+    _, cursor = session.printed_since_ack()
+    session.ack(cursor)
+    session.ack("")
+    assert session.printed_since_ack() == ([], None)
+
+
+def test_empty_db(state_dir):
+    assert SessionState(state_dir).printed_since_ack() == ([], None)
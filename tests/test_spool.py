@@ -0,0 +1,174 @@
+"""Tests for the spool module."""
+
+import base64
+import hashlib
+import json
+import os
+import tracemalloc
+
+import pytest
+
+from printbot.messages import LazyPayload, decode_frame
+from printbot.spool import (
+    SpoolManager,
+    SpoolWriter,
+    remove_spool_file,
+    set_spool_manager,
+    spool_base64,
+    spool_manager,
+    suffix_for,
+)
+
+
+class TestSpoolWriter:
+    def test_write_and_close(self):
+        w = SpoolWriter(".pdf", expected_size=6)
+        w.write(b"abc")
+        assert not w.complete
+        w.write(b"def")
+        assert w.complete
+        path = w.close()
+        try:
+            assert os.path.basename(path).startswith("printbot_")
+            assert path.endswith(".pdf")
+            with open(path, "rb") as f:
+                assert f.read() == b"abcdef"
+            assert w.hexdigest() == hashlib.sha256(b"abcdef").hexdigest()
+        finally:
+            os.remove(path)
+
+    def test_overrun_rejected(self):
+        w = SpoolWriter(expected_size=2)
+        with pytest.raises(ValueError, match="overrun"):
+            w.write(b"abc")
+        assert w.size == 0
+        w.discard()
+        assert not os.path.exists(w.path)
+
+    def test_unknown_size_never_complete(self):
+        w = SpoolWriter()
+        w.write(b"x" * 10)
+        assert not w.complete
+        w.discard()
+
+
+def test_suffix_for():
+    assert suffix_for("pdf") == ".pdf"
+    assert suffix_for("raw") == ".prn"
+
+
+def test_remove_spool_file_tolerates_missing():
+    remove_spool_file(None)
+    remove_spool_file("/nonexistent/printbot_x.pdf")
+
+
+@pytest.fixture
+def tiers(tmp_path):
+    ram, disk = tmp_path / "shm", tmp_path / "disk"
+    ram.mkdir()
+    disk.mkdir()
+    manager = SpoolManager(ram_dir=str(ram), ram_bytes=100, ram_max_file=60, disk_dir=str(disk))
+    previous = spool_manager()
+    set_spool_manager(manager)
+    yield manager, ram, disk
+    set_spool_manager(previous)
+
+
+class TestSpoolManager:
+    def test_small_known_size_goes_to_ram(self, tiers):
+        manager, ram, _ = tiers
+        w = SpoolWriter(".prn", expected_size=50)
+        w.write(b"x" * 50)
+        path = w.close()
+        assert os.path.dirname(path) == str(ram)
+        assert manager.snapshot()["ram_bytes"] == 50
+        remove_spool_file(path)
+        assert manager.snapshot()["ram_bytes"] == 0
+        assert manager.snapshot()["ram_files"] == 0
+
+    def test_large_or_unknown_size_goes_to_disk(self, tiers):
+        _, _, disk = tiers
+        big = SpoolWriter(".pdf", expected_size=61)
+        unknown = SpoolWriter(".pdf")
+        try:
+            assert os.path.dirname(big.path) == str(disk)
+            assert os.path.dirname(unknown.path) == str(disk)
+        finally:
+            big.discard()
+            unknown.discard()
+
+    def test_budget_overflow_goes_to_disk(self, tiers):
+        manager, ram, disk = tiers
+        first = SpoolWriter(expected_size=60)
+        second = SpoolWriter(expected_size=60)
+        try:
+            assert os.path.dirname(first.path) == str(ram)
+            assert os.path.dirname(second.path) == str(disk)
+            first.discard()
+            third = SpoolWriter(expected_size=60)
+            assert os.path.dirname(third.path) == str(ram)
+            third.discard()
+        finally:
+            second.discard()
+        snap = manager.snapshot()
+        assert (snap["ram_spooled"], snap["disk_spooled"], snap["ram_bytes"]) == (2, 1, 0)
+
+    def test_missing_ram_dir_disables_tier(self, tmp_path):
+        manager = SpoolManager(ram_dir=str(tmp_path / "nope"), disk_dir=str(tmp_path))
+        fd, path = manager.create(".prn", 10)
+        os.close(fd)
+        assert os.path.dirname(path) == str(tmp_path)
+        assert manager.snapshot()["ram_budget"] == 0
+
+    def test_sweep_orphans(self, tiers):
+        manager, ram, disk = tiers
+        (ram / "printbot_old.prn").write_bytes(b"x")
+        (disk / "printbot_old.pdf").write_bytes(b"x")
+        (disk / "printbot_ota_extract_dir").mkdir()
+        (disk / "other.pdf").write_bytes(b"x")
+        live = SpoolWriter(expected_size=5)
+        try:
+            assert manager.sweep_orphans() == 2
+            assert os.path.exists(live.path)
+            assert sorted(os.listdir(disk)) == ["other.pdf", "printbot_ota_extract_dir"]
+        finally:
+            live.discard()
+
+
+class TestSpoolBase64:
+    def test_decodes_to_file(self):
+        data = os.urandom(100_001)
+        b64 = base64.b64encode(data).decode()
+        path = spool_base64(LazyPayload(b64, 0, len(b64)), ".pdf")
+        try:
+            with open(path, "rb") as f:
+                assert f.read() == data
+        finally:
+            remove_spool_file(path)
+
+    def test_invalid_base64_leaves_nothing(self, tiers):
+        _, ram, disk = tiers
+        with pytest.raises(ValueError):
+            spool_base64(LazyPayload("AAAA!!!!", 0, 8))
+        assert os.listdir(ram) == [] and os.listdir(disk) == []
+
+    def test_30mb_frame_spooled_in_window_sized_memory(self):
+        data = os.urandom(30 * 1024 * 1024)
+        raw = json.dumps({"type": "print", "job_id": "big", "payload": base64.b64encode(data).decode()})
+        del data
+        msg = decode_frame(raw)
+        del raw
+        payload = msg.pop("payload")
+        tracemalloc.start()
+        try:
+            path = spool_base64(payload, ".pdf")
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        try:
+            assert os.path.getsize(path) == 30 * 1024 * 1024
+            # The frame itself was allocated before tracing started; decoding
+            # only ever holds one window and its bytes, never the document.
+            assert peak < 4 * 1024 * 1024
+        finally:
+            remove_spool_file(path)
@@ -0,0 +1,50 @@
+"""Tests for the shared state.db helper."""
+
+import os
+import sqlite3
+import threading
+
+from printbot.job_handler import DB_SCHEMA as PRINTED_JOBS_SCHEMA
+from printbot.outbox import DB_SCHEMA as OUTBOX_SCHEMA, Outbox
+from printbot.session import SessionState
+from printbot.state_db import StateDb, init_db
+
+
+def tables(db_path: str) -> set[str]:
+    con = sqlite3.connect(db_path)
+    try:
+        return {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        con.close()
+
+
+def test_init_db_creates_directory_and_tables(tmp_path):
+    state_dir = str(tmp_path / "nested" / "state")
+    db_path = init_db(state_dir, PRINTED_JOBS_SCHEMA, OUTBOX_SCHEMA)
+    assert db_path == os.path.join(state_dir, "state.db")
+    assert {"printed_jobs", "outbox"} <= tables(db_path)
+
+
+def test_state_db_set_up_once_across_threads(tmp_path):
+    db = StateDb(str(tmp_path), OUTBOX_SCHEMA)
+    errors = []
+
+    def use():
+        try:
+            db.connect().close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert "outbox" in tables(str(tmp_path / "state.db"))
+
+
+def test_stores_share_one_file(tmp_path):
+    Outbox(str(tmp_path)).put({"type": "job_status", "job_id": "j1", "status": "completed"})
+    SessionState(str(tmp_path)).printed_since_ack()
+    assert {"outbox", "printed_jobs", "gateway_state"} <= tables(str(tmp_path / "state.db"))
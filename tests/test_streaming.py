@@ -0,0 +1,88 @@
+"""Tests for chunked payload streams."""
+
+import asyncio
+import base64
+import hashlib
+import os
+
+import pytest
+
+from printbot.streaming import PayloadStream, StreamBudget, StreamError
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+async def _open(header: dict, ceiling: int = 1024) -> PayloadStream:
+    stream = PayloadStream(header, StreamBudget(ceiling))
+    await stream.open()
+    return stream
+
+
+class TestPayloadStream:
+    async def test_chunks_written_in_order(self):
+        data = b"%PDF-" + b"x" * 100
+        stream = await _open({"job_id": "s1", "payload_size": len(data)})
+        await stream.feed(0, _b64(data[:50]))
+        await stream.feed(1, _b64(data[50:]))
+        path = await stream.finish(hashlib.sha256(data).hexdigest())
+        try:
+            with open(path, "rb") as f:
+                assert f.read() == data
+        finally:
+            os.remove(path)
+
+    async def test_out_of_order_chunk_rejected(self):
+        stream = await _open({"job_id": "s2"})
+        await stream.feed(0, _b64(b"a"))
+        with pytest.raises(StreamError, match="out of order"):
+            await stream.feed(2, _b64(b"c"))
+        await stream.abort()
+
+    async def test_invalid_base64_rejected(self):
+        stream = await _open({"job_id": "s3"})
+        with pytest.raises(StreamError, match="Invalid chunk"):
+            await stream.feed(0, "not base64!!")
+        await stream.abort()
+
+    async def test_checksum_mismatch(self):
+        stream = await _open({"job_id": "s4", "sha256": "sha256:" + "0" * 64})
+        await stream.feed(0, _b64(b"abc"))
+        with pytest.raises(StreamError, match="Checksum mismatch"):
+            await stream.finish()
+        await stream.abort()
+
+    async def test_size_mismatch(self):
+        stream = await _open({"job_id": "s5", "payload_size": 10})
+        await stream.feed(0, _b64(b"abc"))
+        with pytest.raises(StreamError, match="Size mismatch"):
+            await stream.finish()
+        await stream.abort()
+
+    async def test_abort_removes_partial_file_and_returns_budget(self):
+        budget = StreamBudget(1024)
+        stream = PayloadStream({"job_id": "s6"}, budget)
+        await stream.open()
+        await stream.feed(0, _b64(b"x" * 100))
+        path = stream._writer.path
+        await stream.abort()
+        assert not os.path.exists(path)
+        assert budget.buffered == 0
+
+
+class TestStreamBudget:
+    async def test_acquire_blocks_above_ceiling(self):
+        budget = StreamBudget(10)
+        await budget.acquire(8)
+        waiter = asyncio.create_task(budget.acquire(5))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await budget.release(8)
+        await asyncio.wait_for(waiter, 1)
+        assert budget.buffered == 5
+
+    async def test_oversized_chunk_admitted_when_empty(self):
+        budget = StreamBudget(10)
+        await asyncio.wait_for(budget.acquire(50), 1)
+        assert budget.buffered == 50
@@ -1,13 +1,24 @@
 """Tests for the WebSocket client (GatewayClient)."""
 
 import asyncio
+import base64
 import json
+import os
+import threading
+import time
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
 from printbot.config import Settings
-from printbot.websocket_client import GatewayClient, _build_printer_entry
+from printbot.cups_backend import IppBackend
+from printbot.ipp import IppUnavailable
+from printbot.job_handler import PreparedJob
+from printbot.messages import decode_frame
+from printbot.outbox import Outbox
+from printbot.session import SessionState
+from printbot.websocket_client import EVENT_HEARTBEAT_FACTOR, GatewayClient, _build_printer_entry
 
 
 @pytest.fixture
@@ -30,6 +41,19 @@ def client(settings):
     return GatewayClient(settings)
 
 
+@pytest.fixture
+def stages():
+    """Patch the print pipeline: prepare passes jobs through, submit/record are mocks."""
+    def prepare(msg, printer_name, state_dir, dry_run):
+        printer = (msg.get("metadata") or {}).get("target_printer") or printer_name
+        return PreparedJob(msg.get("job_id", "unknown"), "", "pdf", printer, "", None, None, 0)
+
+    with patch("printbot.websocket_client.prepare_print_job", side_effect=prepare) as prep, \
+            patch("printbot.websocket_client.submit_print_job") as submit, \
+            patch("printbot.websocket_client.record_print_job") as record:
+        yield SimpleNamespace(prepare=prep, submit=submit, record=record)
+
+
 class TestHandleMessage:
     async def test_print_message_queued(self, client):
         msg = {"type": "print", "job_id": "job-1", "payload": "base64data"}
@@ -38,6 +62,22 @@ class TestHandleMessage:
         queued = client._job_queue.get_nowait()
         assert queued["job_id"] == "job-1"
 
+    async def test_large_base64_payload_spooled_before_queueing(self, client):
+        data = os.urandom(200_000)
+        msg = decode_frame(json.dumps({
+            "type": "print", "job_id": "big-1", "payload_type": "pdf",
+            "payload": base64.b64encode(data).decode(),
+        }))
+        await client._handle_message(msg)
+        queued = client._job_queue.get_nowait()
+        assert "payload" not in queued
+        try:
+            with open(queued["spool_path"], "rb") as f:
+                assert f.read() == data
+            assert queued["spool_path"].endswith(".pdf")
+        finally:
+            os.remove(queued["spool_path"])
+
     async def test_ping_sends_pong(self, client):
         client._ws = AsyncMock()
         msg = {"type": "ping", "timestamp": "2025-01-01T00:00:00"}
@@ -64,11 +104,255 @@ class TestHandleMessage:
         await asyncio.sleep(0.1)
 
 
+class TestBinaryPayload:
+    """print header with payload_encoding=binary + raw binary frames."""
+
+    async def test_frames_spooled_and_job_queued(self, client):
+        client._ws = AsyncMock()
+        await client._handle_message({
+            "type": "print", "job_id": "bin-1", "payload_type": "pdf",
+            "payload_encoding": "binary", "payload_size": 10, "metadata": {},
+        })
+        assert client._job_queue.qsize() == 0
+
+        await client._handle_binary_frame(b"%PDF-")
+        await client._handle_binary_frame(b"12345")
+
+        queued = client._job_queue.get_nowait()
+        assert queued["job_id"] == "bin-1"
+        assert "payload" not in queued
+        with open(queued["spool_path"], "rb") as f:
+            assert f.read() == b"%PDF-12345"
+        os.remove(queued["spool_path"])
+
+    async def test_spool_open_failure_fails_job(self, client):
+        client._ws = AsyncMock()
+        client._server_features = {"flow_credit"}
+        with patch("printbot.websocket_client.SpoolWriter", side_effect=OSError(28, "No space left on device")):
+            await client._handle_message({
+                "type": "print", "job_id": "bin-full", "payload_encoding": "binary", "payload_size": 3,
+            })
+        assert client._binary_rx is None
+        assert client._credits.available()["jobs"] == client._credits.jobs
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent["job_id"] == "bin-full"
+        assert sent["status"] == "failed"
+        assert "No space left" in sent["error"]
+
+    async def test_spool_close_failure_fails_job(self, client):
+        client._ws = AsyncMock()
+        client._server_features = {"flow_credit"}
+        await client._handle_message({
+            "type": "print", "job_id": "bin-close", "payload_encoding": "binary", "payload_size": 3,
+        })
+        writer = client._binary_rx[1]
+        path = writer.path
+        writer.close = MagicMock(side_effect=OSError(5, "Input/output error"))
+        await client._handle_binary_frame(b"abc")
+
+        assert client._binary_rx is None
+        assert client._job_queue.qsize() == 0
+        assert not os.path.exists(path)
+        assert client._credits.available()["jobs"] == client._credits.jobs
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent["status"] == "failed"
+        assert "Input/output error" in sent["error"]
+
+    async def test_overrun_fails_job(self, client):
+        client._ws = AsyncMock()
+        await client._handle_message({
+            "type": "print", "job_id": "bin-over", "payload_encoding": "binary",
+            "payload_size": 3,
+        })
+        path = client._binary_rx[1].path
+        await client._handle_binary_frame(b"toolong")
+
+        assert client._binary_rx is None
+        assert client._job_queue.qsize() == 0
+        assert not os.path.exists(path)
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent["status"] == "failed"
+        assert "overrun" in sent["error"]
+
+    async def test_new_header_aborts_incomplete_payload(self, client):
+        client._ws = AsyncMock()
+        await client._handle_message({
+            "type": "print", "job_id": "bin-a", "payload_encoding": "binary",
+            "payload_size": 100,
+        })
+        await client._handle_binary_frame(b"partial")
+        await client._handle_message({
+            "type": "print", "job_id": "bin-b", "payload_encoding": "binary",
+            "payload_size": 2,
+        })
+        await client._handle_binary_frame(b"ok")
+
+        sent = [json.loads(c[0][0]) for c in client._ws.send.call_args_list]
+        assert {"type": "job_status", "job_id": "bin-a", "status": "failed",
+                "error": "Binary payload incomplete"} in sent
+        queued = client._job_queue.get_nowait()
+        assert queued["job_id"] == "bin-b"
+        os.remove(queued["spool_path"])
+
+    async def test_stray_binary_frame_dropped(self, client):
+        await client._handle_binary_frame(b"nobody asked")
+        assert client._job_queue.qsize() == 0
+
+    async def test_server_capabilities_recorded(self, client):
+        await client._handle_message({"type": "capabilities", "features": ["x", "y"]})
+        assert client._server_features == {"x", "y"}
+
+
+class TestChunkedPayload:
+    """print_begin / print_chunk / print_end streams."""
+
+    async def test_stream_spooled_and_job_queued(self, client):
+        import base64
+        import hashlib
+
+        client._ws = AsyncMock()
+        data = b"%PDF-" + b"y" * 1000
+        await client._handle_message({
+            "type": "print_begin", "job_id": "st-1", "payload_type": "pdf",
+            "payload_size": len(data), "metadata": {"title": "Big"},
+        })
+        for seq, offset in enumerate(range(0, len(data), 300)):
+            await client._handle_message({
+                "type": "print_chunk", "job_id": "st-1", "seq": seq,
+                "data": base64.b64encode(data[offset:offset + 300]).decode(),
+            })
+        await client._handle_message({
+            "type": "print_end", "job_id": "st-1",
+            "sha256": hashlib.sha256(data).hexdigest(),
+        })
+
+        queued = client._job_queue.get_nowait()
+        assert queued["type"] == "print"
+        assert queued["metadata"] == {"title": "Big"}
+        with open(queued["spool_path"], "rb") as f:
+            assert f.read() == data
+        os.remove(queued["spool_path"])
+        assert client._streams == {}
+
+    async def test_repeated_begin_restarts_stream(self, stages, client):
+        stages.submit.return_value = {"status": "completed", "cups_job_id": 7}
+        client._ws = AsyncMock()
+        client._server_features = {"flow_credit"}
+        await client._handle_message({"type": "print_begin", "job_id": "st-re"})
+        await client._handle_message({
+            "type": "print_chunk", "job_id": "st-re", "seq": 0,
+            "data": base64.b64encode(b"stale").decode(),
+        })
+        await client._handle_message({"type": "print_begin", "job_id": "st-re"})
+        await client._handle_message({
+            "type": "print_chunk", "job_id": "st-re", "seq": 0,
+            "data": base64.b64encode(b"fresh").decode(),
+        })
+        await client._handle_message({"type": "print_end", "job_id": "st-re"})
+        assert client._credits.available()["jobs"] == client._credits.jobs - 1
+
+        queued = client._job_queue.get_nowait()
+        client._job_queue.task_done()
+        with open(queued["spool_path"], "rb") as f:
+            assert f.read() == b"fresh"
+        await client._job_queue.put(queued)
+        task = asyncio.create_task(client._process_jobs())
+        await asyncio.wait_for(client._job_queue.join(), timeout=1)
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+        sent = [json.loads(c[0][0]) for c in client._ws.send.call_args_list]
+        assert [m["status"] for m in sent if m.get("type") == "job_status"] == [
+            "received", "printing", "completed",
+        ]
+
+    async def test_bad_chunk_fails_job(self, client):
+        client._ws = AsyncMock()
+        await client._handle_message({"type": "print_begin", "job_id": "st-bad"})
+        await client._handle_message({
+            "type": "print_chunk", "job_id": "st-bad", "seq": 5, "data": "",
+        })
+
+        assert "st-bad" not in client._streams
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent["job_id"] == "st-bad"
+        assert sent["status"] == "failed"
+
+    async def test_checksum_mismatch_fails_job(self, client):
+        client._ws = AsyncMock()
+        await client._handle_message({"type": "print_begin", "job_id": "st-sum"})
+        await client._handle_message({
+            "type": "print_chunk", "job_id": "st-sum", "seq": 0, "data": "YWJj",
+        })
+        await client._handle_message({
+            "type": "print_end", "job_id": "st-sum", "sha256": "0" * 64,
+        })
+
+        assert client._job_queue.qsize() == 0
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent["status"] == "failed"
+        assert "Checksum mismatch" in sent["error"]
+
+
+class TestPayloadUrl:
+    async def test_download_starts_on_arrival_and_feeds_processor(self, client):
+        client._ws = AsyncMock()
+        client._fetcher.fetch = MagicMock(return_value="/tmp/printbot_dl.pdf")
+        msg = {
+            "type": "print", "job_id": "url-1", "payload_type": "pdf",
+            "payload_url": "https://files.example/1.pdf", "sha256": "abc",
+        }
+        await client._handle_message(msg)
+        assert "url-1" in client._downloads
+        await asyncio.sleep(0.05)
+        client._fetcher.fetch.assert_called_once_with(
+            "https://files.example/1.pdf", "abc", ".pdf", None,
+        )
+
+        job = await client._resolve_payload(client._job_queue.get_nowait())
+        assert job["spool_path"] == "/tmp/printbot_dl.pdf"
+        assert "payload_url" not in job
+        assert client._downloads == {}
+
+    async def test_missing_sha256_rejected_before_download(self, client):
+        client._ws = AsyncMock()
+        client._fetcher.fetch = MagicMock()
+        await client._handle_message({
+            "type": "print", "job_id": "url-2", "payload_url": "https://files.example/2.pdf",
+        })
+        assert client._downloads == {}
+        assert client._job_queue.qsize() == 0
+        client._fetcher.fetch.assert_not_called()
+        assert json.loads(client._ws.send.call_args[0][0]) == {
+            "type": "job_status", "job_id": "url-2", "status": "failed",
+            "error": "payload_url without sha256",
+        }
+
+    async def test_download_failure_fails_job(self, stages, client):
+        client._ws = AsyncMock()
+        client._fetcher.fetch = MagicMock(side_effect=ValueError("Checksum mismatch"))
+        await client._handle_message({
+            "type": "print", "job_id": "url-bad", "payload_url": "https://x/1.pdf", "sha256": "abc",
+        })
+
+        task = asyncio.create_task(client._process_jobs())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        stages.prepare.assert_not_called()
+        sent = [json.loads(c[0][0]) for c in client._ws.send.call_args_list]
+        assert sent[-1]["status"] == "failed"
+        assert "Checksum mismatch" in sent[-1]["error"]
+
+
 class TestProcessJobs:
-    @patch("printbot.websocket_client.handle_print_job")
-    async def test_job_status_progression(self, mock_handle, client):
+    async def test_job_status_progression(self, stages, client):
         """Jobs should send received → printing → completed."""
-        mock_handle.return_value = {"status": "completed", "cups_job_id": 142}
+        stages.submit.return_value = {"status": "completed", "cups_job_id": 142}
         client._ws = AsyncMock()
 
         await client._job_queue.put({
@@ -94,14 +378,13 @@ class TestProcessJobs:
         assert "printing" in statuses
         assert "completed" in statuses
 
-    @patch("printbot.websocket_client.handle_print_job")
-    async def test_cups_job_id_propagates_from_printing_onward(self, mock_handle, client):
+    async def test_cups_job_id_propagates_from_printing_onward(self, stages, client):
         """cups_job_id must appear from 'printing' through 'completed'.
 
         It is not present on 'received' (we haven't submitted yet — the id is
         only known after lp returns).
         """
-        mock_handle.return_value = {"status": "completed", "cups_job_id": 273}
+        stages.submit.return_value = {"status": "completed", "cups_job_id": 273}
         client._ws = AsyncMock()
 
         await client._job_queue.put({
@@ -127,15 +410,15 @@ class TestProcessJobs:
         assert by_status["printing"]["cups_job_id"] == 273
         assert by_status["completed"]["cups_job_id"] == 273
 
-    @patch("printbot.websocket_client.handle_print_job")
-    async def test_dedup_path_skips_printing_event(self, mock_handle, client):
+    async def test_dedup_path_skips_printing_event(self, stages, client):
         """Deduplicated jobs (already-printed) must NOT emit a 'printing' event.
 
-        handle_print_job's dedup branch returns {"status": "completed"} with
+        prepare_print_job's dedup branch returns {"status": "completed"} with
         no cups_job_id key — no actual lp submission happened, so emitting
         'printing' would mislead the server about what occurred.
         """
-        mock_handle.return_value = {"status": "completed"}  # no cups_job_id key
+        stages.prepare.side_effect = None
+        stages.prepare.return_value = {"status": "completed"}  # no cups_job_id key
         client._ws = AsyncMock()
 
         await client._job_queue.put({
@@ -164,8 +447,7 @@ class TestProcessJobs:
         for m in sent_msgs:
             assert "cups_job_id" not in m
 
-    @patch("printbot.websocket_client.handle_print_job")
-    async def test_cups_job_id_omitted_when_unparseable(self, mock_handle, client):
+    async def test_cups_job_id_omitted_when_unparseable(self, stages, client):
         """If lp output couldn't be parsed, cups_job_id is omitted (not null).
 
         Submission DID happen (cups_job_id key present, value None) so the
@@ -173,7 +455,7 @@ class TestProcessJobs:
         to distinguish "submitted but id-unknown" from "deduplicated, never
         submitted".
         """
-        mock_handle.return_value = {"status": "completed", "cups_job_id": None}
+        stages.submit.return_value = {"status": "completed", "cups_job_id": None}
         client._ws = AsyncMock()
 
         await client._job_queue.put({
@@ -196,9 +478,8 @@ class TestProcessJobs:
         for m in sent_msgs:
             assert "cups_job_id" not in m
 
-    @patch("printbot.websocket_client.handle_print_job")
-    async def test_job_failure(self, mock_handle, client):
-        mock_handle.return_value = {"status": "failed", "error": "CUPS error"}
+    async def test_job_failure(self, stages, client):
+        stages.submit.return_value = {"status": "failed", "error": "CUPS error"}
         client._ws = AsyncMock()
 
         await client._job_queue.put({
@@ -223,6 +504,401 @@ class TestProcessJobs:
         assert failed_msgs[0]["error"] == "CUPS error"
 
 
+class TestWriterLoop:
+    async def test_job_status_overtakes_queued_cups_responses(self, client):
+        ws = AsyncMock()
+        client._ws = ws
+        client._writer_task = asyncio.create_task(asyncio.sleep(3600))  # writer "running"
+        for i in range(5):
+            await client._send({"type": "cups_response", "request_id": str(i)})
+        await client._send_job_status("job-1", "completed")
+        client._writer_task.cancel()
+
+        writer = asyncio.create_task(client._writer_loop(ws))
+        await asyncio.sleep(0.05)
+        writer.cancel()
+
+        sent = [json.loads(c[0][0]) for c in ws.send.call_args_list]
+        assert sent[0]["type"] == "job_status"
+        assert [m["request_id"] for m in sent[1:]] == ["0", "1", "2", "3", "4"]
+
+
+class TestJobStatusBatching:
+    async def test_individual_frames_without_server_support(self, client):
+        client._ws = AsyncMock()
+        await client._send_job_status("j1", "received")
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent == {"type": "job_status", "job_id": "j1", "status": "received"}
+
+    async def test_batched_when_server_advertises(self, client):
+        client._ws = AsyncMock()
+        client._server_features = {"job_status_batch"}
+        await client._send_job_status("j1", "received")
+        await client._send_job_status("j1", "completed", cups_job_id=7)
+        client._ws.send.assert_not_called()
+        await asyncio.sleep(0.1)
+
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent["type"] == "job_status_batch"
+        assert sent["statuses"] == [
+            {"job_id": "j1", "status": "received"},
+            {"job_id": "j1", "status": "completed", "cups_job_id": 7},
+        ]
+
+
+class TestOutbox:
+    @pytest.fixture
+    def client(self, settings, tmp_path):
+        client = GatewayClient(settings)
+        client._outbox = Outbox(str(tmp_path))
+        return client
+
+    async def written(self, client) -> list[dict]:
+        """Play the writer: send every queued frame, then let the acks land."""
+        frames = []
+        while client._send_queue.qsize():
+            _, frame = await client._send_queue.get()
+            client._send_queue.sent()
+            frames.append(json.loads(frame))
+        for _ in range(100):
+            if not client._outbox.count():
+                break
+            await asyncio.sleep(0.01)
+        return frames
+
+    async def test_status_stored_while_offline(self, client):
+        await client._send_job_status("j1", "completed", cups_job_id=3)
+        await client._send({"type": "heartbeat"})
+        rows = client._outbox.peek()
+        assert [m for _, m in rows] == [
+            {"type": "job_status", "job_id": "j1", "status": "completed", "cups_job_id": 3}
+        ]
+
+    async def test_unsent_durable_frames_stashed_on_disconnect(self, client):
+        client._send_queue.put({"type": "heartbeat"})
+        client._send_queue.put({"type": "job_status", "job_id": "j1", "status": "printing"})
+        await client._status_batcher.add({"type": "job_status", "job_id": "j1", "status": "completed"})
+        await client._stash_unsent()
+        assert [m["status"] for _, m in client._outbox.peek()] == ["printing", "completed"]
+        assert client._send_queue.qsize() == 0
+
+    async def test_drain_replays_in_batches(self, client):
+        client._outbox.extend([
+            {"type": "job_status", "job_id": "j1", "status": "received"},
+            {"type": "ota_status", "status": "success"},
+            {"type": "job_status", "job_id": "j1", "status": "completed"},
+        ])
+        client._server_features = {"job_status_batch"}
+        client._outbox_draining = True
+        await client._drain_outbox()
+        assert client._outbox_draining is False
+        # Rows stay until the writer has sent their frames.
+        assert client._outbox.count() == 3
+
+        frames = await self.written(client)
+        assert client._outbox.count() == 0
+        assert frames == [
+            {"type": "ota_status", "status": "success"},
+            {"type": "job_status_batch", "statuses": [
+                {"job_id": "j1", "status": "received"},
+                {"job_id": "j1", "status": "completed"},
+            ]},
+        ]
+
+    async def test_drain_unbatched_without_server_support(self, client):
+        client._outbox.put({"type": "job_status_batch", "statuses": [
+            {"job_id": "j1", "status": "received"},
+            {"job_id": "j2", "status": "received"},
+        ]})
+        await client._drain_outbox()
+        frames = await self.written(client)
+        assert [f["type"] for f in frames] == ["job_status", "job_status"]
+        assert [f["job_id"] for f in frames] == ["j1", "j2"]
+
+    async def test_new_status_queues_behind_outbox_while_draining(self, client):
+        client._ws = AsyncMock()
+        client._outbox_draining = True
+        await client._send_job_status("j2", "received")
+        client._ws.send.assert_not_called()
+        assert client._outbox.count() == 1
+
+    async def test_slow_write_during_drain_is_replayed(self, client):
+        client._ws = AsyncMock()
+        client._writer_task = MagicMock()
+        client._outbox.put({"type": "job_status", "job_id": "j1", "status": "printing"})
+        client._outbox_draining = True
+        put = client._outbox.put
+
+        def slow_put(msg):
+            time.sleep(0.05)
+            put(msg)
+
+        client._outbox.put = slow_put
+        status = asyncio.create_task(client._send_job_status("j1", "completed"))
+        await asyncio.sleep(0)
+        await client._drain_outbox()
+        await status
+
+        frames = await self.written(client)
+        assert client._outbox.count() == 0
+        assert [f["status"] for f in frames] == ["printing", "completed"]
+
+    async def test_disconnect_mid_drain_keeps_order(self, client, monkeypatch):
+        monkeypatch.setattr("printbot.websocket_client.OUTBOX_DRAIN_BATCH", 1)
+        client._ws = AsyncMock()
+        client._writer_task = MagicMock()
+        client._outbox.put({"type": "job_status", "job_id": "j1", "status": "received"})
+        client._outbox_draining = True
+        peek = client._outbox.peek
+        calls = []
+
+        def peek_then_drop(limit, after=0):
+            calls.append(after)
+            if len(calls) == 2:
+                # A newer status reached the outbox during the replay, then
+                # the link dropped before the next batch.
+                client._outbox.put({"type": "job_status", "job_id": "j1", "status": "printing"})
+                raise ConnectionError("link down")
+            return peek(limit, after)
+
+        client._outbox.peek = peek_then_drop
+        with pytest.raises(ConnectionError):
+            await client._drain_outbox()
+        client._ws = None
+        await client._stash_unsent()
+
+        client._outbox.peek = peek
+        assert [m["status"] for _, m in client._outbox.peek()] == ["received", "printing"]
+
+    async def test_processor_survives_reconnect(self, client):
+        """The job processor runs for the client's lifetime, not per connection."""
+        starts = []
+        connects = []
+
+        async def processor():
+            starts.append(1)
+            await asyncio.Event().wait()
+
+        async def drop_connection():
+            connects.append(1)
+            await asyncio.sleep(0)
+            if len(connects) == 3:
+                client._running = False
+            raise ConnectionError("network down")
+
+        client.settings.reconnect_delay = 0.001
+        client._process_jobs = processor
+        client._connect_and_listen = drop_connection
+        await client.run()
+        assert len(connects) == 3
+        assert len(starts) == 1
+
+
+class TestPrinterLanes:
+    async def test_jammed_printer_does_not_block_other_lane(self, stages, client):
+        jam_released = threading.Event()
+        printed = []
+
+        def fake_submit(prepared):
+            if prepared.printer == "jammed":
+                assert jam_released.wait(2)
+            printed.append(prepared.job_id)
+            return {"status": "completed"}
+
+        stages.submit.side_effect = fake_submit
+
+        client._ws = AsyncMock()
+        await client._enqueue_job({"type": "print", "job_id": "j1", "metadata": {"target_printer": "jammed"}})
+        await client._enqueue_job({"type": "print", "job_id": "r1", "metadata": {"target_printer": "receipt"}})
+        processor = asyncio.create_task(client._process_jobs())
+        for _ in range(100):
+            if printed:
+                break
+            await asyncio.sleep(0.01)
+        assert printed == ["r1"]
+        assert client._lanes.depth("jammed") == {"queued": 0, "active": 1}
+        assert client._heartbeat_printers() == ["test-printer", "jammed"]
+        jam_released.set()
+        await asyncio.wait_for(client._job_queue.join(), timeout=2)
+        processor.cancel()
+        assert printed == ["r1", "j1"]
+        assert client._held_jobs == {}
+
+
+class TestSessionHandshake:
+    @pytest.fixture
+    def client(self, settings, tmp_path):
+        client = GatewayClient(settings)
+        client._session = SessionState(str(tmp_path))
+        client._ws = AsyncMock()
+        return client
+
+    async def test_hello_lists_held_jobs_and_last_seq(self, client):
+        await client._handle_message({"type": "print", "job_id": "j1", "seq": 7, "payload": ""})
+        await client._handle_message({"type": "print", "job_id": "j2", "seq": 8, "payload": ""})
+        await client._send_hello()
+
+        hello = json.loads(client._ws.send.call_args[0][0])
+        assert hello["type"] == "hello"
+        assert hello["session_id"] == client._session.session_id
+        assert hello["last_seq"] == 8
+        assert hello["spooled"] == ["j1", "j2"]
+        assert hello["printed"] == []
+        assert "job_status_batch" in hello["features"]
+
+    async def test_retransmitted_job_not_queued_twice(self, client):
+        await client._handle_message({"type": "print", "job_id": "j1", "payload": ""})
+        await client._handle_message({"type": "print", "job_id": "j1", "payload": ""})
+        assert client._job_queue.qsize() == 1
+
+    async def test_hello_ack_records_features_and_cursor(self, client):
+        client._hello_cursor = "2026-01-01T00:00:00+00:00"
+        with patch.object(client._session, "ack") as ack:
+            await client._handle_message({"type": "hello_ack", "features": ["job_status_batch"]})
+        assert client._server_features == {"job_status_batch"}
+        ack.assert_called_once_with("2026-01-01T00:00:00+00:00")
+        assert client._hello_cursor is None
+
+    async def test_processed_job_no_longer_held(self, stages, client):
+        stages.submit.return_value = {"status": "completed"}
+        await client._handle_message({"type": "print", "job_id": "j1", "payload": ""})
+        processor = asyncio.create_task(client._process_jobs())
+        await asyncio.wait_for(client._job_queue.join(), timeout=1)
+        processor.cancel()
+        assert client._held_jobs == {}
+
+
+class TestFlowControl:
+    @pytest.fixture
+    def settings(self, settings):
+        settings.credit_jobs = 2
+        return settings
+
+    def sent(self, client) -> list[dict]:
+        return [json.loads(c[0][0]) for c in client._ws.send.call_args_list]
+
+    async def test_job_deferred_once_credits_exhausted(self, client):
+        client._ws = AsyncMock()
+        client._server_features = {"flow_credit"}
+        for job_id in ("j1", "j2", "j3"):
+            await client._handle_message({"type": "print", "job_id": job_id, "payload": "YWJj"})
+        assert client._job_queue.qsize() == 2
+        assert "j3" not in client._held_jobs
+        assert self.sent(client) == [{
+            "type": "job_status", "job_id": "j3", "status": "deferred",
+            "error": "Gateway busy, credit window exhausted",
+        }]
+
+    async def test_old_server_jobs_never_deferred(self, client):
+        client._ws = AsyncMock()
+        for job_id in ("j1", "j2", "j3"):
+            await client._handle_message({"type": "print", "job_id": job_id, "payload": "YWJj"})
+        assert client._job_queue.qsize() == 3
+        client._ws.send.assert_not_called()
+
+    async def test_binary_header_deferred_before_spooling(self, client):
+        client._ws = AsyncMock()
+        client._server_features = {"flow_credit"}
+        client._credits.acquire("a", {})
+        client._credits.acquire("b", {})
+        await client._handle_message({
+            "type": "print", "job_id": "bin-1", "payload_encoding": "binary", "payload_size": 10,
+        })
+        assert client._binary_rx is None
+        assert self.sent(client)[0]["status"] == "deferred"
+
+    async def test_failed_stream_returns_credits(self, client):
+        client._ws = AsyncMock()
+        client._server_features = {"flow_credit"}
+        await client._handle_message({"type": "print_begin", "job_id": "st-1"})
+        assert client._credits.available()["jobs"] == 1
+        await client._handle_message({"type": "print_chunk", "job_id": "st-1", "seq": 3, "data": ""})
+        assert client._credits.available()["jobs"] == 2
+
+    async def test_finished_job_announces_credits(self, stages, client):
+        stages.submit.return_value = {"status": "completed"}
+        client._ws = AsyncMock()
+        client._writer_task = MagicMock()
+        client._server_features = {"flow_credit"}
+        await client._handle_message({"type": "print", "job_id": "j1", "payload": "YWJj"})
+        processor = asyncio.create_task(client._process_jobs())
+        await asyncio.wait_for(client._job_queue.join(), timeout=1)
+        await asyncio.sleep(0)
+        processor.cancel()
+
+        frames = [json.loads(f) for f in client._send_queue.clear()]
+        assert frames[-1] == {"type": "flow_credit", "jobs": 2, "bytes": client._credits.bytes}
+
+    async def test_hello_advertises_credit_window(self, client, tmp_path):
+        client._session = SessionState(str(tmp_path))
+        client._ws = AsyncMock()
+        await client._send_hello()
+        hello = json.loads(client._ws.send.call_args[0][0])
+        assert "flow_credit" in hello["features"]
+        assert hello["credit"] == {"jobs": 2, "bytes": client._credits.bytes}
+
+
+class TestPrinterEvents:
+    EVENT = {
+        "type": "printer_event", "printer_name": "laser", "event": "printer-state-changed",
+        "state": "stopped", "state_reasons": ["marker-supply-empty-error"],
+        "accepting_jobs": True, "message": "",
+    }
+
+    def watch(self, client, *polls):
+        client._events = MagicMock(live=True)
+        client._events.poll.side_effect = [*polls, *([([], False)] * 50)]
+        client.settings.printer_events_poll = 0.01
+
+    async def run_loop(self, client):
+        task = asyncio.create_task(client._printer_events_loop())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    async def test_change_pushed_when_negotiated(self, client):
+        client._ws = AsyncMock()
+        client._server_features = {"printer_event"}
+        self.watch(client, ([self.EVENT], False))
+        await self.run_loop(client)
+        assert json.loads(client._ws.send.call_args[0][0]) == self.EVENT
+        assert not client._heartbeat_now
+        assert client._heartbeat_wake.is_set()
+
+    async def test_old_server_gets_heartbeat_instead(self, client):
+        client._ws = AsyncMock()
+        self.watch(client, ([self.EVENT], False))
+        await self.run_loop(client)
+        client._ws.send.assert_not_called()
+        assert client._heartbeat_now
+
+    async def test_unreachable_cupsd_backs_off(self, client):
+        self.watch(client)
+        client._events.poll.side_effect = IppUnavailable("down")
+        await self.run_loop(client)
+        # The retry waits seconds, not PRINTER_EVENTS_POLL.
+        assert client._events.poll.call_count == 1
+
+    def test_heartbeat_ceiling_stretched_while_events_flow(self, client):
+        client._events = MagicMock(live=True)
+        assert client._heartbeat_ceiling() == 5
+        client._server_features = {"printer_event"}
+        assert client._heartbeat_ceiling() == 5 * EVENT_HEARTBEAT_FACTOR
+        client._events.live = False
+        assert client._heartbeat_ceiling() == 5
+
+    def test_off_without_ipp_backend(self, settings):
+        # CUPS_BACKEND=cli, or auto without a cupsd socket.
+        with patch("printbot.websocket_client.get_backend", return_value=None):
+            assert GatewayClient(settings)._events is None
+
+    def test_watcher_shares_ipp_backend_client(self, settings):
+        backend = IppBackend(MagicMock())
+        with patch("printbot.websocket_client.get_backend", return_value=backend):
+            assert GatewayClient(settings)._events._client is backend.client
+            settings.printer_events = False
+            assert GatewayClient(settings)._events is None
+
+
 class TestOtaGuard:
     async def test_ota_duplicate_blocked(self, client):
         """Second OTA request should be ignored while one is in progress."""
@@ -375,7 +1051,8 @@ class TestHeartbeatLoop:
         # Back-compat scalar must still be present for v0.4.0 servers.
         assert sent["printer_status"] == "idle"
         # New per-printer array.
-        assert sent["printers"] == [mock_build.return_value]
+        assert sent["printers"] == [{**mock_build.return_value, "lane": {"queued": 0, "active": 0}}]
+        assert "stale" not in sent
         # Server explicitly drops top-level aggregates — make sure we don't
         # accidentally start sending them.
         assert "printer_state_reasons" not in sent
@@ -424,3 +1101,122 @@ class TestHeartbeatLoop:
         mock_build.assert_not_called()
         sent = json.loads(client._ws.send.call_args[0][0])
         assert sent["printers"] == []
+
+    @patch("printbot.websocket_client._build_printer_entries")
+    @patch("printbot.websocket_client.get_printer_status", return_value="idle")
+    async def test_all_printers_spread_over_rounds(self, _mock_status, mock_build, settings):
+        settings.heartbeat_printers = "all"
+        settings.heartbeat_round_size = 2
+        mock_build.return_value = {f"p{i}": {"name": f"p{i}"} for i in range(5)}
+        client = GatewayClient(settings)
+        client._ws = AsyncMock()
+        client._lanes.busy = MagicMock(return_value=["p4"])
+
+        sent = []
+        for _ in range(3):
+            task = asyncio.create_task(client._heartbeat_loop())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            sent.append(json.loads(client._ws.send.call_args[0][0]))
+
+        assert [[p["name"] for p in hb["printers"]] for hb in sent] == [
+            ["p0", "p1", "p4"], ["p2", "p3", "p4"], ["p4"],
+        ]
+        assert sent[0]["printers_round"] == {"index": 0, "count": 3, "total": 5}
+        assert mock_build.call_count == 3
+
+    @patch("printbot.websocket_client._build_printer_entry", return_value=None)
+    @patch("printbot.websocket_client.get_printer_status", return_value="idle")
+    async def test_delta_heartbeats_when_negotiated(self, _mock_status, _mock_build, client):
+        client._ws = AsyncMock()
+        client._server_features = {"heartbeat_delta"}
+        client.settings.heartbeat_interval = 0.05
+
+        task = asyncio.create_task(client._heartbeat_loop())
+        await asyncio.sleep(0.12)
+        await client._handle_message({"type": "heartbeat_resync"})
+        await asyncio.sleep(0.01)
+        task.cancel()
+
+        sent = [json.loads(c[0][0]) for c in client._ws.send.call_args_list]
+        assert sent[0]["full"] is True
+        assert sent[0]["printer_status"] == "idle"
+        delta = sent[1]
+        assert delta["base_seq"] == sent[0]["hb_seq"]
+        assert "printer_status" not in delta["patch"]
+        assert "config" not in delta["patch"]
+        # Answered at once; the next scheduled full one is 10 beats away.
+        assert sent[-1]["full"] is True
+
+    @patch("printbot.websocket_client._build_printer_entry", return_value=None)
+    @patch("printbot.websocket_client.get_printer_status", return_value="idle")
+    async def test_delta_base_is_a_written_snapshot(self, _mock_status, _mock_build, client):
+        client._ws = AsyncMock()
+        client._writer_task = MagicMock()
+        client._server_features = {"heartbeat_delta"}
+        client.settings.heartbeat_interval = 0.05
+
+        task = asyncio.create_task(client._heartbeat_loop())
+        # Nothing is written yet: each snapshot evicts the one before it.
+        await asyncio.sleep(0.12)
+        _, frame = await client._send_queue.get()
+        client._send_queue.sent()
+        written = json.loads(frame)
+        assert written["full"] is True
+        assert client._send_queue.snapshot()["heartbeat"]["dropped"] >= 1
+
+        await asyncio.sleep(0.06)
+        task.cancel()
+        _, frame = await client._send_queue.get()
+        assert json.loads(frame)["base_seq"] == written["hb_seq"]
+
+    @patch("printbot.websocket_client._build_printer_entry", return_value=None)
+    @patch("printbot.websocket_client.get_printer_status", return_value="idle")
+    async def test_interval_adapts_to_activity(self, _mock_status, _mock_build, client):
+        client._ws = AsyncMock()
+        client._cadence.minimum = 0.02
+
+        task = asyncio.create_task(client._heartbeat_loop())
+        await asyncio.sleep(0.2)
+        sent = [json.loads(c[0][0]) for c in client._ws.send.call_args_list]
+        assert [hb["interval"] for hb in sent[:4]] == [0.02, 0.04, 0.08, 0.16]
+
+        # Next one is due at ~0.3 s; a job brings it forward.
+        client._heartbeat_activity()
+        await asyncio.sleep(0.03)
+        task.cancel()
+        after = [json.loads(c[0][0]) for c in client._ws.send.call_args_list]
+        assert len(after) > len(sent)
+        assert after[len(sent)]["interval"] == 0.02
+
+    async def test_hung_lpstat_does_not_block_loop(self, settings, tmp_path, monkeypatch):
+        lpstat = tmp_path / "lpstat"
+        lpstat.write_text("#!/bin/sh\nsleep 1\necho 'printer test-printer is idle.'\n")
+        lpstat.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        settings.heartbeat_budget = 0.2
+        settings.printer_name = ""
+        client = GatewayClient(settings)
+        client._ws = AsyncMock()
+
+        lag = 0.0
+
+        async def ticker():
+            nonlocal lag
+            loop = asyncio.get_running_loop()
+            while True:
+                start = loop.time()
+                await asyncio.sleep(0.01)
+                lag = max(lag, loop.time() - start - 0.01)
+
+        probe = asyncio.create_task(ticker())
+        task = asyncio.create_task(client._heartbeat_loop())
+        await asyncio.sleep(0.4)
+        task.cancel()
+        probe.cancel()
+
+        # Sent on the budget, long before lpstat returns.
+        sent = json.loads(client._ws.send.call_args[0][0])
+        assert sent["printer_status"] == "unknown"
+        assert sent["stale"] == ["printer_status"]
+        assert lag < 0.1